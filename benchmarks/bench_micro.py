@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Micro-benchmarks of the functions called for every job."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from cds_sorenson.api import get_available_aspect_ratios, \
+    get_available_preset_qualities, get_preset_id
+from cds_sorenson.parsers import parse_job_status
+from cds_sorenson.utils import _filepath_for_samba, _get_preset_config, \
+    generate_json_for_encoding, parse_status
+
+PRESET_ID = 'dc2187a3-8f64-4e73-b458-7370a88d92d7'
+
+RUNNING_STATUS = json.dumps({
+    'JobId': '11111111-aaaa',
+    'Status': {'Progress': 55.8, 'Status': 3},
+    'TotalSourceSize': 28335481,
+})
+
+FINISHED_STATUS = json.dumps({
+    'JobId': '3c826c49-3d89-44e9-ac71-e9f02d5702ec',
+    'StatusStateId': 5,
+    'OutputList': [{
+        'FileSize': 16090019,
+        'DurationSeconds': 60.095,
+        'FileVidDataRate': '2000000',
+        'FileAudDataRate': '192000',
+        'FileName': 'data-YouTube_480p.mp4',
+    }] * 5,
+    'StatusList': [{'Status': 'Transcoding', 'Progress': 100}] * 20,
+    'SourceMediaList': [{'FileUri': 'file://cernbox-smb.cern.ch/data.mp4'}],
+})
+
+
+def test_get_preset_config(benchmark, app):
+    """Benchmark the lookup of a preset by ID."""
+    assert benchmark(_get_preset_config, PRESET_ID)['height'] == 360
+
+
+def test_get_preset_id(benchmark, app):
+    """Benchmark the lookup of a preset ID by quality and aspect ratio."""
+    assert benchmark(get_preset_id, '360p', '16:9') == PRESET_ID
+
+
+def test_get_available_preset_qualities(benchmark, app):
+    """Benchmark the list of qualities, as used by the upload form."""
+    assert '360p' in benchmark(get_available_preset_qualities)
+
+
+def test_get_available_aspect_ratios(benchmark, app):
+    """Benchmark the list of aspect ratios as pairs of integers."""
+    assert (16, 9) in benchmark(get_available_aspect_ratios, pairs=True)
+
+
+def test_generate_json_for_encoding(benchmark, app):
+    """Benchmark building the JSON of a new job."""
+    job = benchmark(generate_json_for_encoding, '/tmp/input.mp4',
+                    '/tmp/output.mp4', PRESET_ID)
+    assert job['JobMediaInfo']['CompressionPresetList'][0]['PresetId'] == \
+        PRESET_ID
+
+
+def test_filepath_for_samba(benchmark, app):
+    """Benchmark the translation of EOS paths."""
+    assert benchmark(_filepath_for_samba,
+                     '/eos/workspace/c/cds/test/data.mp4').startswith('file:')
+
+
+def test_parse_running_status(benchmark, app):
+    """Benchmark parsing the status of a running job."""
+    assert benchmark(parse_status, '1', RUNNING_STATUS) == \
+        ('Transcoding', 55.8)
+
+
+def test_parse_finished_status(benchmark, app):
+    """Benchmark parsing the status of an archived job."""
+    assert benchmark(parse_status, '1', FINISHED_STATUS) == ('Finished', 100)
+
+
+def test_parse_finished_outputs(benchmark, app):
+    """Benchmark parsing the outputs of an archived job."""
+    job = benchmark(parse_job_status, '1', FINISHED_STATUS,
+                    app.config['CDS_SORENSON_STATUSES'])
+    assert len(job.outputs) == 5
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""End-to-end throughput against the fake Sorenson server."""
+
+from __future__ import absolute_import, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cds_sorenson.api import get_encoding_statuses, start_encoding
+from cds_sorenson.proxies import current_cds_sorenson
+
+JOBS = 200
+
+
+def _submit(app, count, workers):
+    """Submit ``count`` jobs from ``workers`` threads."""
+    def submit(i):
+        with app.app_context():
+            return start_encoding('/tmp/{0}.mp4'.format(i),
+                                  '/tmp/{0}-360p.mp4'.format(i), '360p',
+                                  '16:9')
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(submit, range(count)))
+
+
+@pytest.mark.parametrize('workers', [1, 4, 16])
+def test_submission_throughput(benchmark, app, sorenson, workers):
+    """Benchmark submitting many jobs concurrently."""
+    job_ids = benchmark.pedantic(_submit, args=(app, JOBS, workers),
+                                 rounds=3)
+    assert len(set(job_ids)) == JOBS
+    benchmark.extra_info['jobs'] = JOBS
+    benchmark.extra_info['transport'] = \
+        current_cds_sorenson.transport.stats.to_dict()
+
+
+@pytest.mark.parametrize('workers', [1, 4, 16])
+def test_status_throughput(benchmark, app, sorenson, workers):
+    """Benchmark checking the status of many running jobs concurrently."""
+    job_ids = _submit(app, JOBS, 16)
+    statuses = benchmark.pedantic(
+        get_encoding_statuses, args=(job_ids, ), kwargs=dict(
+            max_workers=workers), rounds=3)
+    assert all(status == ('Downloading', 0) for status in statuses.values())
+    benchmark.extra_info['jobs'] = JOBS
+    benchmark.extra_info['transport'] = \
+        current_cds_sorenson.transport.stats.to_dict()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Benchmarks configuration.
+
+Run them with ``pytest-benchmark`` and store the results as JSON, so that
+releases can be compared:
+
+.. code-block:: console
+
+    $ pip install -e .[benchmarks]
+    $ py.test benchmarks --benchmark-json=benchmarks.json
+    $ py.test-benchmark compare benchmarks.json other.json
+"""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from flask import Flask
+
+from cds_sorenson import CDSSorenson
+from cds_sorenson.testing import FakeSorenson, FakeSorensonServer, \
+    SimulatedClock
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.yield_fixture()
+def app():
+    """Flask application fixture."""
+    app_ = Flask('benchmarks')
+    CDSSorenson(app_)
+    with app_.app_context():
+        yield app_
+
+
+@pytest.yield_fixture()
+def sorenson(app):
+    """Fake Sorenson server answering in 5ms, with a manual clock."""
+    fake = FakeSorenson(capacity=1000, latency=0.005,
+                        clock=SimulatedClock(speed=0))
+    with FakeSorensonServer(fake) as server:
+        app.config.update(server.config)
+        app.extensions['cds-sorenson'].init_config(app)
+        yield fake
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Asyncio API to use Sorenson transcoding server.
+
+It mirrors :mod:`cds_sorenson.api` but talks to Sorenson through a pooled
+:mod:`aiohttp` session, so a single event loop can keep track of a large
+number of jobs. It requires Python 3.5+ and the ``aio`` extra::
+
+    $ pip install cds-sorenson[aio]
+
+Usage example:
+
+.. code-block:: python
+
+    async with AsyncSorensonClient(app) as client:
+        job_id = await client.start_encoding(
+            input_file, output_file, '360p', '16:9')
+        status, progress = await client.get_encoding_status(job_id)
+
+The client shares the retry policy, the circuit breakers, the metrics, the
+backends and the caches of the synchronous API, so the application must be
+initialized with :class:`~cds_sorenson.ext.CDSSorenson`. The calls to their
+storages that may block, e.g. a
+:class:`~cds_sorenson.breaker.SQLiteBreakerStorage`, are run in the default
+executor of the event loop.
+"""
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+import functools
+import itertools
+import json
+from timeit import default_timer
+
+import aiohttp
+
+from .breaker import FAILURES, MemoryBreakerStorage
+from .client import SorensonClient
+from .error import SorensonConnectionError, SorensonError, \
+    SorensonRetryableError, SorensonTimeoutError, SorensonUnavailableError, \
+    error_for_status
+from .retry import Deadline
+from .settings import SorensonSettings
+
+
+async def _blocking(func, *args):
+    """Run a call that may block in the default executor."""
+    return await asyncio.get_event_loop().run_in_executor(
+        None, functools.partial(func, *args))
+
+
+class AsyncSorensonClient(object):
+    """Asynchronous client for the Sorenson server."""
+
+    def __init__(self, app, limit=None, session=None):
+        """Initialize the client.
+
+        :param app: Flask application initialized with
+            :class:`~cds_sorenson.ext.CDSSorenson`. Its ``CDS_SORENSON_*``
+            config is read once when the client is created.
+        :param limit: maximum number of concurrent requests to Sorenson, by
+            default ``CDS_SORENSON_AIO_MAX_CONCURRENCY``.
+        :param session: optional :class:`aiohttp.ClientSession` to use
+            instead of creating a new one.
+        """
+        self.app = app
+        self.settings = SorensonSettings(app.config)
+        self.client = SorensonClient(app, settings=self.settings)
+        self.limit = limit or self.settings.aio_max_concurrency
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._session = session
+        # Retry, break, report and route like the synchronous API
+        self.ext = app.extensions['cds-sorenson']
+        self.transport = self.ext.transport
+        self.metrics = self.transport.metrics
+        self.backends = self.ext.backends
+
+    @property
+    def session(self):
+        """Pooled HTTP session, created on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                force_close=not self.settings.keep_alive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Accept': 'application/json'},
+            )
+        return self._session
+
+    async def close(self):
+        """Close the HTTP session and all the pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        """Enter the client context."""
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Close the client on exit."""
+        await self.close()
+
+    @staticmethod
+    async def _breaker_call(breaker, method):
+        """Call a method of a breaker without blocking the event loop."""
+        if isinstance(breaker.storage, MemoryBreakerStorage):
+            return method()
+        return await _blocking(method)
+
+    async def _request(self, method, url, endpoint, deadline=None,
+                       **kwargs):
+        """Send a request to Sorenson, retrying it if needed.
+
+        :param endpoint: name of the endpoint for its circuit breaker, its
+            metrics and its timeout.
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of the whole
+            operation.
+        :returns: tuple with the status code and the body of the response.
+        """
+        transport = self.transport
+        breaker = transport.breaker(endpoint)
+        policy = transport.retry_policy
+        started = policy.begin() if policy is not None else None
+        for attempt in itertools.count(1):
+            try:
+                timeout = transport.prepare_attempt(
+                    endpoint, attempt, transport.timeout(endpoint), deadline)
+                if not isinstance(timeout, (tuple, list)):
+                    timeout = (timeout, timeout)
+                kwargs['timeout'] = aiohttp.ClientTimeout(
+                    connect=timeout[0], sock_read=timeout[1])
+                if breaker is None:
+                    return await self._send(method, url, endpoint, **kwargs)
+                await self._breaker_call(breaker, breaker.before_call)
+                try:
+                    result = await self._send(method, url, endpoint,
+                                              **kwargs)
+                except FAILURES:
+                    await self._breaker_call(breaker, breaker.record_failure)
+                    raise
+                await self._breaker_call(breaker, breaker.record_success)
+                return result
+            except SorensonRetryableError as e:
+                if policy is None:
+                    raise
+                delay = policy.retry_delay(attempt, e, started,
+                                           idempotent=method != 'POST',
+                                           deadline=deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def _send(self, method, url, endpoint, **kwargs):
+        """Send a single request and classify its failure, if any."""
+        # aiohttp only understands plain HTTP proxies
+        proxy = self.settings.proxies.get('http')
+        async with self._semaphore:
+            started = default_timer()
+            try:
+                async with self.session.request(
+                        method, url, proxy=proxy, **kwargs) as response:
+                    status_code, body = response.status, await response.read()
+                    text = body.decode(response.get_encoding())
+                    retry_after = response.headers.get('Retry-After')
+            except asyncio.TimeoutError as e:
+                self._observe(endpoint, 'timeout', started, 0)
+                raise SorensonTimeoutError(str(e))
+            except aiohttp.ClientConnectorError as e:
+                self._observe(endpoint, 'connection-error', started, 0)
+                raise SorensonConnectionError(str(e), safe=True)
+            except aiohttp.ClientError as e:
+                self._observe(endpoint, 'connection-error', started, 0)
+                raise SorensonConnectionError(str(e))
+        self._observe(endpoint, status_code, started, len(body))
+        if status_code == 429 or status_code >= 500:
+            raise error_for_status(status_code, text, retry_after)
+        return status_code, text
+
+    def _observe(self, endpoint, status, started, size):
+        """Report a call started at ``started`` to the metrics sink."""
+        self.metrics.observe_request(endpoint, status,
+                                     default_timer() - started, size)
+
+    async def start_encoding(self, input_file, output_file, preset_quality,
+                             display_aspect_ratio, deadline=None,
+                             queue_id=None, **kwargs):
+        """Encode a video that is already in the input folder.
+
+        See :func:`cds_sorenson.api.start_encoding`.
+        """
+        backend = self.backends.choose()
+        client = self.client
+        preset_id = client.get_preset_id(preset_quality, display_aspect_ratio)
+        json_params = client.generate_json_for_encoding(
+            client.filepath_for_samba(input_file),
+            client.filepath_for_samba(output_file), preset_id,
+            queue_id=queue_id or backend.queue_id, server=backend.name)
+        url = backend.url('submit', settings=self.settings)
+        try:
+            status_code, text = await self._request(
+                'POST', url, backend.endpoint('submit'), deadline=deadline,
+                json=json_params)
+        except (SorensonRetryableError, SorensonUnavailableError):
+            # Running out of time doesn't mean that the server is down
+            if deadline is None or not deadline.expired:
+                self.backends.mark_down(backend)
+            raise
+        if status_code == 200:
+            job_id = json.loads(text).get('JobId')
+            self.backends.submitted(backend, job_id)
+            job_id = backend.job_id(job_id)
+            # Recorded in the ledger and the estimator like the synchronous
+            # submissions
+            await _blocking(client._record_submission, job_id, input_file,
+                            [(output_file, preset_id)])
+            return job_id
+        raise error_for_status(status_code, text)
+
+    async def stop_encoding(self, job_id, deadline=None):
+        """Stop encoding job.
+
+        See :func:`cds_sorenson.api.stop_encoding`.
+        """
+        backend, backend_job_id = self.backends.resolve(job_id)
+        url = backend.url('delete', backend_job_id, settings=self.settings)
+        status_code, text = await self._request(
+            'DELETE', url, backend.endpoint('delete'), deadline=deadline)
+        if status_code != 200:
+            raise error_for_status(status_code, text)
+        self.backends.finished(job_id)
+
+    async def get_status(self, job_id, deadline=None):
+        """Return the status of a job as JSON string.
+
+        See :func:`cds_sorenson.utils.get_status`.
+        """
+        if deadline is None:
+            deadline = Deadline(
+                self.settings.status_deadline)
+        backend, backend_job_id = self.backends.resolve(job_id)
+        current_url = backend.url('current-status', backend_job_id,
+                                  settings=self.settings)
+        archive_url = backend.url('archive-status', backend_job_id,
+                                  settings=self.settings)
+        locations = self.ext.job_locations
+        if locations.get(job_id) == 'archive':
+            status_code, text = await self._request(
+                'GET', archive_url, backend.endpoint('archive-status'),
+                deadline=deadline)
+        else:
+            status_code, text = await self._request(
+                'GET', current_url, backend.endpoint('current-status'),
+                deadline=deadline)
+            if status_code == 404:
+                self.metrics.inc('sorenson_archive_fallbacks_total')
+                status_code, text = await self._request(
+                    'GET', archive_url, backend.endpoint('archive-status'),
+                    deadline=deadline)
+                if status_code == 200:
+                    locations.set(job_id, 'archive')
+        if status_code == 200:
+            return text
+        raise error_for_status(status_code, text)
+
+    async def get_encoding_status(self, job_id):
+        """Get status of a given job from the Sorenson server.
+
+        See :func:`cds_sorenson.api.get_encoding_status`.
+        """
+        results = self.ext.results
+        if results is not None:
+            result = await _blocking(results.get, job_id)
+            if result is not None:
+                return result
+        status = await self.get_status(job_id)
+        return await _blocking(self.client.update_status, job_id, status)
+
+    async def restart_encoding(self, job_id, input_file, output_file,
+                               preset_quality, display_aspect_ratio,
+                               **kwargs):
+        """Try to stop the encoding job and start a new one.
+
+        See :func:`cds_sorenson.api.restart_encoding`.
+        """
+        deadline = Deadline(self.settings.restart_deadline)
+        if self.ext.results is not None:
+            await _blocking(self.ext.results.delete, job_id)
+        try:
+            await self.stop_encoding(job_id, deadline=deadline)
+        except SorensonError:
+            # Same as the synchronous API, the old job will at worst
+            # overwrite the file when it finishes.
+            pass
+        return await self.start_encoding(input_file, output_file,
+                                         preset_quality, display_aspect_ratio,
+                                         deadline=deadline, **kwargs)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Pool of Sorenson servers to spread the submissions on.
+
+Each server of ``CDS_SORENSON_BACKENDS`` gets a name, which prefixes the IDs
+of its jobs, e.g. ``sorenson02:6f2b...``. The status checks, stops and
+restarts of a job are then sent to the server which runs it. Job IDs without
+a known prefix go to the server of the ``CDS_SORENSON_*_URL`` settings.
+"""
+
+from __future__ import absolute_import, print_function
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from .error import SorensonUnavailableError
+from .proxies import current_cds_sorenson
+from .settings import URL_SETTINGS, UrlTemplate
+
+ROUND_ROBIN = 'round-robin'
+"""Send the submissions to each server in turn."""
+
+LEAST_OUTSTANDING = 'least-outstanding'
+"""Send the submissions to the server with the fewest unfinished jobs."""
+
+WEIGHTED = 'weighted'
+"""Send the submissions to each server in proportion to its weight."""
+
+
+def _rebase(template, base_url):
+    """Replace the scheme and host of a URL template by ``base_url``."""
+    rest = template.partition('://')[2]
+    path = rest[len(rest.split('/', 1)[0]):]
+    return base_url.rstrip('/') + path
+
+
+class Backend(object):
+    """A Sorenson server and the queue to submit the jobs to."""
+
+    def __init__(self, name=None, urls=None, queue_id=None, weight=1,
+                 health_url=None):
+        """Initialize the backend.
+
+        :param name: name prefixing the job IDs, or ``None`` for the server
+            of the ``CDS_SORENSON_*_URL`` settings.
+        :param urls: dictionary mapping each endpoint to its
+            :class:`~cds_sorenson.settings.UrlTemplate`, or ``None`` to use
+            the ones of the settings.
+        :param queue_id: Sorenson queue, by default
+            ``CDS_SORENSON_DEFAULT_QUEUE``.
+        :param weight: relative capacity of the server.
+        :param health_url: URL answering a GET with a status below 500 while
+            the server is up, by default the submission URL.
+        """
+        self.name = name
+        self.urls = urls
+        self.queue_id = queue_id
+        self.weight = weight
+        self.health_url = health_url
+        self.down_until = 0
+        # Unfinished jobs and their submission time, oldest first
+        self.outstanding = OrderedDict()
+        self.current_weight = 0
+
+    def __repr__(self):
+        """Representation of the backend."""
+        return 'Backend({0!r})'.format(self.name)
+
+    def url(self, endpoint, job_id=None, settings=None):
+        """Return the URL of an endpoint, e.g. ``'delete'``.
+
+        :param settings: :class:`~cds_sorenson.settings.SorensonSettings`
+            of the default backend, by default the ones of the current
+            application.
+        """
+        urls = self.urls
+        if urls is None:
+            urls = (settings or current_cds_sorenson.settings).urls
+        return urls[endpoint].format(job_id=job_id)
+
+    def endpoint(self, endpoint):
+        """Return the name of an endpoint for the breakers and metrics."""
+        if self.name is None:
+            return endpoint
+        return '{0}:{1}'.format(self.name, endpoint)
+
+    def job_id(self, job_id):
+        """Return the ID of a job of this backend for the callers."""
+        if self.name is None:
+            return job_id
+        return '{0}:{1}'.format(self.name, job_id)
+
+
+class BackendPool(object):
+    """Choose the Sorenson server of each submission."""
+
+    def __init__(self, backends=(), strategy=ROUND_ROBIN, recovery=30,
+                 outstanding_ttl=None, clock=time.time):
+        """Initialize the pool.
+
+        :param backends: list of named :class:`Backend`. If empty, all the
+            jobs go to the default backend.
+        :param strategy: :data:`ROUND_ROBIN`, :data:`LEAST_OUTSTANDING` or
+            :data:`WEIGHTED`.
+        :param recovery: seconds a failing backend is left out of rotation.
+        :param outstanding_ttl: seconds after which a submitted job stops
+            being counted as unfinished, even if it was never seen finishing,
+            or ``None`` to count it until then.
+        :param clock: function returning the current time in seconds.
+        """
+        if strategy not in (ROUND_ROBIN, LEAST_OUTSTANDING, WEIGHTED):
+            raise ValueError('Unknown routing strategy "{0}"'.format(
+                strategy))
+        self.default = Backend()
+        self.backends = dict((backend.name, backend) for backend in backends)
+        self.strategy = strategy
+        self.recovery = recovery
+        self.outstanding_ttl = outstanding_ttl
+        self.clock = clock
+        self._order = sorted(self.backends)
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the pool from the ``CDS_SORENSON_*`` configuration.
+
+        The URL templates of each backend are either given in full, e.g.
+        ``submit_url``, or derived from its base ``url`` and the paths of the
+        ``CDS_SORENSON_*_URL`` settings.
+        """
+        backends = []
+        for name, options in config['CDS_SORENSON_BACKENDS'].items():
+            urls = {}
+            for endpoint, setting in URL_SETTINGS.items():
+                key = endpoint.replace('-', '_') + '_url'
+                urls[endpoint] = UrlTemplate(options.get(key) or _rebase(
+                    config[setting], options['url']))
+            backends.append(Backend(
+                name, urls, queue_id=options.get('queue_id'),
+                weight=options.get('weight', 1),
+                health_url=options.get('health_url'),
+            ))
+        return cls(
+            backends, strategy=config['CDS_SORENSON_ROUTING'],
+            recovery=config['CDS_SORENSON_BACKEND_RECOVERY'],
+            outstanding_ttl=config['CDS_SORENSON_BACKEND_OUTSTANDING_TTL'])
+
+    def resolve(self, job_id):
+        """Return the backend of a job and the job ID on that backend."""
+        name, sep, backend_job_id = job_id.partition(':')
+        backend = self.backends.get(name) if sep else None
+        if backend is None:
+            return self.default, job_id
+        return backend, backend_job_id
+
+    def available(self):
+        """Return the backends in rotation."""
+        now = self.clock()
+        return [self.backends[name] for name in self._order
+                if self.backends[name].down_until <= now]
+
+    def choose(self, accept=None):
+        """Return the backend of the next submission.
+
+        :param accept: function telling if a backend can take the
+            submission, e.g. if it has a free slot.
+        :returns: the chosen backend, or ``None`` if ``accept`` refused all
+            the backends in rotation.
+        :raises SorensonUnavailableError: if all the backends are down.
+        """
+        if not self.backends:
+            if accept is None or accept(self.default):
+                return self.default
+            return None
+        with self._lock:
+            candidates = self.available()
+            if not candidates:
+                raise SorensonUnavailableError('submit', retry_in=min(
+                    backend.down_until for backend in self.backends.values()
+                ) - self.clock())
+            if accept is not None:
+                candidates = [backend for backend in candidates
+                              if accept(backend)]
+                if not candidates:
+                    return None
+            # Rotate the candidates, so that ties are broken in turn
+            turn = next(self._turn) % len(candidates)
+            candidates = candidates[turn:] + candidates[:turn]
+            if self.strategy == LEAST_OUTSTANDING:
+                for backend in candidates:
+                    self._expire(backend)
+                return min(candidates,
+                           key=lambda backend: len(backend.outstanding))
+            if self.strategy == WEIGHTED:
+                # Smooth weighted round-robin, as done by nginx
+                total = 0
+                for backend in candidates:
+                    backend.current_weight += backend.weight
+                    total += backend.weight
+                chosen = max(candidates,
+                             key=lambda backend: backend.current_weight)
+                chosen.current_weight -= total
+                return chosen
+            return candidates[0]
+
+    def _expire(self, backend):
+        """Stop counting the jobs submitted too long ago to a backend.
+
+        Jobs whose final status is never read would otherwise be counted
+        forever.
+        """
+        if self.outstanding_ttl is None:
+            return
+        expired_at = self.clock() - self.outstanding_ttl
+        outstanding = backend.outstanding
+        while outstanding and \
+                next(iter(outstanding.values())) <= expired_at:
+            outstanding.popitem(last=False)
+
+    def submitted(self, backend, job_id):
+        """Count a job submitted to a backend."""
+        if backend.name is None:
+            # Only the servers of the pool are chosen between
+            return
+        with self._lock:
+            self._expire(backend)
+            backend.outstanding[job_id] = self.clock()
+
+    def finished(self, job_id):
+        """Stop counting a job, e.g. when it reached a final status."""
+        backend, backend_job_id = self.resolve(job_id)
+        with self._lock:
+            backend.outstanding.pop(backend_job_id, None)
+
+    def mark_down(self, backend):
+        """Leave a failing backend out of rotation for a while."""
+        if backend.name is not None:
+            backend.down_until = self.clock() + self.recovery
+
+    def mark_up(self, backend):
+        """Put a backend back in rotation."""
+        backend.down_until = 0
+
+    def check_health(self, transport, timeout=5):
+        """Probe every backend and update the rotation.
+
+        Call it periodically, e.g. from a scheduled task, so a server which
+        went down is left out before a submission fails on it.
+
+        :param transport: :class:`~cds_sorenson.transport.SorensonTransport`
+            to send the probes with.
+        :returns: dictionary mapping each backend name to its health.
+        """
+        health = {}
+        for name in self._order:
+            backend = self.backends[name]
+            try:
+                response = transport.session.get(
+                    backend.health_url or backend.url('submit'),
+                    timeout=timeout)
+                healthy = response.status_code < 500
+            except requests.RequestException:
+                healthy = False
+            if healthy:
+                self.mark_up(backend)
+            else:
+                self.mark_down(backend)
+            health[name] = healthy
+        return health
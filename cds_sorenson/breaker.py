@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Circuit breakers failing fast while a Sorenson endpoint is down."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sqlite3
+import threading
+import time
+
+from .error import SorensonConnectionError, SorensonServerError, \
+    SorensonTimeoutError, SorensonUnavailableError
+
+CLOSED = 'closed'
+"""Calls go through."""
+
+OPEN = 'open'
+"""Calls fail immediately."""
+
+HALF_OPEN = 'half-open'
+"""A single trial call is going through, the others fail immediately."""
+
+FAILURES = (SorensonConnectionError, SorensonServerError,
+            SorensonTimeoutError)
+"""Errors counting as a failure of the endpoint."""
+
+_INITIAL = (CLOSED, 0, None)
+
+
+class MemoryBreakerStorage(object):
+    """Keep the state of the breakers in the current process."""
+
+    def __init__(self):
+        """Initialize the storage."""
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Return the ``(state, failures, opened_at)`` of a breaker."""
+        return self._states.get(name, _INITIAL)
+
+    def update(self, name, func):
+        """Atomically replace the state of a breaker by ``func(state)``.
+
+        :returns: the new state.
+        """
+        with self._lock:
+            state = self._states[name] = func(self._states.get(name, _INITIAL))
+            return state
+
+
+class SQLiteBreakerStorage(object):
+    """Share the state of the breakers between the processes of a host."""
+
+    def __init__(self, path):
+        """Initialize the storage.
+
+        :param path: path of the SQLite database, created if needed.
+        """
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        """Connection to the database for the current thread.
+
+        The connections are opened lazily and per process, as a connection
+        inherited through a fork, e.g. in a prefork Celery worker, must not
+        be used by the child.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sorenson_breakers ('
+                'name TEXT PRIMARY KEY, state TEXT, failures INTEGER, '
+                'opened_at REAL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return self._local.conn
+
+    def _get(self, conn, name):
+        row = conn.execute(
+            'SELECT state, failures, opened_at FROM sorenson_breakers '
+            'WHERE name = ?', (name, )).fetchone()
+        return tuple(row) if row else _INITIAL
+
+    def get(self, name):
+        """Return the ``(state, failures, opened_at)`` of a breaker."""
+        return self._get(self._connection, name)
+
+    def update(self, name, func):
+        """Atomically replace the state of a breaker by ``func(state)``.
+
+        :returns: the new state.
+        """
+        conn = self._connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            state = func(self._get(conn, name))
+            conn.execute(
+                'INSERT OR REPLACE INTO sorenson_breakers VALUES (?, ?, ?, ?)',
+                (name, ) + tuple(state))
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return state
+
+
+class CircuitBreaker(object):
+    """Circuit breaker of a single Sorenson endpoint.
+
+    After ``failure_threshold`` consecutive failures, the breaker opens and
+    calls fail immediately with
+    :class:`~cds_sorenson.error.SorensonUnavailableError`. After
+    ``recovery_timeout`` seconds, one trial call is let through: if it
+    succeeds the breaker closes, otherwise it opens again.
+    """
+
+    def __init__(self, name, storage=None, failure_threshold=5,
+                 recovery_timeout=30, clock=time.time):
+        """Initialize the breaker.
+
+        :param name: name of the endpoint.
+        :param storage: where the state is kept, by default in memory.
+        :param failure_threshold: consecutive failures opening the breaker.
+        :param recovery_timeout: seconds before trying the endpoint again.
+        :param clock: function returning the current time in seconds.
+        """
+        self.name = name
+        self.storage = storage or MemoryBreakerStorage()
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+
+    @property
+    def state(self):
+        """Current state of the breaker."""
+        return self.storage.get(self.name)[0]
+
+    def before_call(self):
+        """Check that a call can be sent.
+
+        :raises SorensonUnavailableError: if the breaker is open.
+        """
+        state, _, opened_at = self.storage.get(self.name)
+        if state == CLOSED:
+            return
+        now = self.clock()
+
+        def try_again(current):
+            state, failures, opened_at = current
+            if state != CLOSED and now - opened_at >= self.recovery_timeout:
+                # Let this call through as the trial call
+                return HALF_OPEN, failures, now
+            return current
+
+        if now - opened_at >= self.recovery_timeout:
+            state, _, opened_at = self.storage.update(self.name, try_again)
+            if state == HALF_OPEN and opened_at == now:
+                return
+        raise SorensonUnavailableError(
+            self.name, retry_in=max(opened_at + self.recovery_timeout - now,
+                                    0))
+
+    def record_success(self):
+        """Close the breaker after a successful call."""
+        if self.storage.get(self.name) != _INITIAL:
+            self.storage.update(self.name, lambda current: _INITIAL)
+
+    def record_failure(self):
+        """Count a failed call and open the breaker if needed."""
+        now = self.clock()
+
+        def fail(current):
+            state, failures, opened_at = current
+            failures += 1
+            if state == HALF_OPEN or failures >= self.failure_threshold:
+                return OPEN, failures, now
+            return state, failures, opened_at
+
+        self.storage.update(self.name, fail)
+
+    def call(self, func, *args, **kwargs):
+        """Call ``func`` through the breaker."""
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except FAILURES:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
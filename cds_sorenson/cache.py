@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""In-process caches used to avoid round trips to Sorenson."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Thread-safe bounded cache with least-recently-used eviction.
+
+    Entries older than ``ttl`` seconds are treated as missing.
+    """
+
+    def __init__(self, maxsize, ttl=None, clock=time.time):
+        """Initialize the cache.
+
+        :param maxsize: maximum number of entries, ``0`` disables the cache.
+        :param ttl: number of seconds after which an entry expires, or
+            ``None`` to keep the entries until they are evicted.
+        :param clock: function returning the current time in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of entries, including the expired ones."""
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the value of ``key`` and mark it as recently used."""
+        with self._lock:
+            try:
+                value, expires_at = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and expires_at <= self.clock():
+                self.misses += 1
+                return default
+            self._data[key] = (value, expires_at)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, evicting the oldest entries."""
+        if not self.maxsize:
+            return
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key, value):
+        """Store ``value`` under ``key`` unless the key is already there.
+
+        The check and the store are atomic, so only one of several
+        concurrent callers adds its value.
+
+        :returns: ``True`` if the value was stored.
+        """
+        if not self.maxsize:
+            return True
+        now = self.clock()
+        with self._lock:
+            current = self._data.get(key)
+            if current is not None and (current[1] is None or
+                                        current[1] > now):
+                return False
+            self._data.pop(key, None)
+            self._data[key] = (value, now + self.ttl if self.ttl else None)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def pop(self, key, default=None):
+        """Remove ``key`` from the cache and return its value."""
+        with self._lock:
+            return self._data.pop(key, (default, None))[0]
+
+    def clear(self):
+        """Remove all the entries."""
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def stats(self):
+        """Return the hit, miss and eviction counters."""
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, size=len(self._data))
+
+
+class MemoryResultCache(object):
+    """Cache of the final job statuses kept in the current process."""
+
+    def __init__(self, maxsize=10000, ttl=None):
+        """Initialize the cache.
+
+        :param maxsize: maximum number of jobs, the least recently used ones
+            are evicted first.
+        :param ttl: number of seconds to keep a status, or ``None``.
+        """
+        self._cache = LRUCache(maxsize, ttl=ttl)
+
+    def get(self, job_id):
+        """Return the ``(status, progress)`` of a job or ``None``."""
+        return self._cache.get(job_id)
+
+    def set(self, job_id, result):
+        """Store the ``(status, progress)`` of a job."""
+        self._cache.set(job_id, tuple(result))
+
+    def delete(self, job_id):
+        """Forget the status of a job."""
+        self._cache.pop(job_id)
+
+    def clear(self):
+        """Forget all the statuses."""
+        self._cache.clear()
+
+    @property
+    def stats(self):
+        """Return the hit, miss and eviction counters."""
+        return self._cache.stats
+
+
+class SQLiteResultCache(object):
+    """Cache of the final job statuses shared by all the local workers.
+
+    The statuses are stored in a SQLite database, so every process of the
+    same host can use them. When the cache is full, the oldest statuses are
+    evicted first.
+    """
+
+    _TRIM_EVERY = 100
+
+    def __init__(self, path, maxsize=100000, ttl=None):
+        """Initialize the cache.
+
+        :param path: path of the SQLite database, created if needed.
+        :param maxsize: maximum number of jobs to keep.
+        :param ttl: number of seconds to keep a status, or ``None``.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._inserts = 0
+
+    @property
+    def _connection(self):
+        """Connection to the database for the current thread.
+
+        The connections are opened lazily and per process, so a forked
+        worker doesn't use the connection of its parent.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            with conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS sorenson_results ('
+                    'job_id TEXT PRIMARY KEY, status TEXT, progress REAL, '
+                    'stored_at REAL, expires_at REAL)')
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS '
+                    'ix_sorenson_results_stored_at '
+                    'ON sorenson_results (stored_at)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return self._local.conn
+
+    def get(self, job_id):
+        """Return the ``(status, progress)`` of a job or ``None``."""
+        row = self._connection.execute(
+            'SELECT status, progress FROM sorenson_results '
+            'WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (job_id, time.time())).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, job_id, result):
+        """Store the ``(status, progress)`` of a job."""
+        now = time.time()
+        status, progress = result
+        with self._connection as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sorenson_results VALUES '
+                '(?, ?, ?, ?, ?)',
+                (job_id, status, progress, now,
+                 now + self.ttl if self.ttl else None))
+            self._inserts += 1
+            if self._inserts % self._TRIM_EVERY == 0:
+                self._trim(conn)
+
+    def _trim(self, conn):
+        """Evict the oldest statuses above ``maxsize``."""
+        conn.execute(
+            'DELETE FROM sorenson_results WHERE job_id IN ('
+            'SELECT job_id FROM sorenson_results ORDER BY stored_at DESC '
+            'LIMIT -1 OFFSET ?)', (self.maxsize, ))
+
+    def delete(self, job_id):
+        """Forget the status of a job."""
+        with self._connection as conn:
+            conn.execute('DELETE FROM sorenson_results WHERE job_id = ?',
+                         (job_id, ))
+
+    def clear(self):
+        """Forget all the statuses."""
+        with self._connection as conn:
+            conn.execute('DELETE FROM sorenson_results')
@@ -0,0 +1,734 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Client of the Sorenson transcoding server.
+
+The client holds the :class:`~cds_sorenson.settings.SorensonSettings` and the
+transport of an application, so it works without an application context,
+e.g. from worker threads:
+
+.. code-block:: python
+
+    client = app.extensions['cds-sorenson'].client
+    job_id = client.start_encoding(input_file, output_file, '360p', '16:9')
+
+The functions of :mod:`cds_sorenson.api` call the client of the current
+application.
+"""
+
+from __future__ import absolute_import, print_function
+
+import json
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from .error import InvalidAspectRatioError, InvalidResolutionError, \
+    SorensonError, SorensonRetryableError, SorensonTimeoutError, \
+    SorensonUnavailableError, error_for_status
+from .parsers import loads, parse_job_status
+from .presets import ratio_value
+from .retry import Deadline
+from .signals import job_finished
+from .utils import idempotency_key
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+RestartResult = namedtuple('RestartResult',
+                           'job_id stopped resubmitted stop_error')
+"""Outcome of :meth:`SorensonClient.restart_encoding_concurrently`.
+
+``stopped`` tells if Sorenson accepted to delete the old job, otherwise
+``stop_error`` is the error it raised. ``resubmitted`` is False if the new job
+was already submitted by a previous or concurrent attempt of the same
+restart.
+"""
+
+_HEADERS = {'Accept': 'application/json'}
+
+_PENDING = '#pending:'
+"""Prefix of the value of a restart in the idempotency store while its job is
+submitted, followed by the time of the claim."""
+
+_CLAIM_INTERVAL = 0.05
+"""Seconds between the checks of a restart submitted concurrently."""
+
+
+class SorensonClient(object):
+    """Synchronous client for the Sorenson server."""
+
+    def __init__(self, app, settings=None):
+        """Initialize the client.
+
+        :param app: Flask application initialized with
+            :class:`~cds_sorenson.ext.CDSSorenson`, whose transport, caches
+            and backends are used.
+        :param settings: :class:`~cds_sorenson.settings.SorensonSettings` to
+            use, by default the ones of the application.
+        """
+        self.app = app
+        self.ext = app.extensions.get('cds-sorenson')
+        self._settings = settings
+
+    @property
+    def settings(self):
+        """Settings of the client."""
+        return self._settings or self.ext.settings
+
+    #
+    # Submission
+    #
+    def start_encoding(self, input_file, output_file, preset_quality,
+                       display_aspect_ratio, deadline=None, queue_id=None,
+                       backend=None, **kwargs):
+        """Encode a video that is already in the input folder.
+
+        :param input_file: string with the filename, something like
+            /eos/cds/test/sorenson/8f/m2/728-jsod98-8s9df2-89fg-lksdjf/data
+            where the last part "data" is the filename and the last
+            directory is the bucket id.
+        :param output_file: the file to output the transcoded file.
+        :param preset_quality: quality of the preset.
+        :param display_aspect_ratio: the video's aspect ratio
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of the
+            operation this submission is part of.
+        :param queue_id: Sorenson queue, by default the one of the backend
+            or ``CDS_SORENSON_DEFAULT_QUEUE``.
+        :param backend: :class:`~cds_sorenson.backends.Backend` to submit
+            to, by default chosen by the ``CDS_SORENSON_BACKENDS`` pool.
+        :param kwargs: other technical metadata
+        :returns: job ID.
+        """
+        samba_input_file = self.filepath_for_samba(input_file)
+        samba_output_file = self.filepath_for_samba(output_file)
+
+        self.app.logger.debug('Encoding {0} with preset quality {1}'
+                              .format(samba_input_file, preset_quality))
+
+        preset_id = self.get_preset_id(preset_quality, display_aspect_ratio)
+        backend = backend or self.ext.backends.choose()
+
+        # Build the request of the encoding job
+        json_params = self.generate_json_for_encoding(
+            samba_input_file, samba_output_file, preset_id,
+            queue_id=queue_id or backend.queue_id, server=backend.name)
+        job_id = self._submit_job(json_params, backend, deadline=deadline)
+        self._record_submission(job_id, input_file, [(output_file, preset_id)])
+        return job_id
+
+    def start_ladder_encoding(self, input_file, output_template, qualities,
+                              display_aspect_ratio, queue_id=None, **kwargs):
+        """Encode a video in several qualities with a single job.
+
+        Sorenson downloads the input file only once for all the qualities.
+
+        :param input_file: string with the filename, see
+            :meth:`start_encoding`.
+        :param output_template: name of the master file passed to the
+            ``CDS_SORENSON_NAME_GENERATOR`` to get the name of each output
+            file.
+        :param qualities: list of preset qualities.
+        :param display_aspect_ratio: the video's aspect ratio
+        :param queue_id: Sorenson queue, by default
+            ``CDS_SORENSON_DEFAULT_QUEUE``.
+        :param kwargs: other technical metadata
+        :returns: tuple with the job ID and an ordered dictionary mapping each
+            output file to its preset ID.
+        """
+        settings = self.settings
+        outputs = OrderedDict()
+        for preset_quality in qualities:
+            preset_id = self.get_preset_id(preset_quality,
+                                           display_aspect_ratio)
+            output_file = settings.name_generator(
+                output_template, settings.presets.get_by_id(preset_id))
+            outputs[output_file] = preset_id
+
+        self.app.logger.debug('Encoding {0} with preset qualities {1}'
+                              .format(input_file, ', '.join(qualities)))
+
+        backend = self.ext.backends.choose()
+        json_params = self.generate_json_for_ladder_encoding(
+            self.filepath_for_samba(input_file),
+            [(self.filepath_for_samba(output_file), preset_id)
+             for output_file, preset_id in outputs.items()],
+            queue_id=queue_id or backend.queue_id, server=backend.name)
+        job_id = self._submit_job(json_params, backend)
+        self._record_submission(job_id, input_file, outputs.items())
+        return job_id, outputs
+
+    def _record_submission(self, job_id, input_file, outputs):
+        """Record a new job in the ``CDS_SORENSON_LEDGER`` and the estimator.
+
+        :param outputs: list of ``(output_file, preset_id)`` tuples.
+        """
+        outputs = list(outputs)
+        ledger = self.ext.ledger
+        if ledger is not None:
+            for output_file, preset_id in outputs:
+                ledger.record_submission(job_id, input_file, output_file,
+                                         preset_id)
+        estimator = self.ext.estimator
+        if estimator is not None:
+            estimator.job_submitted(
+                job_id, [preset_id for _, preset_id in outputs],
+                server=self.ext.backends.resolve(job_id)[0].name)
+
+    def _submit_job(self, json_params, backend, deadline=None):
+        """Submit a new encoding job to Sorenson.
+
+        :param json_params: JSON of the job.
+        :param backend: :class:`~cds_sorenson.backends.Backend` to submit to.
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of the
+            operation.
+        :returns: job ID.
+        """
+        backends = self.ext.backends
+        try:
+            response = self.ext.transport.post(
+                backend.url('submit', settings=self.settings),
+                endpoint=backend.endpoint('submit'), deadline=deadline,
+                headers=_HEADERS, json=json_params,
+                proxies=self.settings.proxies)
+        except (SorensonRetryableError, SorensonUnavailableError):
+            # Let the next submissions go to the other servers, unless the
+            # caller only ran out of time
+            if deadline is None or not deadline.expired:
+                backends.mark_down(backend)
+            raise
+
+        data = json.loads(response.text)
+
+        if response.status_code == requests.codes.ok:
+            job_id = data.get('JobId')
+            backends.submitted(backend, job_id)
+            return backend.job_id(job_id)
+        else:
+            # something is wrong - sorenson server is not responding or the
+            # configuration is wrong and we can't contact sorenson server
+            raise error_for_status(response.status_code, response.text)
+
+    def stop_encoding(self, job_id, deadline=None):
+        """Stop encoding job.
+
+        :param job_id: string with the job ID.
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of the
+            operation this call is part of.
+        :returns: None.
+        """
+        backend, backend_job_id = self.ext.backends.resolve(job_id)
+        response = self.ext.transport.delete(
+            backend.url('delete', backend_job_id, settings=self.settings),
+            endpoint=backend.endpoint('delete'), deadline=deadline,
+            headers=_HEADERS, proxies=self.settings.proxies)
+        if response.status_code != requests.codes.ok:
+            raise error_for_status(response.status_code, response.text)
+        self.ext.backends.finished(job_id)
+
+    def restart_encoding(self, job_id, input_file, output_file,
+                         preset_quality, display_aspect_ratio,
+                         concurrent=False, **kwargs):
+        """Try to stop the encoding job and start a new one.
+
+        It's impossible to get the input_file and preset_quality from the
+        job_id, if the job has not yet finished, so we need to specify all
+        parameters for stopping and starting the encoding job.
+
+        Both calls must be done within ``CDS_SORENSON_RESTART_DEADLINE``, or
+        :class:`~cds_sorenson.error.SorensonTimeoutError` is raised.
+
+        :param concurrent: if True, stop and start the jobs at the same time,
+            see :meth:`restart_encoding_concurrently`.
+        :returns: ID of the new job.
+        """
+        if concurrent:
+            return self.restart_encoding_concurrently(
+                job_id, input_file, output_file, preset_quality,
+                display_aspect_ratio, **kwargs).job_id
+        deadline = Deadline(self.settings.restart_deadline)
+        if self.ext.results is not None:
+            self.ext.results.delete(job_id)
+        try:
+            self.stop_encoding(job_id, deadline=deadline)
+        except SorensonError:
+            # If we failed to stop the encoding job, ignore it - in the worst
+            # case the encoding will finish and we will overwrite the file.
+            pass
+        return self.start_encoding(input_file, output_file, preset_quality,
+                                   display_aspect_ratio, deadline=deadline,
+                                   **kwargs)
+
+    def restart_encoding_concurrently(self, job_id, input_file, output_file,
+                                      preset_quality, display_aspect_ratio,
+                                      **kwargs):
+        """Stop the encoding job and start a new one at the same time.
+
+        The new job is submitted while the old one is being deleted, so a
+        restart only takes as long as the slowest of both calls. The new job
+        ID is kept in the ``CDS_SORENSON_IDEMPOTENCY_STORE`` under a key made
+        of the old job ID, the input file, the output file and the preset:
+        retrying the same restart returns the job submitted the first time
+        instead of creating a second one. A concurrent restart of the same
+        job waits for the first one to submit its job and returns it.
+
+        :returns: :class:`RestartResult` instance.
+        """
+        deadline = Deadline(self.settings.restart_deadline)
+        key = idempotency_key(
+            input_file, output_file,
+            self.get_preset_id(preset_quality, display_aspect_ratio),
+            job_id)
+        submissions = self.ext.submissions
+        if self.ext.results is not None:
+            self.ext.results.delete(job_id)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            stopping = executor.submit(self.stop_encoding, job_id,
+                                       deadline=deadline)
+            new_job_id = self._claim_restart(key, deadline)
+            resubmitted = new_job_id is None
+            if resubmitted:
+                try:
+                    new_job_id = self.start_encoding(
+                        input_file, output_file, preset_quality,
+                        display_aspect_ratio, deadline=deadline, **kwargs)
+                except Exception:
+                    if submissions is not None:
+                        submissions.pop(key)
+                    raise
+                if submissions is not None:
+                    submissions.set(key, new_job_id)
+            try:
+                stopping.result()
+            except SorensonError as e:
+                return RestartResult(new_job_id, False, resubmitted, e)
+            return RestartResult(new_job_id, True, resubmitted, None)
+        finally:
+            executor.shutdown(wait=True)
+
+    def _claim_restart(self, key, deadline):
+        """Reserve the submission of a restart.
+
+        :returns: ``None`` if the caller has to submit the new job, or the ID
+            of the job already submitted by the same restart.
+        :raises SorensonTimeoutError: if the deadline is exceeded while a
+            concurrent restart is submitting the job, or if that restart
+            didn't submit it within ``CDS_SORENSON_RESTART_CLAIM_TIMEOUT``.
+        """
+        submissions = self.ext.submissions
+        if submissions is None:
+            return None
+        while not submissions.add(
+                key, '{0}{1!r}'.format(_PENDING, time.time())):
+            value = submissions.get(key)
+            if value is None:
+                # The claim was released in the meantime
+                continue
+            if not value.startswith(_PENDING):
+                return value
+            # Another restart is submitting the job
+            claimed_at = float(value[len(_PENDING):])
+            if time.time() - claimed_at > \
+                    self.settings.restart_claim_timeout:
+                # Its worker most likely died: release the claim, so that
+                # the restart can be tried again
+                submissions.pop(key)
+                raise SorensonTimeoutError(
+                    'Concurrent restart claimed {0:.0f}s ago never '
+                    'submitted its job.'.format(time.time() - claimed_at),
+                    safe=True)
+            deadline.check()
+            time.sleep(_CLAIM_INTERVAL)
+        return None
+
+    #
+    # Status
+    #
+    def get_status(self, job_id, deadline=None):
+        """For a given job id, returns the status as JSON string.
+
+        If the job can't be found in the current queue, it's probably done,
+        so we check the archival queue. Jobs found in the archival queue are
+        remembered, so next time their status is read from there directly.
+        Raises an exception if there the response has a different code than
+        200.
+
+        :param job_id: string with the job ID.
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of both
+            lookups, by default ``CDS_SORENSON_STATUS_DEADLINE`` from now.
+        :returns: JSON with the status or empty string if the job was not
+            found.
+        """
+        settings = self.settings
+        if deadline is None:
+            deadline = Deadline(settings.status_deadline)
+        backend, backend_job_id = self.ext.backends.resolve(job_id)
+        archive_jobs_url = backend.url('archive-status', backend_job_id,
+                                       settings=settings)
+        archive_endpoint = backend.endpoint('archive-status')
+        transport = self.ext.transport
+        locations = self.ext.job_locations
+
+        if locations.get(job_id) == 'archive':
+            # Archived jobs never go back to the current queue
+            return self._status_text(transport.get(
+                archive_jobs_url, endpoint=archive_endpoint,
+                deadline=deadline, headers=_HEADERS,
+                proxies=settings.proxies))
+
+        response = transport.get(
+            backend.url('current-status', backend_job_id, settings=settings),
+            endpoint=backend.endpoint('current-status'), deadline=deadline,
+            headers=_HEADERS, proxies=settings.proxies)
+
+        if response.status_code == 404:
+            self.ext.metrics.inc('sorenson_archive_fallbacks_total')
+            response = transport.get(
+                archive_jobs_url, endpoint=archive_endpoint,
+                deadline=deadline, headers=_HEADERS,
+                proxies=settings.proxies)
+            if response.status_code == requests.codes.ok:
+                locations.set(job_id, 'archive')
+
+        return self._status_text(response)
+
+    @staticmethod
+    def _status_text(response):
+        """Return the body of a status response or raise an exception."""
+        if response.status_code == requests.codes.ok:
+            return response.text
+        else:
+            raise error_for_status(response.status_code, response.text)
+
+    def parse_status(self, job_id, status):
+        """Extract the status message and the progress from a status.
+
+        :param job_id: string with the job ID.
+        :param status: JSON string returned by :meth:`get_status`.
+        :returns: tuple with the status message and progress in %.
+        """
+        return parse_job_status(job_id, status,
+                                self.settings.statuses).result
+
+    def get_encoding_status(self, job_id):
+        """Get status of a given job from the Sorenson server.
+
+        If the job can't be found in the current queue, it's probably done,
+        so we check the archival queue. Jobs in a final status are answered
+        from the ``CDS_SORENSON_RESULT_CACHE``.
+
+        :param job_id: string with the job ID.
+        :returns: tuple with the status message and progress in %.
+        """
+        results = self.ext.results
+        if results is not None:
+            result = results.get(job_id)
+            if result is not None:
+                return result
+        return self.update_status(job_id, self.get_status(job_id))
+
+    def update_status(self, job_id, status):
+        """Record a status polled from Sorenson or notified by it.
+
+        The status is fed to the ``CDS_SORENSON_ESTIMATOR`` and to the
+        ``CDS_SORENSON_LEDGER``. A final status is kept in the
+        ``CDS_SORENSON_RESULT_CACHE``, with its outputs for
+        :meth:`get_job_result`, and sends
+        :data:`~cds_sorenson.signals.job_finished`.
+
+        :param job_id: string with the job ID.
+        :param status: JSON string returned by :meth:`get_status`.
+        :returns: tuple with the status message and progress in %.
+        """
+        return self._update_job(job_id, status).result
+
+    def _update_job(self, job_id, status):
+        """Record a status, see :meth:`update_status`.
+
+        :returns: :class:`~cds_sorenson.parsers.JobStatus` instance.
+        """
+        ext = self.ext
+        # Decode the JSON only once for the parser and the estimator
+        status_json = loads(status) if status else status
+        job = parse_job_status(job_id, status_json, self.settings.statuses)
+        if ext.estimator is not None:
+            ext.estimator.observe(
+                job_id, status_json,
+                server=ext.backends.resolve(job_id)[0].name)
+        if ext.ledger is not None:
+            ext.ledger.record_status(job_id, *job.result)
+        if job.status in self.settings.final_statuses:
+            ext.backends.finished(job_id)
+            ext.job_results.set(job_id, job)
+            if ext.results is not None:
+                ext.results.set(job_id, job.result)
+            job_finished.send(self.app, job_id=job_id, status=job.status,
+                              progress=job.progress)
+        return job
+
+    def get_job_result(self, job_id):
+        """Get the status of a job with the files it produced.
+
+        Finished jobs are answered from memory, so their outputs can be read
+        without contacting Sorenson again.
+
+        :param job_id: string with the job ID.
+        :returns: :class:`~cds_sorenson.parsers.JobStatus` instance, whose
+            ``outputs`` are empty until the job is finished.
+        """
+        job = self.ext.job_results.get(job_id)
+        if job is None:
+            job = self._update_job(job_id, self.get_status(job_id))
+        return job
+
+    def iter_encoding_statuses(self, job_ids, max_workers=None):
+        """Get the status of many jobs concurrently.
+
+        The lookups are spread over a bounded pool of threads sharing the
+        pooled transport, and the results are yielded as soon as they are
+        available.
+
+        :param job_ids: iterable with the job IDs.
+        :param max_workers: maximum number of concurrent lookups, by default
+            ``CDS_SORENSON_STATUS_MAX_WORKERS``.
+        :returns: generator of ``(job_id, result)`` tuples where the result is
+            either the ``(status, progress)`` tuple or the exception raised
+            while getting the status of this job.
+        """
+        job_ids = list(OrderedDict.fromkeys(job_ids))
+        if not job_ids:
+            return
+        max_workers = min(
+            max_workers or self.settings.status_max_workers, len(job_ids))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = dict(
+            (executor.submit(self.get_encoding_status, job_id), job_id)
+            for job_id in job_ids)
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    # e.g. a malformed status: one job must not hide the
+                    # others
+                    yield futures[future], e
+        finally:
+            # Don't keep querying Sorenson if the caller stopped iterating
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def get_encoding_statuses(self, job_ids, max_workers=None):
+        """Get the status of many jobs concurrently.
+
+        :param job_ids: iterable with the job IDs.
+        :param max_workers: maximum number of concurrent lookups, by default
+            ``CDS_SORENSON_STATUS_MAX_WORKERS``.
+        :returns: ordered dictionary mapping each job ID to either the
+            ``(status, progress)`` tuple or the exception raised for this
+            job.
+        """
+        job_ids = list(OrderedDict.fromkeys(job_ids))
+        results = dict(self.iter_encoding_statuses(
+            job_ids, max_workers=max_workers))
+        return OrderedDict((job_id, results[job_id]) for job_id in job_ids)
+
+    #
+    # Presets
+    #
+    def get_presets_by_aspect_ratio(self, aspect_ratio):
+        """Return the list of preset IDs for a given aspect ratio."""
+        preset_ids = self.settings.presets.preset_ids.get(aspect_ratio)
+        if preset_ids is None:
+            raise InvalidAspectRatioError(aspect_ratio)
+        return list(preset_ids)
+
+    def get_available_aspect_ratios(self, pairs=False):
+        """Return all available aspect ratios.
+
+        :param pairs: if True, will return aspect ratios as pairs of integers
+        """
+        presets = self.settings.presets
+        return list(presets.ratio_pairs if pairs else presets.ratios)
+
+    def get_available_preset_qualities(self):
+        """Return all available preset qualities."""
+        return list(self.settings.presets.qualities)
+
+    def get_preset_id(self, preset_quality, display_aspect_ratio, **kwargs):
+        """Return the preset ID of the requested quality on given aspect ratio.
+
+        An aspect ratio which is not configured, e.g. ``'1920:1088'``, is
+        replaced by the closest configured one if they differ by less than
+        ``CDS_SORENSON_ASPECT_RATIO_TOLERANCE``.
+
+        :param preset_quality: the preset quality to use
+        :param display_aspect_ratio: the video's aspect ratio
+        :returns the corresponding preset ID or `None` if the given aspect
+        ratio does not support this quality
+        """
+        settings = self.settings
+        presets = settings.presets
+        preset = presets.get(display_aspect_ratio, preset_quality)
+        if preset is None:
+            if display_aspect_ratio not in presets.aspect_ratios:
+                nearest = presets.nearest_aspect_ratio(
+                    ratio_value(display_aspect_ratio),
+                    settings.aspect_ratio_tolerance)
+                if nearest is None:
+                    raise InvalidAspectRatioError(display_aspect_ratio)
+                return self.get_preset_id(preset_quality, nearest)
+            raise InvalidResolutionError(display_aspect_ratio,
+                                         preset_quality)
+        return preset['preset_id']
+
+    def get_presets_for_source(self, width, height, frame_rate=None,
+                               tolerance=None):
+        """Return the aspect ratio and the qualities to encode a video with.
+
+        The aspect ratio is the configured one closest to ``width / height``,
+        and the qualities are the ones which don't upscale the video. If no
+        quality is left, the lowest one is kept, so that every video gets at
+        least one rendition. Like in
+        :func:`~cds_sorenson.planner.plan_ladder`, the presets above the
+        frame rate of the video are not left out, so low frame rate videos,
+        e.g. screen recordings, still get every resolution.
+
+        :param width: width of the video in pixels, after applying its sample
+            aspect ratio.
+        :param height: height of the video in pixels.
+        :param frame_rate: frame rate of the video, if known. Kept for
+            compatibility, it doesn't change the qualities.
+        :param tolerance: maximum relative difference between the aspect
+            ratio of the video and the chosen one, or ``None`` to always pick
+            the closest.
+        :returns: tuple with the aspect ratio and the list of qualities,
+            lowest resolution first.
+        """
+        presets = self.settings.presets
+        aspect_ratio = presets.nearest_aspect_ratio(
+            ratio_value('{0}:{1}'.format(width, height)), tolerance)
+        if aspect_ratio is None:
+            raise InvalidAspectRatioError('{0}:{1}'.format(width, height))
+        candidates = presets.presets_up_to(aspect_ratio, height)
+        if not candidates:
+            candidates = presets.presets_up_to(aspect_ratio,
+                                               float('inf'))[:1]
+        return aspect_ratio, [preset.quality for preset in candidates]
+
+    def get_preset_info(self, aspect_ratio, preset_quality):
+        """Return technical information about given preset.
+
+        :returns: a new dictionary, or ``None`` if there is no such preset.
+        """
+        preset = self.settings.presets.get(aspect_ratio, preset_quality)
+        return dict(preset) if preset is not None else None
+
+    #
+    # Job JSON
+    #
+    def filepath_for_samba(self, filepath):
+        """Adjust file path for Samba protocol.
+
+        Sorenson has the eos directory mounted through samba, so the paths
+        need to be adjusted.
+        """
+        settings = self.settings
+        return filepath.replace(settings.cds_directory,
+                                settings.samba_directory)
+
+    def generate_json_for_encoding(self, input_file, output_file, preset_id,
+                                   queue_id=None, server=None):
+        """Generate JSON that will be sent to Sorenson to start encoding."""
+        return self._generate_job_json(
+            'CDS File:{0} Preset:{1}'.format(input_file, preset_id),
+            input_file, [(output_file, preset_id)], queue_id, server)
+
+    def generate_json_for_ladder_encoding(self, input_file, outputs,
+                                          queue_id=None, server=None):
+        """Generate JSON to encode one file with several presets in one job.
+
+        :param input_file: the file to encode.
+        :param outputs: list of ``(output_file, preset_id)`` tuples.
+        :param queue_id: Sorenson queue, by default
+            ``CDS_SORENSON_DEFAULT_QUEUE``.
+        :param server: name of the server of ``CDS_SORENSON_BACKENDS`` the
+            job is submitted to, if any.
+        """
+        return self._generate_job_json(
+            'CDS File:{0} Presets:{1}'.format(
+                input_file, ','.join(preset_id for _, preset_id in outputs)),
+            input_file, outputs, queue_id, server)
+
+    def _generate_job_json(self, name, input_file, outputs, queue_id=None,
+                           server=None):
+        """Generate the JSON of an encoding job with one or more presets."""
+        settings = self.settings
+        for _, preset_id in outputs:
+            # Make sure the preset config exists for a given preset_id
+            if not settings.presets.get_by_id(preset_id):
+                raise SorensonError('Invalid preset "{0}"'.format(preset_id))
+
+        job = dict(
+            Name=name,
+            QueueId=queue_id or settings.default_queue,
+            JobMediaInfo=dict(
+                SourceMediaList=[dict(
+                    FileUri=input_file,
+                    UserName=settings.username,
+                    Password=settings.password,
+                )],
+                DestinationList=[dict(FileUri='{}'.format(output_file))
+                                 for output_file, _ in outputs],
+                CompressionPresetList=[dict(PresetId=preset_id)
+                                       for _, preset_id in outputs],
+            ),
+        )
+        notification_url = self._notification_url(server)
+        if notification_url:
+            job['NotificationUrl'] = notification_url
+        return job
+
+    def _notification_url(self, server=None):
+        """Return the URL Sorenson must call when a job finishes, if any.
+
+        :param server: name of the server running the job, so that the
+            notification gives back the full job ID.
+        """
+        settings = self.settings
+        if not settings.notifications_enabled:
+            return None
+        url, token = settings.notification_url, settings.notification_token
+        params = [('token', token)]
+        if server:
+            params.append(('server', server))
+        return '{0}{1}{2}'.format(url, '&' if '?' in url else '?',
+                                  urlencode(params))
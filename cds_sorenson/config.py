@@ -343,3 +343,322 @@ CDS_SORENSON_SAMBA_DIRECTORY = 'file://cernbox-smb.cern.ch/eoscds/'
 
 CDS_SORENSON_CDS_DIRECTORY = '/eos/workspace/c/cds/'
 """Video base file location in CDS."""
+
+CDS_SORENSON_POOL_CONNECTIONS = 4
+"""Number of per-host connection pools kept open to the Sorenson servers."""
+
+CDS_SORENSON_POOL_MAXSIZE = 16
+"""Maximum number of keep-alive connections kept open per Sorenson host."""
+
+CDS_SORENSON_POOL_BLOCK = False
+"""Wait for a free pooled connection instead of opening a new one.
+
+If True, ``CDS_SORENSON_POOL_MAXSIZE`` becomes a hard limit on the number of
+concurrent connections to the same Sorenson host.
+"""
+
+CDS_SORENSON_KEEP_ALIVE = True
+"""Keep the connections to Sorenson open between calls."""
+
+CDS_SORENSON_STATUS_MAX_WORKERS = 16
+"""Maximum number of concurrent status lookups of ``get_encoding_statuses``.
+
+Keep it in line with ``CDS_SORENSON_POOL_MAXSIZE``, so each worker can reuse
+a pooled connection.
+"""
+
+CDS_SORENSON_AIO_MAX_CONCURRENCY = 100
+"""Maximum number of concurrent requests of the asyncio client."""
+
+CDS_SORENSON_FINAL_STATUSES = ('Finished', 'Error', 'Canceled', 'Deleted')
+"""Statuses after which a job never changes again."""
+
+CDS_SORENSON_POLL_INTERVALS = {
+    'Undefined': 60,
+    'Waiting': 120,
+    'Downloading': 30,
+    'Transcoding': 30,
+    'Uploading': 10,
+    'Hold': 120,
+    'Incomplete': 60,
+}
+"""Base number of seconds between two status checks of a job, per status.
+
+Jobs that don't move are polled less and less often, up to
+``CDS_SORENSON_POLL_MAX_INTERVAL``, while running jobs are polled more often
+when they get close to 100%, down to ``CDS_SORENSON_POLL_MIN_INTERVAL``.
+"""
+
+CDS_SORENSON_POLL_MIN_INTERVAL = 5
+"""Minimum number of seconds between two status checks of a job."""
+
+CDS_SORENSON_POLL_MAX_INTERVAL = 600
+"""Maximum number of seconds between two status checks of a job."""
+
+CDS_SORENSON_LOCATION_CACHE_SIZE = 10000
+"""Number of jobs known to be archived, to check their status directly there.
+
+Set it to ``0`` to always check the current jobs first.
+"""
+
+CDS_SORENSON_LOCATION_CACHE_TTL = 24 * 60 * 60
+"""Number of seconds to remember that a job is archived."""
+
+CDS_SORENSON_RESULT_CACHE = 'cds_sorenson.cache.MemoryResultCache'
+"""Cache of the jobs in a final status, or ``None`` to disable it.
+
+Jobs in one of ``CDS_SORENSON_FINAL_STATUSES`` never change again, so their
+status is answered from this cache without contacting Sorenson. To share it
+between all the workers of a host, use a SQLite database:
+
+.. code-block:: python
+
+    CDS_SORENSON_RESULT_CACHE = 'cds_sorenson.cache.SQLiteResultCache'
+    CDS_SORENSON_RESULT_CACHE_OPTIONS = {
+        'path': '/var/tmp/sorenson-results.db',
+        'maxsize': 100000,
+    }
+"""
+
+CDS_SORENSON_RESULT_CACHE_OPTIONS = {'maxsize': 10000}
+"""Keyword arguments to create the ``CDS_SORENSON_RESULT_CACHE``."""
+
+CDS_SORENSON_JOB_RESULT_CACHE_SIZE = 1000
+"""Number of finished jobs whose outputs are kept in memory.
+
+See :func:`cds_sorenson.api.get_job_result`.
+"""
+
+CDS_SORENSON_RETRY_MAX_ATTEMPTS = 3
+"""Maximum number of attempts of a call failing with a retryable error.
+
+Connection errors, timeouts, 5xx and 429 responses are retried. Submissions
+are only retried if they didn't reach Sorenson.
+"""
+
+CDS_SORENSON_RETRY_BACKOFF_BASE = 0.5
+"""Maximum number of seconds to wait before the first retry.
+
+It is doubled after each attempt and the actual delay is chosen randomly
+between 0 and this value (full jitter).
+"""
+
+CDS_SORENSON_RETRY_BACKOFF_MAX = 10
+"""Maximum number of seconds to wait between two attempts."""
+
+CDS_SORENSON_RETRY_DEADLINE = 30
+"""Number of seconds after which a failing call is not retried anymore."""
+
+CDS_SORENSON_RETRY_BUDGET_RATIO = 0.2
+"""Maximum number of retries per call, on average."""
+
+CDS_SORENSON_RETRY_BUDGET_MIN = 10
+"""Number of retries allowed in a burst, regardless of the ratio."""
+
+CDS_SORENSON_CIRCUIT_BREAKER_STORAGE = \
+    'cds_sorenson.breaker.MemoryBreakerStorage'
+"""Storage of the circuit breakers state, or ``None`` to disable them.
+
+Each endpoint (``submit``, ``delete``, ``current-status`` and
+``archive-status``) has its own circuit breaker. To share their state
+between all the workers of a host, so that only a few of them wait for a
+Sorenson server which is down, use a SQLite database:
+
+.. code-block:: python
+
+    CDS_SORENSON_CIRCUIT_BREAKER_STORAGE = \
+        'cds_sorenson.breaker.SQLiteBreakerStorage'
+    CDS_SORENSON_CIRCUIT_BREAKER_STORAGE_OPTIONS = {
+        'path': '/var/tmp/sorenson-breakers.db',
+    }
+"""
+
+CDS_SORENSON_CIRCUIT_BREAKER_STORAGE_OPTIONS = {}
+"""Keyword arguments to create the ``CDS_SORENSON_CIRCUIT_BREAKER_STORAGE``.
+"""
+
+CDS_SORENSON_CIRCUIT_BREAKER_THRESHOLD = 5
+"""Number of consecutive failures after which an endpoint is not called."""
+
+CDS_SORENSON_CIRCUIT_BREAKER_RECOVERY = 30
+"""Number of seconds after which a failing endpoint is tried again."""
+
+CDS_SORENSON_METRICS_SINK = 'cds_sorenson.metrics.InMemoryMetrics'
+"""Where to report the latency, status and size of every call to Sorenson.
+
+Set it to ``None`` to disable the metrics.
+"""
+
+CDS_SORENSON_METRICS_SINK_OPTIONS = {}
+"""Keyword arguments to create the ``CDS_SORENSON_METRICS_SINK``."""
+
+CDS_SORENSON_TIMEOUTS = {
+    'submit': (3.05, 30),
+    'delete': (3.05, 10),
+    'current-status': (3.05, 10),
+    'archive-status': (3.05, 10),
+}
+"""Connect and read timeouts in seconds of each Sorenson endpoint.
+
+Each value is passed as the ``timeout`` of :mod:`requests`, either a
+``(connect, read)`` tuple or a single number for both.
+"""
+
+CDS_SORENSON_DEFAULT_TIMEOUT = (3.05, 10)
+"""Connect and read timeouts of the endpoints missing from
+``CDS_SORENSON_TIMEOUTS``."""
+
+CDS_SORENSON_STATUS_DEADLINE = 30
+"""Number of seconds to get the status of a job.
+
+It covers the lookup in the current and then in the archive queue, with their
+retries. Set it to ``None`` to only rely on the timeout of each call.
+"""
+
+CDS_SORENSON_RESTART_DEADLINE = 60
+"""Number of seconds to stop a job and start it again, or ``None``."""
+
+CDS_SORENSON_IDEMPOTENCY_STORE = 'cds_sorenson.cache.LRUCache'
+"""Store of the jobs submitted by a concurrent restart, or ``None``.
+
+It maps a key of the old job ID, input file, output file and preset to the ID
+of the new job, so a retried restart doesn't submit the same job twice. Any
+object with ``get``, ``set``, ``pop`` and an atomic ``add`` (store if absent,
+returning ``True`` if stored) methods can be used, e.g. to share the keys
+between hosts.
+"""
+
+CDS_SORENSON_IDEMPOTENCY_STORE_OPTIONS = {'maxsize': 10000, 'ttl': 86400}
+"""Keyword arguments to create the ``CDS_SORENSON_IDEMPOTENCY_STORE``."""
+
+CDS_SORENSON_RESTART_CLAIM_TIMEOUT = 120
+"""Number of seconds a concurrent restart may take to submit its job.
+
+A retry of the same restart waits for it at most until then, even without
+``CDS_SORENSON_RESTART_DEADLINE``. Older claims are left by a worker which
+died, they are released and the retry fails with
+:class:`~cds_sorenson.error.SorensonTimeoutError`.
+"""
+
+CDS_SORENSON_LEDGER = None
+"""Ledger of the submitted jobs, or ``None`` to disable it.
+
+Every submission is recorded with its input file, output file, preset and
+last known status, so the jobs can be found again after a crash:
+
+.. code-block:: python
+
+    CDS_SORENSON_LEDGER = 'cds_sorenson.ledger.JobLedger'
+    CDS_SORENSON_LEDGER_OPTIONS = {'path': '/var/tmp/sorenson-jobs.db'}
+"""
+
+CDS_SORENSON_LEDGER_OPTIONS = {}
+"""Keyword arguments to create the ``CDS_SORENSON_LEDGER``."""
+
+CDS_SORENSON_MAX_IN_FLIGHT = 50
+"""Maximum number of jobs a process keeps in flight on a Sorenson queue.
+
+Only used by :class:`cds_sorenson.scheduler.SubmissionScheduler`.
+"""
+
+CDS_SORENSON_QUEUE_MAX_IN_FLIGHT = {}
+"""Maximum number of jobs in flight of specific queues.
+
+The keys are queue IDs, applying to the queue on every server, or tuples of a
+``CDS_SORENSON_BACKENDS`` name and a queue ID.
+"""
+
+CDS_SORENSON_BACKENDS = {}
+"""Pool of Sorenson servers to spread the submissions on, by name.
+
+.. code-block:: python
+
+    CDS_SORENSON_BACKENDS = {
+        'sorenson01': {'url': 'http://sorenson01.cern.ch', 'weight': 2},
+        'sorenson02': {
+            'url': 'http://sorenson02.cern.ch',
+            'queue_id': '3c2bb1f0-2cc2-4ea2-a4d6-8d4c1d76c7b2',
+        },
+    }
+
+The URLs of each server have the paths of the ``CDS_SORENSON_*_URL``
+settings, unless ``submit_url``, ``delete_url``, ``current_status_url`` or
+``archive_status_url`` are given. The IDs of their jobs are prefixed with
+the name of the server. If empty, all the jobs go to the server of the
+``CDS_SORENSON_*_URL`` settings.
+"""
+
+CDS_SORENSON_ROUTING = 'round-robin'
+"""How to choose the server of a submission.
+
+``'round-robin'``, ``'least-outstanding'`` (fewest unfinished jobs) or
+``'weighted'`` (in proportion to the ``weight`` of each server).
+"""
+
+CDS_SORENSON_BACKEND_RECOVERY = 30
+"""Number of seconds a failing server is left out of the rotation."""
+
+CDS_SORENSON_BACKEND_OUTSTANDING_TTL = 24 * 60 * 60
+"""Number of seconds a job counts as unfinished for ``'least-outstanding'``.
+
+Jobs whose final status is never checked stop counting against their
+server after this time. ``None`` counts them until they are seen finishing.
+"""
+
+CDS_SORENSON_ASPECT_RATIO_TOLERANCE = 0.03
+"""Maximum relative difference to replace an unknown aspect ratio.
+
+An aspect ratio missing from ``CDS_SORENSON_PRESETS``, e.g. ``'1920:1088'``,
+is replaced by the closest configured one if they differ by less than this
+fraction. Set it to ``0`` to only accept the configured aspect ratios.
+"""
+
+CDS_SORENSON_FRAME_RATE_TOLERANCE = 0.1
+"""Fraction by which a preset may exceed the frame rate of a video.
+
+Qualities above it are still encoded, with a note in the ladder plan.
+"""
+
+CDS_SORENSON_LADDER_MIN_BITRATE_STEP = 1.25
+"""Minimum ratio between the bitrates of two qualities of a ladder.
+
+When planning the presets of a video, a quality whose bitrate is less than
+this factor below the next higher quality is not encoded.
+"""
+
+CDS_SORENSON_ENCODER_PIXEL_RATE = 100000000
+"""Number of output pixels per second an encoder produces.
+
+Used to estimate the encoding time of a ladder plan.
+"""
+
+CDS_SORENSON_ESTIMATOR = 'cds_sorenson.estimator.EncodingEstimator'
+"""Estimator of the encoding time of the jobs, fed with their statuses.
+
+Set it to ``None`` to disable the estimates.
+"""
+
+CDS_SORENSON_ESTIMATOR_OPTIONS = {'window': 100, 'max_jobs': 10000}
+"""Options of ``CDS_SORENSON_ESTIMATOR``.
+
+``window`` is the number of samples kept per preset and per server.
+"""
+
+CDS_SORENSON_NOTIFICATION_URL = None
+"""URL Sorenson calls when a job finishes, instead of being polled.
+
+It is the URL of the ``cds_sorenson.notification`` view as seen from the
+Sorenson servers, e.g. ``'https://cds.cern.ch/sorenson/notifications'``.
+Requires ``CDS_SORENSON_NOTIFICATION_TOKEN``.
+"""
+
+CDS_SORENSON_NOTIFICATION_TOKEN = None
+"""Secret Sorenson must give back to notify the end of a job."""
+
+CDS_SORENSON_NOTIFICATION_POLL_INTERVAL = 900
+"""Minimum number of seconds between two status checks of a job.
+
+Only used when both ``CDS_SORENSON_NOTIFICATION_URL`` and
+``CDS_SORENSON_NOTIFICATION_TOKEN`` are set, to catch the jobs whose
+notification got lost.
+"""
@@ -63,3 +63,104 @@ class InvalidResolutionError(SorensonError):
         """Error message."""
         return 'Aspect ratio "{0}" does not support resolution {1}.'.format(
             self.aspect_ratio, self.resolution)
+
+
+class SorensonRetryableError(SorensonError):
+    """Error of a call that may succeed if it is tried again."""
+
+    safe = False
+    """True if the request didn't reach Sorenson, so it is safe to send it
+    again even if it is not idempotent."""
+
+
+class SorensonFatalError(SorensonError):
+    """Error of a call that will fail again if it is retried."""
+
+
+class SorensonConnectionError(SorensonRetryableError):
+    """Error connecting to Sorenson."""
+
+    def __init__(self, error_message='', safe=False):
+        """Initialize exception with error message."""
+        super(SorensonConnectionError, self).__init__(error_message)
+        self.safe = safe
+
+
+class SorensonTimeoutError(SorensonRetryableError):
+    """Error for calls which didn't finish in time."""
+
+    def __init__(self, error_message='', safe=False):
+        """Initialize exception with error message."""
+        super(SorensonTimeoutError, self).__init__(error_message)
+        self.safe = safe
+
+
+class _HTTPErrorMixin(object):
+    """Keep the status code and the body of an error response."""
+
+    def __init__(self, status_code, text=''):
+        """Initialize exception with status code and response body."""
+        super(_HTTPErrorMixin, self).__init__(
+            '{0}: {1}'.format(status_code, text))
+        self.status_code = status_code
+        self.text = text
+
+
+class SorensonServerError(_HTTPErrorMixin, SorensonRetryableError):
+    """Error for 5xx responses."""
+
+
+class SorensonRateLimitError(_HTTPErrorMixin, SorensonRetryableError):
+    """Error for 429 responses, the request was not processed."""
+
+    safe = True
+
+    def __init__(self, status_code, text='', retry_after=None):
+        """Initialize exception with status code and ``Retry-After``."""
+        super(SorensonRateLimitError, self).__init__(status_code, text)
+        self.retry_after = retry_after
+
+
+class SorensonClientError(_HTTPErrorMixin, SorensonFatalError):
+    """Error for any other unexpected response, e.g. 4xx."""
+
+
+def error_for_status(status_code, text='', retry_after=None):
+    """Return the exception matching an unexpected response status.
+
+    :param status_code: HTTP status code of the response.
+    :param text: body of the response.
+    :param retry_after: value of the ``Retry-After`` header, if any.
+    """
+    if status_code == 429:
+        try:
+            retry_after = float(retry_after)
+        except (TypeError, ValueError):
+            retry_after = None
+        return SorensonRateLimitError(status_code, text, retry_after)
+    if status_code >= 500:
+        return SorensonServerError(status_code, text)
+    return SorensonClientError(status_code, text)
+
+
+class SorensonUnavailableError(SorensonError):
+    """Error for calls not sent because the Sorenson endpoint is down."""
+
+    def __init__(self, endpoint, retry_in=None):
+        """Initialize exception with the endpoint name."""
+        super(SorensonUnavailableError, self).__init__(
+            'Sorenson endpoint "{0}" is unavailable.'.format(endpoint))
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class SorensonQueueFullError(SorensonError):
+    """Error for jobs not submitted because the queue has no free slot."""
+
+    def __init__(self, queue_id, limit):
+        """Initialize exception with the queue and its limit."""
+        super(SorensonQueueFullError, self).__init__(
+            'Sorenson queue "{0}" already has {1} jobs in flight.'.format(
+                queue_id, limit))
+        self.queue_id = queue_id
+        self.limit = limit
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Estimates of the encoding and queueing time of the jobs.
+
+Every status fetched by :func:`~cds_sorenson.api.get_encoding_status` is fed
+to the ``CDS_SORENSON_ESTIMATOR``, which keeps the last samples of each preset
+and of each server in bounded ring buffers:
+
+* the size of the source and the encoding time of the finished jobs, from
+  which the throughput of each preset is fitted;
+* the time the jobs waited before being started, per server.
+
+Only the successful jobs seen running at least once are sampled, since the
+size of the source is missing from the archived statuses.
+"""
+
+from __future__ import absolute_import, print_function
+
+import calendar
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from .cache import LRUCache
+from .parsers import loads
+
+logger = logging.getLogger(__name__)
+
+TRANSCODING = 3
+"""Sorenson status of the jobs being encoded."""
+
+UPLOADING = 4
+"""Sorenson status of the jobs uploading their output files."""
+
+FINISHED = 5
+"""Sorenson status of the successful jobs."""
+
+
+def parse_iso8601(value):
+    """Return the POSIX timestamp of a Sorenson ``*Iso8601`` date.
+
+    :param value: date like ``'2016-08-19T12:34:24.0000000Z'``.
+    :returns: number of seconds, or ``None`` if the date is missing.
+    """
+    if not value:
+        return None
+    seconds, _, fraction = value.rstrip('Z').partition('.')
+    try:
+        parsed = datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S')
+        return calendar.timegm(parsed.timetuple()) + \
+            float('0.' + (fraction or '0'))
+    except ValueError:
+        return None
+
+
+def _preset_key(preset_ids):
+    """Return the key of the samples of a preset or of a list of presets."""
+    if isinstance(preset_ids, (list, tuple)):
+        return ','.join(sorted(preset_ids))
+    return preset_ids
+
+
+class _JobState(object):
+    """What is known of a job to estimate its completion."""
+
+    __slots__ = ('presets', 'server', 'size', 'started', 'stage',
+                 'progress', 'rate', 'observed_at', 'finished_at')
+
+    def __init__(self, presets=None, server=None, size=None,
+                 observed_at=None):
+        self.presets = presets
+        self.server = server
+        self.size = size
+        self.started = None
+        self.stage = None
+        self.progress = None
+        self.rate = None
+        self.observed_at = observed_at
+        self.finished_at = None
+
+
+class EncodingEstimator(object):
+    """Encoding time and queue wait estimates from the observed jobs.
+
+    .. code-block:: python
+
+        estimator = current_cds_sorenson.estimator
+        estimator.estimate_cost(28335481, preset_id)  # seconds
+        estimator.estimate_completion(job_id)  # POSIX timestamp
+    """
+
+    def __init__(self, window=100, max_jobs=10000, clock=time.time):
+        """Initialize the estimator.
+
+        :param window: number of samples kept per preset and per server.
+        :param max_jobs: maximum number of jobs followed at the same time.
+        :param clock: function returning the current time in seconds.
+        """
+        self.window = window
+        self.clock = clock
+        self._jobs = LRUCache(max_jobs)
+        self._durations = {}
+        self._waits = {}
+        self._lock = threading.Lock()
+
+    def _sample(self, buffers, key, value):
+        """Append a sample to the ring buffer of ``key``."""
+        samples = buffers.get(key)
+        if samples is None:
+            samples = buffers[key] = deque(maxlen=self.window)
+        samples.append(value)
+
+    def job_submitted(self, job_id, preset_ids, server=None,
+                      source_size=None):
+        """Start following a new job.
+
+        :param job_id: string with the job ID.
+        :param preset_ids: preset ID of the job, or list of preset IDs of a
+            ladder job.
+        :param server: name of the server the job was submitted to.
+        :param source_size: size of the input file in bytes, if known.
+        """
+        self._jobs.set(job_id, _JobState(
+            _preset_key(preset_ids), server, source_size, self.clock()))
+
+    def observe(self, job_id, status, server=None):
+        """Record the samples of a status fetched from Sorenson.
+
+        :param job_id: string with the job ID.
+        :param status: JSON string returned by
+            :func:`~cds_sorenson.utils.get_status`, or its decoded value.
+        :param server: name of the server running the job.
+        """
+        if not status:
+            # The job was canceled
+            self._jobs.pop(job_id)
+            return
+        try:
+            status_json = status if isinstance(status, dict) \
+                else loads(status)
+        except ValueError:
+            logger.warning('Invalid status of job {0}'.format(job_id))
+            return
+        now = self.clock()
+        running = status_json.get('Status') or {}
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = _JobState(server=server)
+            self._jobs.set(job_id, job)
+        with self._lock:
+            if job.finished_at is not None:
+                return
+            job.server = job.server or server
+            job.size = status_json.get('TotalSourceSize') or job.size
+            if job.presets is None:
+                preset_ids = [
+                    preset.get('PresetId') for preset in
+                    status_json.get('CompressionPresetList') or []]
+                if preset_ids and all(preset_ids):
+                    job.presets = _preset_key(preset_ids)
+
+            submitted = parse_iso8601(status_json.get('TimeSubmittedIso8601'))
+            started = parse_iso8601(
+                running.get('TimeStartedIso8601') or
+                status_json.get('TimeStartedIso8601'))
+            if job.started is None and started is not None:
+                job.started = started
+                if submitted is not None and started >= submitted:
+                    self._sample(self._waits, job.server, started - submitted)
+
+            if 'StatusStateId' in status_json:
+                job.finished_at = now
+                finished = parse_iso8601(
+                    status_json.get('TimeFinishedIso8601'))
+                if status_json['StatusStateId'] == FINISHED and job.size \
+                        and job.presets and started is not None \
+                        and finished is not None and finished >= started:
+                    self._sample(self._durations, job.presets,
+                                 (job.size, finished - started))
+                return
+
+            # The progress is the one of the current step of the job
+            stage = running.get('Status')
+            progress = running.get('Progress')
+            if progress is not None:
+                if stage == job.stage and job.progress is not None and \
+                        progress > job.progress and now > job.observed_at:
+                    job.rate = (progress - job.progress) / \
+                        (now - job.observed_at)
+                elif stage != job.stage:
+                    job.rate = None
+                job.stage = stage
+                job.progress = progress
+            job.observed_at = now
+
+    def _fit(self, presets):
+        """Fit the encoding time of a preset against the size of the source.
+
+        :returns: tuple with the fixed time in seconds and the time per byte,
+            or ``None`` if there are no samples.
+        """
+        with self._lock:
+            samples = list(self._durations.get(presets, ()))
+        if not samples:
+            return None
+        count = float(len(samples))
+        total_size = sum(size for size, _ in samples)
+        total_time = sum(seconds for _, seconds in samples)
+        mean_size = total_size / count
+        mean_time = total_time / count
+        variance = sum((size - mean_size) ** 2 for size, _ in samples)
+        if variance > 0:
+            slope = sum((size - mean_size) * (seconds - mean_time)
+                        for size, seconds in samples) / variance
+            intercept = mean_time - slope * mean_size
+            if slope > 0 and intercept >= 0:
+                return intercept, slope
+        # Not enough different sizes to tell the fixed time apart
+        return 0.0, total_time / float(total_size)
+
+    def throughput(self, preset_id):
+        """Return the number of source bytes per second a preset encodes.
+
+        :param preset_id: preset ID, or list of preset IDs of a ladder job.
+        :returns: number of bytes per second, or ``None`` if unknown.
+        """
+        fit = self._fit(_preset_key(preset_id))
+        if fit is None or not fit[1]:
+            return None
+        return 1 / fit[1]
+
+    def queue_wait(self, server=None):
+        """Return the median time the jobs of a server waited to start.
+
+        :param server: name of the server, ``None`` for the default one.
+        :returns: number of seconds, or ``None`` if unknown.
+        """
+        with self._lock:
+            samples = sorted(self._waits.get(server, ()))
+        if not samples:
+            return None
+        middle = len(samples) // 2
+        if len(samples) % 2:
+            return samples[middle]
+        return (samples[middle - 1] + samples[middle]) / 2.0
+
+    def estimate_cost(self, source_size, preset_id):
+        """Return the expected encoding time of a source.
+
+        :param source_size: size of the input file in bytes.
+        :param preset_id: preset ID, or list of preset IDs of a ladder job.
+        :returns: number of seconds, or ``None`` if the preset was never
+            sampled.
+        """
+        fit = self._fit(_preset_key(preset_id))
+        if fit is None:
+            return None
+        intercept, slope = fit
+        return intercept + slope * source_size
+
+    def estimate_completion(self, job_id):
+        """Return when a job is expected to finish.
+
+        Waiting jobs are estimated from the usual queue wait of their
+        server. As the progress of a running job starts again from 0 at each
+        of its stages, it is only extrapolated while the job is transcoding:
+        a job still downloading its input has the whole encoding ahead of
+        it, and a job uploading its output is about to finish.
+
+        :param job_id: string with the job ID.
+        :returns: POSIX timestamp, or ``None`` if unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.finished_at is not None:
+            return job.finished_at
+        cost = None
+        if job.size and job.presets:
+            cost = self.estimate_cost(job.size, job.presets)
+        if job.started is None:
+            if cost is None:
+                return None
+            return job.observed_at + (self.queue_wait(job.server) or 0) + \
+                cost
+        progress = job.progress or 0
+        if job.stage == TRANSCODING:
+            if cost is not None:
+                return job.observed_at + cost * (100 - progress) / 100.0
+            if job.rate:
+                return job.observed_at + (100 - progress) / job.rate
+            return None
+        if job.stage == UPLOADING:
+            if job.rate:
+                return job.observed_at + (100 - progress) / job.rate
+            return job.observed_at
+        if cost is not None:
+            return job.observed_at + cost
+        return None
@@ -29,6 +29,13 @@ from __future__ import absolute_import, print_function
 import os
 
 from . import config
+from .backends import BackendPool
+from .cache import LRUCache
+from .client import SorensonClient
+from .settings import SorensonSettings
+from .transport import SorensonTransport
+from .utils import load_from_config
+from .views import blueprint
 
 
 class CDSSorenson(object):
@@ -36,16 +43,47 @@ class CDSSorenson(object):
 
     def __init__(self, app=None):
         """Extension initialization."""
+        self.settings = None
         if app:
             self.init_app(app)
 
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        self.metrics = load_from_config(app.config,
+                                        'CDS_SORENSON_METRICS_SINK')
+        self.transport = SorensonTransport.from_config(app.config,
+                                                       metrics=self.metrics)
+        # The transport swaps a missing sink for one discarding everything
+        self.metrics = self.transport.metrics
+        self.job_locations = LRUCache(
+            app.config['CDS_SORENSON_LOCATION_CACHE_SIZE'],
+            ttl=app.config['CDS_SORENSON_LOCATION_CACHE_TTL'],
+        )
+        self.results = load_from_config(app.config,
+                                        'CDS_SORENSON_RESULT_CACHE')
+        self.job_results = LRUCache(
+            app.config['CDS_SORENSON_JOB_RESULT_CACHE_SIZE'])
+        self.submissions = load_from_config(app.config,
+                                            'CDS_SORENSON_IDEMPOTENCY_STORE')
+        self.ledger = load_from_config(app.config, 'CDS_SORENSON_LEDGER')
+        self.estimator = load_from_config(app.config,
+                                          'CDS_SORENSON_ESTIMATOR')
+        self.backends = BackendPool.from_config(app.config)
+        if blueprint.name not in app.blueprints:
+            app.register_blueprint(blueprint)
         app.extensions['cds-sorenson'] = self
+        self.client = SorensonClient(app)
 
     def init_config(self, app):
-        """Initialize configuration."""
+        """Initialize configuration.
+
+        It takes the snapshot of the settings used by the client, so it must
+        be called again after changing the configuration. The objects created
+        by :meth:`init_app`, e.g. the transport, the backends or the caches,
+        are only rebuilt by calling :meth:`init_app` again, see
+        :mod:`cds_sorenson.settings`.
+        """
         for k in dir(config):
             if k.startswith('CDS_SORENSON_'):
                 app.config.setdefault(k, getattr(config, k))
@@ -56,3 +94,9 @@ class CDSSorenson(object):
                 'http': os.environ.get('APP_CDS_SORENSON_PROXIES_HTTP'),
                 'https': os.environ.get('APP_CDS_SORENSON_PROXIES_HTTPS')
             }
+        self.settings = SorensonSettings(app.config)
+
+    @property
+    def presets(self):
+        """Compiled presets of the application."""
+        return self.settings.presets
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Local ledger of the jobs submitted to Sorenson.
+
+Every submission is recorded in a SQLite database, together with the last
+known status of the job, so the jobs can still be found after a worker
+crashed and their status can be queried locally:
+
+.. code-block:: python
+
+    CDS_SORENSON_LEDGER = 'cds_sorenson.ledger.JobLedger'
+    CDS_SORENSON_LEDGER_OPTIONS = {'path': '/var/tmp/sorenson-jobs.db'}
+
+The writes are queued and done in batches by a background thread, so the
+submissions don't wait for the disk. The queued writes are flushed when the
+interpreter exits. Call :func:`reconcile` when a worker
+starts to resume tracking the unfinished jobs.
+"""
+
+from __future__ import absolute_import, print_function
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+from .error import SorensonClientError
+from .proxies import current_cds_sorenson
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+MISSING = 'Missing'
+"""Status recorded for the jobs which Sorenson doesn't know anymore."""
+
+_LEDGERS = weakref.WeakSet()
+"""Ledgers to close when the interpreter exits."""
+
+_COLUMNS = ('job_id', 'input_file', 'output_file', 'preset_id',
+            'submitted_at', 'updated_at', 'status', 'progress')
+
+
+class JobLedger(object):
+    """Durable record of the submitted jobs, shared by the local workers."""
+
+    def __init__(self, path, batch_size=100, flush_interval=0.2):
+        """Initialize the ledger.
+
+        :param path: path of the SQLite database, created if needed.
+        :param batch_size: maximum number of writes per transaction.
+        :param flush_interval: maximum number of seconds a write waits for
+            others to be batched with.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        _LEDGERS.add(self)
+
+    @property
+    def _connection(self):
+        """Connection to the database for the current thread.
+
+        Like the writer thread, the connections are opened lazily and per
+        process, so a forked worker doesn't use the connection of its
+        parent.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            with conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS sorenson_jobs ('
+                    'job_id TEXT, input_file TEXT, output_file TEXT, '
+                    'preset_id TEXT, submitted_at REAL, updated_at REAL, '
+                    'status TEXT, progress REAL, '
+                    'PRIMARY KEY (job_id, output_file))')
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS ix_sorenson_jobs_status '
+                    'ON sorenson_jobs (status)')
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS ix_sorenson_jobs_files '
+                    'ON sorenson_jobs (input_file, output_file, preset_id)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return self._local.conn
+
+    def _put(self, item):
+        """Queue a write, starting the writer thread if needed."""
+        with self._lock:
+            # Threads don't survive a fork, e.g. in a prefork Celery worker
+            if self._writer_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._writer = threading.Thread(target=self._write_batches)
+                self._writer.daemon = True
+                self._writer.start()
+                self._writer_pid = os.getpid()
+            self._queue.put(item)
+
+    def _write_batches(self):
+        """Write the queued items until ``None`` is received."""
+        items = self._queue
+        while True:
+            batch = [items.get()]
+            deadline = time.time() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(items.get(
+                        timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                with self._connection as conn:
+                    for item in batch:
+                        if item is not None:
+                            conn.execute(*item)
+            except sqlite3.Error:
+                # There is no application context in this thread
+                logger.exception('Could not write {0} items to the ledger'
+                                 .format(len(batch)))
+            finally:
+                for _ in batch:
+                    items.task_done()
+            if batch[-1] is None:
+                return
+
+    def record_submission(self, job_id, input_file, output_file, preset_id):
+        """Record a new job."""
+        self._put((
+            'INSERT OR IGNORE INTO sorenson_jobs VALUES '
+            '(?, ?, ?, ?, ?, NULL, NULL, NULL)',
+            (job_id, input_file, output_file, preset_id, time.time())))
+
+    def record_status(self, job_id, status, progress):
+        """Record the last known status of a job."""
+        self._put((
+            'UPDATE sorenson_jobs SET status = ?, progress = ?, '
+            'updated_at = ? WHERE job_id = ?',
+            (status, progress, time.time(), job_id)))
+
+    def flush(self):
+        """Wait until all the queued writes are done."""
+        if self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        """Write the queued items and stop the writer thread."""
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                return
+            self._queue.put(None)
+            self._writer_pid = None
+        self._writer.join()
+
+    def get(self, job_id):
+        """Return the records of a job, one per output file."""
+        self.flush()
+        return [dict(row) for row in self._connection.execute(
+            'SELECT * FROM sorenson_jobs WHERE job_id = ? '
+            'ORDER BY output_file', (job_id, ))]
+
+    def unfinished(self, final_statuses):
+        """Return the records of the jobs not in a final status."""
+        self.flush()
+        return [dict(row) for row in self._connection.execute(
+            'SELECT * FROM sorenson_jobs WHERE status IS NULL OR status '
+            'NOT IN ({0}) ORDER BY submitted_at'.format(
+                ', '.join('?' * len(final_statuses))),
+            tuple(final_statuses))]
+
+    def duplicates(self, final_statuses):
+        """Return the unfinished jobs writing the same output file.
+
+        :returns: dictionary mapping ``(input_file, output_file, preset_id)``
+            to the list of job IDs, oldest first.
+        """
+        duplicates = {}
+        for record in self.unfinished(final_statuses):
+            key = (record['input_file'], record['output_file'],
+                   record['preset_id'])
+            duplicates.setdefault(key, []).append(record['job_id'])
+        return dict((key, job_ids) for key, job_ids in duplicates.items()
+                    if len(job_ids) > 1)
+
+
+@atexit.register
+def _close_ledgers():
+    """Write the queued items of all the ledgers before exiting.
+
+    The writer threads are daemons, so the items still queued would be lost
+    otherwise.
+    """
+    for ledger in list(_LEDGERS):
+        ledger.close()
+
+
+ReconcileReport = namedtuple(
+    'ReconcileReport', 'active finished orphaned duplicates errors')
+"""Outcome of :func:`reconcile`.
+
+``active`` and ``finished`` list the job IDs by status, ``orphaned`` the jobs
+Sorenson doesn't know anymore, ``duplicates`` is the result of
+:meth:`JobLedger.duplicates` and ``errors`` maps job IDs to the error raised
+while checking their status.
+"""
+
+
+def reconcile(poller=None, refresh=True):
+    """Check the unfinished jobs of the ledger.
+
+    :param poller: :class:`~cds_sorenson.poller.StatusPoller` to resume
+        tracking the active jobs with.
+    :param refresh: if False, trust the statuses stored in the ledger
+        instead of asking Sorenson.
+    :returns: :class:`ReconcileReport` instance.
+    """
+    ledger = current_cds_sorenson.ledger
+    final_statuses = current_cds_sorenson.settings.final_statuses
+    records = ledger.unfinished(final_statuses)
+    if refresh:
+        results = current_cds_sorenson.client.get_encoding_statuses(
+            record['job_id'] for record in records)
+    else:
+        results = dict((record['job_id'],
+                        (record['status'], record['progress']))
+                       for record in records)
+
+    report = ReconcileReport([], [], [], {}, {})
+    for job_id, result in results.items():
+        if isinstance(result, SorensonClientError) and \
+                result.status_code == 404:
+            # Not a final status, so they are checked again next time
+            ledger.record_status(job_id, MISSING, None)
+            result = (MISSING, None)
+        elif isinstance(result, Exception):
+            report.errors[job_id] = result
+            continue
+        if result[0] == MISSING:
+            report.orphaned.append(job_id)
+            continue
+        if refresh:
+            # Statuses answered from the result cache are not recorded yet
+            ledger.record_status(job_id, *result)
+        if result[0] in final_statuses:
+            report.finished.append(job_id)
+        else:
+            report.active.append(job_id)
+            if poller is not None:
+                poller.track(job_id, *result)
+    report.duplicates.update(ledger.duplicates(final_statuses))
+    return report
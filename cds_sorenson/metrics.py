@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Metrics of the calls to Sorenson.
+
+Every outbound call is reported to the ``CDS_SORENSON_METRICS_SINK``. The
+default :class:`InMemoryMetrics` keeps counters and latency histograms in
+memory and can render them in the Prometheus text format:
+
+.. code-block:: python
+
+    from cds_sorenson.metrics import prometheus_text
+    from cds_sorenson.proxies import current_cds_sorenson
+
+    @blueprint.route('/metrics')
+    def metrics():
+        return prometheus_text(current_cds_sorenson.metrics), 200, {
+            'Content-Type': 'text/plain; version=0.0.4'}
+"""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+"""Upper bounds in seconds of the latency histogram buckets."""
+
+HELP = {
+    'sorenson_requests_total': ('counter', 'Requests sent to Sorenson.'),
+    'sorenson_received_bytes_total': (
+        'counter', 'Bytes received from Sorenson.'),
+    'sorenson_request_duration_seconds': (
+        'histogram', 'Duration of the requests sent to Sorenson.'),
+    'sorenson_retries_total': ('counter', 'Requests sent again.'),
+    'sorenson_archive_fallbacks_total': (
+        'counter', 'Status checks which had to look in the archive.'),
+}
+"""Type and description of the known metrics."""
+
+
+class MetricsSink(object):
+    """Sink discarding all the metrics.
+
+    Subclass it to send the metrics somewhere else, e.g. to StatsD.
+    """
+
+    def observe_request(self, endpoint, status, duration, size):
+        """Record an outbound call.
+
+        :param endpoint: name of the endpoint, e.g. ``'submit'``.
+        :param status: status code of the response, or the name of the
+            error if there was no response.
+        :param duration: duration of the call in seconds.
+        :param size: number of bytes received.
+        """
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+
+
+class InMemoryMetrics(MetricsSink):
+    """Keep the metrics in memory."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialize the registry.
+
+        :param buckets: upper bounds of the latency histogram buckets.
+        """
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, endpoint, status, duration, size):
+        """Record an outbound call."""
+        requests_key = ('sorenson_requests_total',
+                        (('endpoint', endpoint), ('status', str(status))))
+        bytes_key = ('sorenson_received_bytes_total',
+                     (('endpoint', endpoint), ))
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            counters = self.counters
+            counters[requests_key] = counters.get(requests_key, 0) + 1
+            counters[bytes_key] = counters.get(bytes_key, 0) + size
+            histogram = self.histograms.get(endpoint)
+            if histogram is None:
+                # One count per bucket, then +Inf, then the sum
+                histogram = self.histograms[endpoint] = \
+                    [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bucket] += 1
+            histogram[-1] += duration
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def get(self, name, **labels):
+        """Return the value of a counter."""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        """Return a copy of the counters and histograms."""
+        with self._lock:
+            return dict(self.counters), dict(
+                (endpoint, list(histogram))
+                for endpoint, histogram in self.histograms.items())
+
+
+def _labels(labels):
+    """Format the labels of a sample."""
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(
+        key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for key, value in labels) + '}'
+
+
+def _header(lines, name, default_type='counter'):
+    metric_type, description = HELP.get(name, (default_type, None))
+    if description:
+        lines.append('# HELP {0} {1}'.format(name, description))
+    lines.append('# TYPE {0} {1}'.format(name, metric_type))
+
+
+def prometheus_text(metrics):
+    """Render :class:`InMemoryMetrics` in the Prometheus text format."""
+    counters, histograms = metrics.snapshot()
+    lines = []
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name in sorted(by_name):
+        _header(lines, name)
+        for labels, value in sorted(by_name[name]):
+            lines.append('{0}{1} {2}'.format(name, _labels(labels), value))
+
+    name = 'sorenson_request_duration_seconds'
+    if histograms:
+        _header(lines, name)
+    for endpoint in sorted(histograms):
+        histogram = histograms[endpoint]
+        cumulative = 0
+        bounds = [repr(float(bound)) for bound in metrics.buckets] + ['+Inf']
+        for bound, count in zip(bounds, histogram):
+            cumulative += count
+            lines.append('{0}_bucket{1} {2}'.format(
+                name, _labels((('endpoint', endpoint), ('le', bound))),
+                cumulative))
+        lines.append('{0}_sum{1} {2!r}'.format(
+            name, _labels((('endpoint', endpoint), )), histogram[-1]))
+        lines.append('{0}_count{1} {2}'.format(
+            name, _labels((('endpoint', endpoint), )), cumulative))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Typed parsing of the job statuses returned by Sorenson.
+
+The archived statuses carry the whole job, but only the status, the progress
+and the outputs are kept, in compact objects. The JSON is decoded with
+`orjson <https://pypi.org/project/orjson/>`_ or
+`ujson <https://pypi.org/project/ujson/>`_ if one of them is installed.
+"""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from .error import SorensonError
+
+try:
+    from orjson import loads
+except ImportError:
+    try:
+        from ujson import loads
+    except ImportError:
+        loads = json.loads
+
+CANCELED = 'Canceled'
+"""Status of the jobs Sorenson returns an empty status for."""
+
+
+def _number(value, type_=int):
+    """Convert a number Sorenson may send as a string, or return None."""
+    if value.__class__ is type_ or value is None:
+        return value
+    try:
+        return type_(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class JobOutput(object):
+    """File produced by a finished job."""
+
+    __slots__ = ('file_uri', 'file_type', 'file_size', 'duration', 'width',
+                 'height', 'frame_rate', 'video_bitrate', 'audio_bitrate')
+
+    def __init__(self, file_uri, file_type=None, file_size=None,
+                 duration=None, width=None, height=None, frame_rate=None,
+                 video_bitrate=None, audio_bitrate=None):
+        """Initialize the output.
+
+        :param file_uri: URI of the file, as seen by Sorenson.
+        :param file_type: type of output, e.g. ``'VideoOutput'``.
+        :param file_size: size in bytes.
+        :param duration: duration in seconds.
+        :param width: width in pixels.
+        :param height: height in pixels.
+        :param frame_rate: number of frames per second.
+        :param video_bitrate: video data rate in bits per second.
+        :param audio_bitrate: audio data rate in bits per second.
+        """
+        self.file_uri = file_uri
+        self.file_type = file_type
+        self.file_size = file_size
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.frame_rate = frame_rate
+        self.video_bitrate = video_bitrate
+        self.audio_bitrate = audio_bitrate
+
+    @classmethod
+    def from_json(cls, output, destinations):
+        """Create an output from an item of the ``OutputList``.
+
+        :param output: the item of the ``OutputList``.
+        :param destinations: mapping of the IDs of the ``DestinationList``
+            items to their URI.
+        """
+        get = output.get
+        file_name = get('FileName')
+        file_uri = destinations.get(get('DestinationId'))
+        if not file_uri:
+            file_uri = file_name
+        elif file_uri.endswith('/') and file_name:
+            # The destination is the folder of the file
+            file_uri += file_name
+        return cls(
+            file_uri, get('FileType'), _number(get('FileSize')),
+            _number(get('DurationSeconds'), float), _number(get('FileWidth')),
+            _number(get('FileHeight')), _number(get('FileFrameRate'), float),
+            _number(get('FileVidDataRate')), _number(get('FileAudDataRate')))
+
+    def __repr__(self):
+        """Return the representation of the output."""
+        return 'JobOutput({0!r}, file_size={1!r})'.format(
+            self.file_uri, self.file_size)
+
+
+class JobStatus(object):
+    """Status of a job, with its outputs once it is finished."""
+
+    __slots__ = ('job_id', 'state', 'status', 'progress', 'outputs')
+
+    def __init__(self, job_id, state, status, progress, outputs=()):
+        """Initialize the status.
+
+        :param job_id: string with the job ID.
+        :param state: status code of Sorenson, or ``None`` if the job was
+            canceled.
+        :param status: status message, see ``CDS_SORENSON_STATUSES``.
+        :param progress: progress in %.
+        :param outputs: tuple of :class:`JobOutput`.
+        """
+        self.job_id = job_id
+        self.state = state
+        self.status = status
+        self.progress = progress
+        self.outputs = outputs
+
+    @property
+    def result(self):
+        """Return the ``(status, progress)`` tuple of the job."""
+        return self.status, self.progress
+
+    def __repr__(self):
+        """Return the representation of the status."""
+        return 'JobStatus({0!r}, {1!r}, {2!r}, outputs={3!r})'.format(
+            self.job_id, self.status, self.progress, self.outputs)
+
+
+def parse_job_status(job_id, status, statuses):
+    """Parse the status of a job.
+
+    :param job_id: string with the job ID.
+    :param status: JSON string returned by
+        :func:`~cds_sorenson.utils.get_status`, or its decoded value.
+    :param statuses: mapping of the status codes of Sorenson to the status
+        messages, see ``CDS_SORENSON_STATUSES``.
+    :returns: :class:`JobStatus` instance.
+    """
+    if status == '':
+        # encoding job was canceled
+        return JobStatus(job_id, None, CANCELED, 100)
+    status_json = loads(status) if not isinstance(status, dict) else status
+    # there are different ways to get the status of a job, depending if
+    # the job was successful, so we should check for the status code in
+    # different places
+    running = status_json.get('Status') or {}
+    state = running.get('Status')
+    if state:
+        return JobStatus(job_id, state, statuses.get(state),
+                         running.get('Progress'))
+    # status not found? check in different place
+    state = status_json.get('StatusStateId')
+    if state:
+        # job is probably either finished or failed, so the progress will
+        # always be 100% in this case
+        destinations = dict(
+            (destination.get('DestinationId'), destination.get('FileUri'))
+            for destination in status_json.get('DestinationList') or ())
+        return JobStatus(job_id, state, statuses.get(state), 100, tuple(
+            JobOutput.from_json(output, destinations)
+            for output in status_json.get('OutputList') or ()))
+    # No status was found (which shouldn't happen)
+    raise SorensonError('No status found for job: {0}'.format(job_id))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Choose the presets worth encoding for a video.
+
+.. code-block:: python
+
+    plan = plan_ladder(width=1280, height=720, bitrate=2500000,
+                       frame_rate=25, duration=3600)
+    job_id, outputs = start_ladder_encoding(
+        input_file, output_file, plan.qualities, plan.aspect_ratio)
+"""
+
+from __future__ import absolute_import, print_function
+
+from collections import OrderedDict, namedtuple
+
+from .error import InvalidAspectRatioError
+from .presets import ratio_value
+from .proxies import current_cds_sorenson
+
+UPSCALE = 'upscale'
+"""The preset has a higher resolution than the video."""
+
+FRAME_RATE = 'frame rate'
+"""The preset has a higher frame rate than the video.
+
+The quality is still encoded, as the frames of the video are repeated, but it
+costs more encoder time than the video needs.
+"""
+
+BITRATE = 'bitrate'
+"""The preset has a higher bitrate than the video."""
+
+DUPLICATE = 'duplicate'
+"""The preset has almost the same bitrate as a higher quality."""
+
+LadderPlan = namedtuple('LadderPlan', 'aspect_ratio qualities skipped '
+                                      'encoding_seconds output_bytes notes')
+"""Presets to encode a video with.
+
+``qualities`` lists the qualities to encode, lowest first, and ``skipped``
+maps the other qualities to the reason why they were left out.
+``encoding_seconds`` and ``output_bytes`` estimate the cost of the plan, or
+are ``None`` if the duration of the video is unknown. ``notes`` maps the
+encoded qualities which don't fit the video well, e.g. :data:`FRAME_RATE`.
+"""
+
+
+def plan_ladder(width, height, bitrate=None, frame_rate=None, duration=None,
+                display_aspect_ratio=None, **kwargs):
+    """Return the minimal set of presets worth encoding for a video.
+
+    The presets above the resolution or the bitrate of the video are left
+    out, as they would only waste encoder time. Then, of the presets whose
+    bitrates differ by less than ``CDS_SORENSON_LADDER_MIN_BITRATE_STEP``,
+    only the highest quality is kept. The lowest quality is always kept, so
+    every video gets at least one rendition.
+
+    The presets above the frame rate of the video, e.g. of a screen or
+    lecture recording, are kept with a :data:`FRAME_RATE` note, as leaving
+    them out would only leave the lowest resolutions.
+
+    :param width: width of the video in pixels.
+    :param height: height of the video in pixels.
+    :param bitrate: total bitrate of the video in bits per second.
+    :param frame_rate: frame rate of the video.
+    :param duration: duration of the video in seconds, for the estimates.
+    :param display_aspect_ratio: aspect ratio of the video, by default the
+        one of ``width`` and ``height``.
+    :param kwargs: other technical metadata, ignored.
+    :returns: :class:`LadderPlan` instance.
+    """
+    settings = current_cds_sorenson.settings
+    presets = settings.presets
+    aspect_ratio = display_aspect_ratio
+    if aspect_ratio not in presets.aspect_ratios:
+        aspect_ratio = presets.nearest_aspect_ratio(
+            ratio_value(aspect_ratio or '{0}:{1}'.format(width, height)),
+            settings.aspect_ratio_tolerance
+            if display_aspect_ratio else None)
+        if aspect_ratio is None:
+            raise InvalidAspectRatioError(display_aspect_ratio)
+
+    frame_rate_tolerance = settings.frame_rate_tolerance
+    skipped = OrderedDict()
+    candidates = []
+    for preset in presets.presets_up_to(aspect_ratio, float('inf')):
+        if (preset.height or 0) > height:
+            skipped[preset.quality] = UPSCALE
+        elif bitrate and preset.total_bitrate and \
+                preset.total_bitrate * 1000 > bitrate:
+            skipped[preset.quality] = BITRATE
+        else:
+            candidates.append(preset)
+
+    # Walk down from the highest quality, keeping distinct bitrates only
+    min_step = settings.ladder_min_bitrate_step
+    kept = []
+    for preset in reversed(candidates):
+        if kept and preset is not candidates[0] and preset.total_bitrate \
+                and kept[-1].total_bitrate and \
+                preset.total_bitrate * min_step > kept[-1].total_bitrate:
+            skipped[preset.quality] = DUPLICATE
+        else:
+            kept.append(preset)
+    kept.reverse()
+    if not kept:
+        lowest = presets.presets_up_to(aspect_ratio, float('inf'))[0]
+        skipped.pop(lowest.quality, None)
+        kept = [lowest]
+
+    notes = OrderedDict()
+    for preset in kept:
+        if frame_rate and preset.frame_rate and \
+                preset.frame_rate > frame_rate * (1 + frame_rate_tolerance):
+            notes[preset.quality] = FRAME_RATE
+
+    encoding_seconds = output_bytes = None
+    if duration:
+        pixel_rate = settings.encoder_pixel_rate
+        encoding_seconds = sum(
+            duration * (preset.width or 0) * (preset.height or 0) *
+            (preset.frame_rate or frame_rate or 25) / float(pixel_rate)
+            for preset in kept)
+        output_bytes = int(sum(duration * (preset.total_bitrate or 0) * 125
+                               for preset in kept))
+    return LadderPlan(aspect_ratio, [preset.quality for preset in kept],
+                      skipped, encoding_seconds, output_bytes, notes)
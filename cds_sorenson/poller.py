@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Adaptive scheduler polling the status of Sorenson jobs.
+
+Each tracked job is polled at its own pace, chosen from its last status and
+from how fast its progress moves: queued jobs are polled rarely, running
+jobs more often as they get close to 100% and finished jobs not at all.
+When Sorenson notifies the end of the jobs, they are only polled every
+``CDS_SORENSON_NOTIFICATION_POLL_INTERVAL`` in case a notification is lost.
+
+.. code-block:: python
+
+    poller = StatusPoller(app, on_finish=lambda job_id, status: ...)
+    poller.track(job_id)
+    poller.run()
+"""
+
+from __future__ import absolute_import, print_function
+
+import heapq
+import itertools
+import threading
+import time
+
+from .signals import job_finished
+
+
+class _TrackedJob(object):
+    """State of a tracked job."""
+
+    __slots__ = ('status', 'progress', 'checked_at', 'next_at', 'idle')
+
+    def __init__(self, status, progress, next_at):
+        self.status = status
+        self.progress = progress
+        self.checked_at = None
+        self.next_at = next_at
+        self.idle = 0
+
+
+class StatusPoller(object):
+    """Poll jobs in the order of their next status check time."""
+
+    def __init__(self, app, on_change=None, on_finish=None, on_error=None,
+                 fetch=None, max_workers=None, clock=time.time):
+        """Initialize the poller.
+
+        :param app: Flask application initialized with
+            :class:`~cds_sorenson.ext.CDSSorenson`.
+        :param on_change: called with ``(job_id, status, progress)`` when the
+            status or the progress of a job changes.
+        :param on_finish: called with ``(job_id, status)`` when a job reaches
+            a final status. The job is not polled anymore afterwards.
+        :param on_error: called with ``(job_id, exception)`` when the status
+            of a job can't be retrieved.
+        :param fetch: function taking a list of job IDs and returning a
+            mapping of job ID to ``(status, progress)`` or exception, by
+            default :func:`cds_sorenson.api.get_encoding_statuses`.
+        :param max_workers: maximum number of concurrent status lookups.
+        :param clock: function returning the current time in seconds.
+        """
+        self.app = app
+        self.on_change = on_change
+        self.on_finish = on_finish
+        self.on_error = on_error
+        self.max_workers = max_workers
+        self.clock = clock
+        if fetch is None:
+            from .api import get_encoding_statuses as fetch
+        self._fetch = fetch
+        self._jobs = {}
+        self._queue = []
+        self._polling = set()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        job_finished.connect(self._finished, sender=app)
+
+    @property
+    def settings(self):
+        """Settings of the application."""
+        return self.app.extensions['cds-sorenson'].settings
+
+    def __len__(self):
+        """Return the number of tracked jobs."""
+        return len(self._jobs)
+
+    def __contains__(self, job_id):
+        """Check if a job is tracked."""
+        return job_id in self._jobs
+
+    def track(self, job_id, status=None, progress=None, delay=0):
+        """Start polling the status of a job.
+
+        :param job_id: string with the job ID.
+        :param status: last known status of the job, if any.
+        :param progress: last known progress of the job, if any.
+        :param delay: seconds to wait before the first status check.
+        """
+        with self._lock:
+            job = _TrackedJob(status, progress, self.clock() + delay)
+            self._jobs[job_id] = job
+            self._push(job_id, job)
+        self._wakeup.set()
+
+    def untrack(self, job_id):
+        """Stop polling the status of a job."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _finished(self, app, job_id=None, status=None, **kwargs):
+        """Stop polling a job seen in a final status, e.g. notified."""
+        with self._lock:
+            if job_id in self._polling:
+                # The result of the current check will untrack it
+                return
+            job = self._jobs.pop(job_id, None)
+        if job is not None and self.on_finish:
+            self.on_finish(job_id, status)
+
+    def _push(self, job_id, job):
+        heapq.heappush(self._queue, (job.next_at, next(self._counter), job_id))
+
+    def _pop_due(self, now):
+        """Remove and return the IDs of all the jobs to poll now."""
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                next_at, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs.get(job_id)
+                # Skip entries of untracked or rescheduled jobs
+                if job is not None and job.next_at == next_at:
+                    due.append(job_id)
+        return due
+
+    def next_poll_in(self):
+        """Return the number of seconds until the next status check."""
+        with self._lock:
+            while self._queue:
+                next_at, _, job_id = self._queue[0]
+                job = self._jobs.get(job_id)
+                if job is not None and job.next_at == next_at:
+                    return max(next_at - self.clock(), 0)
+                heapq.heappop(self._queue)
+        return None
+
+    def interval(self, job, previous_progress, now):
+        """Return the number of seconds until the next check of a job.
+
+        :param job: the tracked job, already updated with its last status.
+        :param previous_progress: the progress seen at the previous check.
+        :param now: time of the last check.
+        """
+        settings = self.settings
+        min_interval = settings.poll_min_interval
+        max_interval = settings.poll_max_interval
+        interval = settings.poll_intervals.get(job.status, min_interval)
+        progress = job.progress or 0
+        elapsed = now - job.checked_at \
+            if job.checked_at is not None else 0
+        if elapsed > 0 and previous_progress is not None and \
+                progress > previous_progress:
+            # Check again around half-way to the expected completion
+            speed = (progress - previous_progress) / float(elapsed)
+            interval = min(interval, (100 - progress) / speed / 2)
+        elif job.idle:
+            # Nothing moved since the last check, back off
+            interval *= 2 ** min(job.idle, 16)
+        interval = min(max(interval, min_interval), max_interval)
+        if settings.notifications_enabled:
+            interval = max(interval, settings.notification_poll_interval)
+        return interval
+
+    def poll(self):
+        """Check the status of all the jobs which are due.
+
+        :returns: number of seconds until the next status check, or ``None``
+            if no job is tracked anymore.
+        """
+        due = self._pop_due(self.clock())
+        if due:
+            with self._lock:
+                self._polling.update(due)
+            try:
+                with self.app.app_context():
+                    results = self._fetch(due, max_workers=self.max_workers)
+            finally:
+                with self._lock:
+                    self._polling.difference_update(due)
+            now = self.clock()
+            for job_id, result in results.items():
+                self._update(job_id, result, now)
+        return self.next_poll_in()
+
+    def _update(self, job_id, result, now):
+        """Store the result of a status check and schedule the next one."""
+        finished = False
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if isinstance(result, Exception):
+                job.idle += 1
+                job.next_at = now + self.interval(job, None, now)
+                self._push(job_id, job)
+            else:
+                status, progress = result
+                previous_progress = job.progress
+                changed = (status, progress) != (job.status, job.progress)
+                job.idle = 0 if changed else job.idle + 1
+                job.status, job.progress = status, progress
+                finished = status in self.settings.final_statuses
+                if finished:
+                    del self._jobs[job_id]
+                else:
+                    job.next_at = now + self.interval(
+                        job, previous_progress, now)
+                    job.checked_at = now
+                    self._push(job_id, job)
+        if isinstance(result, Exception):
+            if self.on_error:
+                self.on_error(job_id, result)
+            return
+        if changed and self.on_change:
+            self.on_change(job_id, status, progress)
+        if finished and self.on_finish:
+            self.on_finish(job_id, status)
+
+    def run(self, until_empty=False):
+        """Poll the tracked jobs until :meth:`stop` is called.
+
+        :param until_empty: if True, also stop when no job is tracked.
+        """
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            wait = self.poll()
+            if wait is None and until_empty:
+                return
+            self._wakeup.wait(wait)
+
+    def stop(self):
+        """Stop the polling loop."""
+        self._stopped.set()
+        self._wakeup.set()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Compiled lookup tables of the Sorenson presets."""
+
+from __future__ import absolute_import, print_function
+
+import logging
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    from types import MappingProxyType
+except ImportError:
+    class MappingProxyType(Mapping):
+        """Read-only view of a dictionary, for Python 2."""
+
+        def __init__(self, mapping):
+            """Wrap ``mapping``."""
+            self._mapping = mapping
+
+        def __getitem__(self, key):
+            """Return the value of ``key``."""
+            return self._mapping[key]
+
+        def __iter__(self):
+            """Iterate over the keys."""
+            return iter(self._mapping)
+
+        def __len__(self):
+            """Return the number of keys."""
+            return len(self._mapping)
+
+        def __repr__(self):
+            """Representation of the mapping."""
+            return 'mappingproxy({0!r})'.format(self._mapping)
+
+logger = logging.getLogger(__name__)
+
+
+def ratio_value(aspect_ratio):
+    """Return the value of an aspect ratio such as ``'16:9'`` or ``'1.78'``.
+
+    :returns: a float, or ``None`` if it can't be parsed.
+    """
+    try:
+        width, sep, height = str(aspect_ratio).partition(':')
+        value = float(width) / float(height) if sep else float(width)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value if value > 0 else None
+
+
+def _ratio_pair(aspect_ratio):
+    """Return an aspect ratio like ``'16:9'`` as ``(16, 9)``, or ``None``."""
+    try:
+        width, height = aspect_ratio.split(':', 1)
+        return int(width), int(height)
+    except (AttributeError, ValueError):
+        logger.warning('Aspect ratio {0!r} is not a pair of integers'.format(
+            aspect_ratio))
+        return None
+
+
+class Preset(Mapping):
+    """Read-only record of a preset.
+
+    It behaves like the dictionary of ``CDS_SORENSON_PRESETS`` it comes from,
+    and also exposes the usual keys, the aspect ratio and the quality as
+    attributes.
+    """
+
+    _FIELDS = ('preset_id', 'width', 'height', 'audio_bitrate',
+               'video_bitrate', 'total_bitrate', 'frame_rate')
+
+    __slots__ = _FIELDS + ('aspect_ratio', 'quality', '_keys', '_extra')
+
+    def __init__(self, aspect_ratio, quality, config):
+        """Initialize the record.
+
+        :param aspect_ratio: aspect ratio of the preset, e.g. ``'16:9'``.
+        :param quality: quality of the preset, e.g. ``'360p'``.
+        :param config: dictionary of the preset in ``CDS_SORENSON_PRESETS``.
+        """
+        set_ = object.__setattr__
+        set_(self, 'aspect_ratio', aspect_ratio)
+        set_(self, 'quality', quality)
+        set_(self, '_keys', tuple(config))
+        for field in self._FIELDS:
+            set_(self, field, config.get(field))
+        set_(self, '_extra', dict((key, value) for key, value in
+                                  config.items() if key not in self._FIELDS))
+
+    def __getitem__(self, key):
+        """Return the value of a key of the preset."""
+        if key in self._extra:
+            return self._extra[key]
+        if key in self._FIELDS and key in self._keys:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        """Iterate over the keys in their configured order."""
+        return iter(self._keys)
+
+    def __len__(self):
+        """Return the number of keys."""
+        return len(self._keys)
+
+    def __setattr__(self, name, value):
+        """Prevent changes, the records are shared by all the requests."""
+        raise AttributeError('Presets are read-only')
+
+    def __repr__(self):
+        """Representation of the preset."""
+        return 'Preset({0!r}, {1!r}, {2!r})'.format(
+            self.aspect_ratio, self.quality, dict(self))
+
+
+class PresetRegistry(object):
+    """Immutable lookup tables built once from ``CDS_SORENSON_PRESETS``.
+
+    All the lookups are constant time, no matter how many aspect ratios and
+    qualities are configured, and the lists returned by the API are computed
+    only once.
+    """
+
+    def __init__(self, presets):
+        """Compile the presets.
+
+        :param presets: the ``CDS_SORENSON_PRESETS`` dictionary, mapping each
+            aspect ratio to the presets of each quality.
+        """
+        self.source = presets
+        forward = {}
+        reverse = {}
+        preset_ids = {}
+        qualities = OrderedDict()
+        for aspect_ratio, ratio_presets in presets.items():
+            for quality, config in ratio_presets.items():
+                preset = Preset(aspect_ratio, quality, config)
+                forward[(aspect_ratio, quality)] = preset
+                reverse[preset.preset_id] = (aspect_ratio, quality, preset)
+                qualities[quality] = None
+            preset_ids[aspect_ratio] = tuple(
+                config['preset_id'] for config in ratio_presets.values())
+        self.aspect_ratios = frozenset(presets)
+        self.forward = MappingProxyType(forward)
+        """Map of ``(aspect_ratio, quality)`` to the preset."""
+        self.reverse = MappingProxyType(reverse)
+        """Map of ``preset_id`` to ``(aspect_ratio, quality, preset)``."""
+        self.ratios = tuple(presets)
+        """Aspect ratios in their configured order."""
+        self.ratio_pairs = tuple(
+            pair for pair in (_ratio_pair(ratio) for ratio in self.ratios)
+            if pair is not None)
+        """Aspect ratios as pairs of integers, e.g. ``(16, 9)``.
+
+        The aspect ratios which aren't written as ``'width:height'`` are
+        left out.
+        """
+        self.qualities = tuple(qualities)
+        """Qualities of all the aspect ratios, in their configured order."""
+        self.preset_ids = MappingProxyType(preset_ids)
+        """Map of each aspect ratio to the IDs of its presets."""
+
+        # Sorted indexes for the nearest ratio and non-upscaling lookups
+        ratio_index = sorted(
+            (value, ratio) for value, ratio in
+            ((ratio_value(ratio), ratio) for ratio in self.ratios)
+            if value is not None)
+        self._ratio_values = [value for value, _ in ratio_index]
+        self._ratio_keys = [ratio for _, ratio in ratio_index]
+        self._by_height = {}
+        for aspect_ratio in self.ratios:
+            by_height = sorted(
+                (preset for (ratio, _), preset in forward.items()
+                 if ratio == aspect_ratio),
+                key=lambda preset: (preset.height or 0, preset.quality))
+            self._by_height[aspect_ratio] = (
+                [preset.height or 0 for preset in by_height],
+                tuple(by_height))
+
+    def get(self, aspect_ratio, quality):
+        """Return the preset of a quality and aspect ratio, or ``None``."""
+        return self.forward.get((aspect_ratio, quality))
+
+    def get_by_id(self, preset_id):
+        """Return the preset with the given ID, or ``None``."""
+        entry = self.reverse.get(preset_id)
+        return entry[2] if entry else None
+
+    def nearest_aspect_ratio(self, value, tolerance=None):
+        """Return the configured aspect ratio closest to ``value``.
+
+        :param value: aspect ratio as a float, e.g. ``1920 / 1080.``.
+        :param tolerance: maximum relative difference with the configured
+            ratio, or ``None`` to accept any difference.
+        :returns: the aspect ratio, e.g. ``'16:9'``, or ``None``.
+        """
+        values = self._ratio_values
+        if not values or not value:
+            return None
+        index = bisect_left(values, value)
+        candidates = [i for i in (index - 1, index) if 0 <= i < len(values)]
+        best = min(candidates, key=lambda i: abs(values[i] - value))
+        if tolerance is not None and \
+                abs(values[best] - value) > tolerance * values[best]:
+            return None
+        return self._ratio_keys[best]
+
+    def presets_up_to(self, aspect_ratio, height):
+        """Return the presets of a ratio which don't exceed ``height``.
+
+        :returns: tuple of presets, lowest resolution first.
+        """
+        heights, presets = self._by_height.get(aspect_ratio, ((), ()))
+        return presets[:bisect_right(heights, height)]
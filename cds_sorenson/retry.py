@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Retry policy for the calls to Sorenson."""
+
+from __future__ import absolute_import, print_function
+
+import random
+import threading
+import time
+
+from .error import SorensonRetryableError, SorensonTimeoutError
+
+
+class RetryBudget(object):
+    """Token bucket limiting retries to a fraction of all the calls.
+
+    Each call adds ``ratio`` tokens, each retry takes one, and the bucket
+    never holds more than ``minimum`` tokens. When Sorenson comes back after
+    an outage, the clients don't flood it with retries.
+    """
+
+    def __init__(self, ratio=0.2, minimum=10):
+        """Initialize a full bucket."""
+        self.ratio = ratio
+        self.minimum = minimum
+        self._tokens = float(minimum)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """Add the tokens earned by a call."""
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.minimum)
+
+    def withdraw(self):
+        """Take a token for a retry, return False if there's none left."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Deadline(object):
+    """Point in time after which an operation has to give up.
+
+    A deadline is shared by all the calls of an operation, e.g. the lookup
+    in the current and then in the archive queue, including their retries.
+    """
+
+    def __init__(self, timeout=None, clock=time.time):
+        """Start the countdown.
+
+        :param timeout: number of seconds given to the operation, or
+            ``None`` for no deadline.
+        :param clock: function returning the current time in seconds.
+        """
+        self.timeout = timeout
+        self.clock = clock
+        self.expires_at = None if timeout is None else clock() + timeout
+
+    def remaining(self):
+        """Return the number of seconds left, or ``None`` if unlimited."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - self.clock(), 0)
+
+    @property
+    def expired(self):
+        """True if there is no time left."""
+        return self.remaining() == 0
+
+    def check(self):
+        """Raise :class:`~cds_sorenson.error.SorensonTimeoutError` if expired.
+
+        The error is safe to retry, as nothing was sent.
+        """
+        if self.expired:
+            raise SorensonTimeoutError(
+                'Deadline of {0}s exceeded.'.format(self.timeout), safe=True)
+
+    def clamp(self, timeout):
+        """Shorten a :mod:`requests` timeout to the time left.
+
+        :param timeout: ``(connect, read)`` tuple, single number or ``None``.
+        :returns: ``(connect, read)`` tuple, or ``timeout`` if unlimited.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if not isinstance(timeout, (tuple, list)):
+            timeout = (timeout, timeout)
+        return tuple(remaining if t is None else min(t, remaining)
+                     for t in timeout)
+
+
+class RetryPolicy(object):
+    """Retry failed calls with exponential backoff and full jitter.
+
+    Only :class:`~cds_sorenson.error.SorensonRetryableError` are retried, and
+    only if the request is idempotent or didn't reach Sorenson.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.5, backoff_max=10,
+                 deadline=30, budget=None, sleep=time.sleep, clock=time.time):
+        """Initialize the policy.
+
+        :param max_attempts: maximum number of attempts per call.
+        :param backoff_base: maximum delay before the first retry, doubled
+            after each attempt.
+        :param backoff_max: upper limit of the delay between two attempts.
+        :param deadline: number of seconds after which a call is not retried
+            anymore, or ``None``.
+        :param budget: :class:`RetryBudget` shared by all the calls.
+        :param sleep: function to wait between two attempts.
+        :param clock: function returning the current time in seconds.
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.budget = budget or RetryBudget()
+        self.sleep = sleep
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.stats = dict(calls=0, retries=0, exhausted=0, budget_exhausted=0,
+                          deadline_exceeded=0)
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the policy from the ``CDS_SORENSON_*`` configuration."""
+        return cls(
+            max_attempts=config['CDS_SORENSON_RETRY_MAX_ATTEMPTS'],
+            backoff_base=config['CDS_SORENSON_RETRY_BACKOFF_BASE'],
+            backoff_max=config['CDS_SORENSON_RETRY_BACKOFF_MAX'],
+            deadline=config['CDS_SORENSON_RETRY_DEADLINE'],
+            budget=RetryBudget(
+                ratio=config['CDS_SORENSON_RETRY_BUDGET_RATIO'],
+                minimum=config['CDS_SORENSON_RETRY_BUDGET_MIN'],
+            ),
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def backoff(self, attempt, error=None):
+        """Return the delay before the next attempt.
+
+        :param attempt: number of attempts already done.
+        :param error: the error of the last attempt.
+        """
+        delay = random.uniform(0, min(
+            self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def retry_delay(self, attempt, error, started, idempotent=True,
+                    deadline=None):
+        """Return the delay before retrying a failed call, or ``None``.
+
+        :param attempt: number of attempts already done.
+        :param error: the exception raised by the last attempt.
+        :param started: time at which the call started.
+        :param idempotent: False if the request must not be sent twice.
+        :param deadline: :class:`Deadline` of the whole operation.
+        :returns: number of seconds to wait, or ``None`` to give up.
+        """
+        if not isinstance(error, SorensonRetryableError) or \
+                not (idempotent or error.safe):
+            return None
+        if attempt >= self.max_attempts:
+            self._count('exhausted')
+            return None
+        delay = self.backoff(attempt, error)
+        if self.deadline is not None and \
+                self.clock() + delay - started > self.deadline:
+            self._count('deadline_exceeded')
+            return None
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and delay >= remaining:
+            self._count('deadline_exceeded')
+            return None
+        if not self.budget.withdraw():
+            self._count('budget_exhausted')
+            return None
+        self._count('retries')
+        return delay
+
+    def begin(self):
+        """Account for a new call.
+
+        :returns: the time at which the call started.
+        """
+        self._count('calls')
+        self.budget.deposit()
+        return self.clock()
+
+    def call(self, func, *args, **kwargs):
+        """Call ``func`` and retry it according to the policy.
+
+        :param idempotent: pass ``idempotent=False`` for requests that must
+            only be retried if they didn't reach Sorenson.
+        :param deadline: :class:`Deadline` after which it is not retried.
+        """
+        idempotent = kwargs.pop('idempotent', True)
+        deadline = kwargs.pop('deadline', None)
+        started = self.begin()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except SorensonRetryableError as e:
+                delay = self.retry_delay(attempt, e, started, idempotent,
+                                         deadline)
+                if delay is None:
+                    raise
+                self.sleep(delay)
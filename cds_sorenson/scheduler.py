@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Client-side scheduling of the submissions to Sorenson.
+
+The scheduler keeps at most ``CDS_SORENSON_MAX_IN_FLIGHT`` jobs running on
+each queue of each Sorenson server. Submissions beyond it wait for a free
+slot, in order of priority, or are rejected:
+
+.. code-block:: python
+
+    poller = StatusPoller(app)
+    scheduler = SubmissionScheduler(app, poller=poller)
+    threading.Thread(target=poller.run).start()
+
+    for video in videos:
+        for quality in get_available_preset_qualities():
+            scheduler.submit(video.path, video.output(quality), quality,
+                             video.aspect_ratio)
+
+The slots are released as the poller sees the jobs reach a final status.
+The limits are enforced per process, so split the capacity of the encoders
+between the processes sharing them.
+"""
+
+from __future__ import absolute_import, print_function
+
+import heapq
+import itertools
+import threading
+import time
+
+from .api import get_preset_info, start_encoding
+from .error import SorensonQueueFullError
+
+
+class SubmissionScheduler(object):
+    """Limit the number of jobs in flight on each Sorenson queue.
+
+    The slots are counted per server of the ``CDS_SORENSON_BACKENDS`` pool
+    and queue. The server of each submission is chosen once it is its turn,
+    among the ones with a free slot.
+    """
+
+    def __init__(self, app, poller=None, block=True, timeout=None,
+                 submit=None, clock=time.time):
+        """Initialize the scheduler.
+
+        :param app: Flask application initialized with
+            :class:`~cds_sorenson.ext.CDSSorenson`.
+        :param poller: :class:`~cds_sorenson.poller.StatusPoller` tracking
+            the submitted jobs and releasing their slot when they finish.
+        :param block: if False, raise
+            :class:`~cds_sorenson.error.SorensonQueueFullError` instead of
+            waiting for a free slot.
+        :param timeout: maximum number of seconds to wait for a free slot,
+            or ``None`` to wait forever.
+        :param submit: function submitting a job and returning its ID, by
+            default :func:`cds_sorenson.api.start_encoding`.
+        :param clock: function returning the current time in seconds.
+        """
+        self.app = app
+        self.poller = poller
+        self.block = block
+        self.timeout = timeout
+        self.clock = clock
+        self._submit = submit or start_encoding
+        self._in_flight = {}
+        self._reserved = {}
+        self._waiting = {}
+        self._queues = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        if poller is not None:
+            on_finish = poller.on_finish
+
+            def _release(job_id, status):
+                self.release(job_id)
+                if on_finish:
+                    on_finish(job_id, status)
+            poller.on_finish = _release
+
+    @property
+    def settings(self):
+        """Settings of the application."""
+        return self.app.extensions['cds-sorenson'].settings
+
+    def limit(self, queue_id, backend=None):
+        """Return the maximum number of jobs in flight on a queue.
+
+        :param backend: name of the server of the queue, ``None`` for the
+            default one.
+        """
+        settings = self.settings
+        limits = settings.queue_max_in_flight
+        return limits.get((backend, queue_id), limits.get(
+            queue_id, settings.max_in_flight))
+
+    def in_flight(self, queue_id=None, backend=None):
+        """Return the number of jobs submitted or being submitted.
+
+        :param backend: name of the server of the queue, ``None`` for the
+            default one.
+        """
+        queue_id = queue_id or self.settings.default_queue
+        with self._cond:
+            return self._used((backend, queue_id))
+
+    def _used(self, slot):
+        return len(self._in_flight.get(slot, ())) + \
+            self._reserved.get(slot, 0)
+
+    def priority(self, preset_quality, display_aspect_ratio, interactive):
+        """Return the priority of a submission, lowest first.
+
+        Interactive submissions go before bulk ones, then the lower
+        resolutions go first, so every video gets a playable version soon.
+        """
+        with self.app.app_context():
+            preset = get_preset_info(display_aspect_ratio, preset_quality)
+        return (0 if interactive else 1, (preset or {}).get('height', 0))
+
+    def submit(self, input_file, output_file, preset_quality,
+               display_aspect_ratio, interactive=False, priority=None,
+               block=None, timeout=None, queue_id=None, **kwargs):
+        """Submit an encoding job once its queue has a free slot.
+
+        :param interactive: True if a user is waiting for this job.
+        :param priority: sortable priority, lowest first, by default
+            computed by :meth:`priority`.
+        :param block: override the ``block`` of the scheduler.
+        :param timeout: override the ``timeout`` of the scheduler.
+        :param queue_id: Sorenson queue, by default the one of the server
+            or ``CDS_SORENSON_DEFAULT_QUEUE``.
+        :param kwargs: other arguments of
+            :func:`~cds_sorenson.api.start_encoding`.
+        :returns: job ID.
+        """
+        if priority is None:
+            priority = self.priority(preset_quality, display_aspect_ratio,
+                                     interactive)
+        backend, slot = self._acquire(
+            queue_id, priority, self.block if block is None else block,
+            self.timeout if timeout is None else timeout)
+        job_id = None
+        try:
+            with self.app.app_context():
+                job_id = self._submit(
+                    input_file, output_file, preset_quality,
+                    display_aspect_ratio, queue_id=queue_id,
+                    backend=backend, **kwargs)
+        finally:
+            with self._cond:
+                self._reserved[slot] -= 1
+                if job_id is not None:
+                    self._in_flight.setdefault(slot, set()).add(job_id)
+                    self._queues[job_id] = slot
+                self._cond.notify_all()
+        if self.poller is not None:
+            self.poller.track(job_id)
+        return job_id
+
+    def _slot(self, backend, queue_id=None):
+        """Return the server name and the queue ID of a submission."""
+        return (backend.name, queue_id or backend.queue_id or
+                self.settings.default_queue)
+
+    def _full(self, pool, queue_id=None):
+        """Return the error of a submission finding no free slot."""
+        name, queue_id = self._slot(
+            (pool.available() or [pool.default])[0], queue_id)
+        return SorensonQueueFullError(queue_id, self.limit(queue_id, name))
+
+    def _acquire(self, queue_id, priority, block, timeout):
+        """Wait until the submission is the first one and a server is free.
+
+        :param queue_id: Sorenson queue of the submission, if any.
+        :returns: tuple of the chosen backend and its slot.
+        """
+        pool = self.app.extensions['cds-sorenson'].backends
+
+        def free(backend):
+            name, queue = self._slot(backend, queue_id)
+            return self._used((name, queue)) < self.limit(queue, name)
+
+        with self._cond:
+            waiting = self._waiting.setdefault(queue_id, [])
+            backend = None if waiting else pool.choose(accept=free)
+            if backend is None:
+                if not block:
+                    raise self._full(pool, queue_id)
+                ticket = (priority, next(self._counter))
+                heapq.heappush(waiting, ticket)
+                expires_at = None if timeout is None \
+                    else self.clock() + timeout
+                try:
+                    while True:
+                        if waiting[0] == ticket:
+                            backend = pool.choose(accept=free)
+                            if backend is not None:
+                                break
+                        remaining = None
+                        if expires_at is not None:
+                            remaining = expires_at - self.clock()
+                            if remaining <= 0:
+                                raise self._full(pool, queue_id)
+                        self._cond.wait(remaining)
+                except BaseException:
+                    waiting.remove(ticket)
+                    heapq.heapify(waiting)
+                    # The next submission may be able to go now
+                    self._cond.notify_all()
+                    raise
+                heapq.heappop(waiting)
+            slot = self._slot(backend, queue_id)
+            self._reserved[slot] = self._reserved.get(slot, 0) + 1
+            self._cond.notify_all()
+            return backend, slot
+
+    def release(self, job_id, status=None):
+        """Free the slot of a job, e.g. when it reached a final status.
+
+        It can be used as the ``on_finish`` callback of a
+        :class:`~cds_sorenson.poller.StatusPoller`.
+        """
+        with self._cond:
+            slot = self._queues.pop(job_id, None)
+            if slot is not None:
+                self._in_flight[slot].discard(job_id)
+                self._cond.notify_all()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Snapshot of the configuration used by the client.
+
+The ``CDS_SORENSON_*`` settings are read once, when the extension is
+initialized, so the calls to Sorenson don't look them up in the application
+config every time and work without an application context.
+
+After changing the configuration of an application, call
+:meth:`cds_sorenson.ext.CDSSorenson.init_config` again to refresh the
+snapshot, e.g. the URLs, the presets or the queue of the jobs. The objects
+created from the configuration by :meth:`cds_sorenson.ext.CDSSorenson.init_app`
+are not refreshed: the transport with its timeouts, retries and circuit
+breakers, the backends, the caches, the ledger, the estimator and the metrics
+need ``init_app`` to be called again.
+"""
+
+from __future__ import absolute_import, print_function
+
+from werkzeug.utils import import_string
+
+from .presets import PresetRegistry
+
+PREFIX = 'CDS_SORENSON_'
+"""Prefix of the settings of the client."""
+
+URL_SETTINGS = {
+    'submit': 'CDS_SORENSON_SUBMIT_URL',
+    'delete': 'CDS_SORENSON_DELETE_URL',
+    'current-status': 'CDS_SORENSON_CURRENT_JOBS_STATUS_URL',
+    'archive-status': 'CDS_SORENSON_ARCHIVE_JOBS_STATUS_URL',
+}
+"""Setting holding the URL template of each endpoint."""
+
+
+class UrlTemplate(object):
+    """URL template with optional ``{job_id}`` placeholders.
+
+    The template is split once around the placeholders, so building a URL is
+    a mere join.
+    """
+
+    __slots__ = ('template', '_parts')
+
+    def __init__(self, template):
+        """Split the template.
+
+        :param template: URL like ``'http://sorenson/api/jobs/{job_id}'``.
+        """
+        self.template = template
+        self._parts = template.split('{job_id}')
+
+    def format(self, job_id=None):
+        """Return the URL of a job, like :meth:`str.format`."""
+        if len(self._parts) == 1:
+            return self._parts[0]
+        return str(job_id).join(self._parts)
+
+    def __eq__(self, other):
+        """Compare with another template or with a string."""
+        if isinstance(other, UrlTemplate):
+            other = other.template
+        return self.template == other
+
+    def __ne__(self, other):
+        """Compare with another template or with a string."""
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Representation of the template."""
+        return 'UrlTemplate({0!r})'.format(self.template)
+
+
+class SorensonSettings(object):
+    """Read-only snapshot of the ``CDS_SORENSON_*`` settings.
+
+    Each setting is an attribute named after it, without the prefix and in
+    lowercase, e.g. ``settings.default_queue`` for
+    ``CDS_SORENSON_DEFAULT_QUEUE``. Besides:
+
+    * ``presets`` is the :class:`~cds_sorenson.presets.PresetRegistry` of
+      ``CDS_SORENSON_PRESETS``;
+    * ``urls`` maps each endpoint to its :class:`UrlTemplate`;
+    * ``name_generator`` is the function of
+      ``CDS_SORENSON_NAME_GENERATOR``;
+    * ``final_statuses`` is a frozen set.
+    """
+
+    def __init__(self, config):
+        """Take a snapshot of the configuration.
+
+        :param config: the application config, with the default values of
+            the settings already set.
+        """
+        values = self.__dict__
+        for key, value in config.items():
+            if key.startswith(PREFIX):
+                if isinstance(value, dict):
+                    value = dict(value)
+                values[key[len(PREFIX):].lower()] = value
+        values['presets'] = PresetRegistry(config['CDS_SORENSON_PRESETS'])
+        values['urls'] = dict(
+            (endpoint, UrlTemplate(config[setting]))
+            for endpoint, setting in URL_SETTINGS.items())
+        name_generator = config['CDS_SORENSON_NAME_GENERATOR']
+        if isinstance(name_generator, str):
+            name_generator = import_string(name_generator)
+        values['name_generator'] = name_generator
+        values['final_statuses'] = frozenset(
+            config['CDS_SORENSON_FINAL_STATUSES'])
+
+    @property
+    def notifications_enabled(self):
+        """True if Sorenson is asked to notify the end of the jobs.
+
+        It needs both ``CDS_SORENSON_NOTIFICATION_URL`` and
+        ``CDS_SORENSON_NOTIFICATION_TOKEN``.
+        """
+        return bool(self.notification_url and self.notification_token)
+
+    def __setattr__(self, name, value):
+        """Refuse to change a setting."""
+        raise AttributeError('Settings are read-only')
+
+    def __delattr__(self, name):
+        """Refuse to remove a setting."""
+        raise AttributeError('Settings are read-only')
+
+    def __repr__(self):
+        """Representation of the settings."""
+        return 'SorensonSettings({0} settings)'.format(len(self.__dict__))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Signals sent by CDS Sorenson.
+
+.. code-block:: python
+
+    from cds_sorenson.signals import job_finished
+
+    @job_finished.connect_via(app)
+    def on_job_finished(app, job_id, status, progress):
+        ...
+"""
+
+from __future__ import absolute_import, print_function
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+job_finished = _signals.signal('cds-sorenson-job-finished')
+"""Signal sent when a job is seen in a final status.
+
+It is sent by the application with the ``job_id``, ``status`` and
+``progress`` keyword arguments, whether the status was polled with
+:func:`~cds_sorenson.api.get_encoding_status` or notified by Sorenson.
+"""
@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Local stand-in for the Sorenson server.
+
+It implements the submit, delete, current-status and archive-status
+endpoints and moves the jobs through the Sorenson statuses on a simulated
+clock, so the client can be load-tested without the real server:
+
+.. code-block:: python
+
+    with FakeSorensonServer(FakeSorenson(capacity=2)) as server:
+        app.config.update(server.config)
+        app.extensions['cds-sorenson'].init_config(app)
+        job_id = start_encoding(...)
+        server.sorenson.clock.advance(60)
+        get_encoding_status(job_id)  # ('Finished', 100)
+
+It can also be started on its own:
+
+.. code-block:: console
+
+    $ python -m cds_sorenson.testing.fakeserver --port 8080 --speed 10
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+WAITING, DOWNLOADING, TRANSCODING, UPLOADING, FINISHED, ERROR, CANCELED = \
+    1, 2, 3, 4, 5, 6, 7
+
+DEFAULT_DURATIONS = OrderedDict([
+    (DOWNLOADING, 5),
+    (TRANSCODING, 40),
+    (UPLOADING, 5),
+])
+"""Seconds spent by each job in each running status."""
+
+
+class SimulatedClock(object):
+    """Clock running ``speed`` times faster than the real one.
+
+    It can also be moved forward by hand with :meth:`advance`, e.g. with
+    ``speed=0`` to fully control the time in tests.
+    """
+
+    def __init__(self, speed=1.0):
+        """Start the clock at zero."""
+        self.speed = speed
+        self._offset = 0.0
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        """Return the simulated number of seconds since the start."""
+        with self._lock:
+            return (time.time() - self._started) * self.speed + self._offset
+
+    def advance(self, seconds):
+        """Move the clock forward."""
+        with self._lock:
+            self._offset += seconds
+
+
+class _FakeJob(object):
+    """Encoding job of the fake server."""
+
+    __slots__ = ('job_id', 'payload', 'submitted_at', 'started_at',
+                 'finished_at', 'final_status')
+
+    def __init__(self, job_id, payload, submitted_at):
+        self.job_id = job_id
+        self.payload = payload
+        self.submitted_at = submitted_at
+        self.started_at = None
+        self.finished_at = None
+        self.final_status = None
+
+
+class FakeSorenson(object):
+    """Simulated state of a Sorenson server."""
+
+    def __init__(self, capacity=4, queue_capacity=None, durations=None,
+                 failure_rate=0, error_rate=0, latency=0, source_size=10 ** 8,
+                 clock=None, seed=None):
+        """Initialize the fake server.
+
+        :param capacity: number of jobs encoded at the same time.
+        :param queue_capacity: maximum number of unfinished jobs, further
+            submissions get a 503 response. ``None`` means no limit.
+        :param durations: seconds spent in each running status, by default
+            :data:`DEFAULT_DURATIONS`.
+        :param failure_rate: fraction of the jobs ending with an error.
+        :param error_rate: fraction of the requests answered with a 500.
+        :param latency: seconds to wait before answering each request, or a
+            ``(min, max)`` tuple to wait a random time.
+        :param source_size: size in bytes reported for the source files.
+        :param clock: :class:`SimulatedClock`, by default a real-time one.
+        :param seed: seed of the random generator, for reproducible runs.
+        """
+        self.capacity = capacity
+        self.queue_capacity = queue_capacity
+        self.durations = durations or DEFAULT_DURATIONS
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.latency = latency
+        self.source_size = source_size
+        self.clock = clock or SimulatedClock()
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._epoch = time.time()
+        self._jobs = {}
+        self._waiting = deque()
+        self._running = []
+        self._time = 0.0
+        self._lock = threading.Lock()
+
+    def _duration(self):
+        return sum(self.durations.values())
+
+    def _update(self):
+        """Move the jobs forward up to the current simulated time."""
+        now = self.clock()
+        while True:
+            while self._waiting and len(self._running) < self.capacity:
+                job = self._waiting.popleft()
+                job.started_at = max(job.submitted_at, self._time)
+                self._running.append(job)
+            if not self._running:
+                break
+            job = min(self._running,
+                      key=lambda job: job.started_at + self._duration())
+            finished_at = job.started_at + self._duration()
+            if finished_at > now:
+                break
+            self._time = finished_at
+            self._running.remove(job)
+            job.finished_at = finished_at
+            job.final_status = ERROR \
+                if self.random.random() < self.failure_rate else FINISHED
+        self._time = max(self._time, now)
+
+    def _iso(self, seconds):
+        """Format a simulated time like Sorenson."""
+        if seconds is None:
+            return None
+        return time.strftime('%Y-%m-%dT%H:%M:%S.0000000Z',
+                             time.gmtime(self._epoch + seconds))
+
+    def submit(self, payload):
+        """Queue a new job.
+
+        :returns: the job ID, or ``None`` if the queue is full.
+        """
+        with self._lock:
+            self._update()
+            if self.queue_capacity is not None and \
+                    len(self._waiting) + len(self._running) >= \
+                    self.queue_capacity:
+                return None
+            job = _FakeJob(str(uuid.uuid4()), payload, self.clock())
+            self._jobs[job.job_id] = job
+            self._waiting.append(job)
+            return job.job_id
+
+    def delete(self, job_id):
+        """Cancel a job.
+
+        :returns: False if the job doesn't exist or is already done.
+        """
+        with self._lock:
+            self._update()
+            job = self._jobs.get(job_id)
+            if job is None or job.final_status is not None:
+                return False
+            if job in self._running:
+                self._running.remove(job)
+            else:
+                self._waiting.remove(job)
+            job.finished_at = self.clock()
+            job.final_status = CANCELED
+            return True
+
+    def _status(self, job, now):
+        """Return the running status and progress of a job."""
+        if job.started_at is None:
+            return WAITING, 0
+        elapsed = now - job.started_at
+        for status, duration in self.durations.items():
+            if elapsed < duration:
+                return status, 100.0 * elapsed / duration
+            elapsed -= duration
+        return UPLOADING, 100.0
+
+    def current_status(self, job_id):
+        """Return the status of an unfinished job, or ``None``."""
+        with self._lock:
+            self._update()
+            job = self._jobs.get(job_id)
+            if job is None or job.final_status is not None:
+                return None
+            status, progress = self._status(job, self.clock())
+            return OrderedDict([
+                ('JobId', job.job_id),
+                ('Name', job.payload.get('Name')),
+                ('QueueId', job.payload.get('QueueId')),
+                ('Status', OrderedDict([
+                    ('Progress', progress),
+                    ('Status', status),
+                    ('TimeStartedIso8601', self._iso(job.started_at)),
+                ])),
+                ('TimeSubmittedIso8601', self._iso(job.submitted_at)),
+                ('TotalSourceSize', self.source_size),
+            ])
+
+    def archive_status(self, job_id):
+        """Return the status of a finished job.
+
+        :returns: ``None`` if the job isn't archived, an empty string if it
+            was canceled, or its JSON status.
+        """
+        with self._lock:
+            self._update()
+            job = self._jobs.get(job_id)
+            if job is None or job.final_status is None:
+                return None
+            if job.final_status == CANCELED:
+                return ''
+            media = job.payload.get('JobMediaInfo', {})
+            presets = media.get('CompressionPresetList', [])
+            destinations = media.get('DestinationList', [])
+            return OrderedDict([
+                ('JobId', job.job_id),
+                ('Name', job.payload.get('Name')),
+                ('StatusStateId', job.final_status),
+                ('PercentCompleteOverall', 100),
+                ('TimeSubmittedIso8601', self._iso(job.submitted_at)),
+                ('TimeStartedIso8601', self._iso(job.started_at)),
+                ('TimeFinishedIso8601', self._iso(job.finished_at)),
+                ('CompressionPresetList', presets),
+                ('DestinationList', destinations),
+                ('SourceMediaList', media.get('SourceMediaList', [])),
+                ('OutputList', [
+                    OrderedDict([
+                        ('FileName', destination.get('FileUri')),
+                        ('FileSize', self.source_size // 10),
+                        ('DurationSeconds', self._duration()),
+                        ('FileType', 'VideoOutput'),
+                    ]) for destination in destinations
+                ] if job.final_status == FINISHED else []),
+            ])
+
+    def wait(self):
+        """Wait for the configured latency."""
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def fail(self):
+        """Return True if the current request should fail."""
+        with self._lock:
+            self.requests += 1
+            return self.error_rate and self.random.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP/1.1 handler for the Sorenson endpoints."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    job_url = re.compile(r'^/api/jobs/(?:(status|archive)/)?([^/?]+)$')
+
+    @property
+    def sorenson(self):
+        return self.server.sorenson
+
+    def _respond(self, status_code, body=''):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        data = body.encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        # Always read the body, so the connection can be reused
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.sorenson.wait()
+        if self.sorenson.fail():
+            return self._respond(500, 'Internal Server Error')
+
+        if self.path == '/api/jobs':
+            if method != 'POST':
+                return self._respond(405)
+            try:
+                payload = json.loads(body.decode('utf-8'))
+            except ValueError:
+                return self._respond(400, 'Invalid JSON')
+            job_id = self.sorenson.submit(payload)
+            if job_id is None:
+                return self._respond(503, 'Queue is full')
+            return self._respond(200, {'JobId': job_id})
+
+        match = self.job_url.match(self.path)
+        if not match:
+            return self._respond(404, 'Not Found')
+        kind, job_id = match.groups()
+        if method == 'DELETE' and kind is None:
+            if self.sorenson.delete(job_id):
+                return self._respond(200)
+            return self._respond(404, 'Not Found')
+        if method == 'GET' and kind == 'status':
+            status = self.sorenson.current_status(job_id)
+        elif method == 'GET' and kind == 'archive':
+            status = self.sorenson.archive_status(job_id)
+        else:
+            return self._respond(405)
+        if status is None:
+            return self._respond(404, 'Not Found')
+        return self._respond(200, status)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, *args):
+        """Don't log every request."""
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeSorensonServer(object):
+    """Serve a :class:`FakeSorenson` from a background thread."""
+
+    def __init__(self, sorenson=None, host='127.0.0.1', port=0):
+        """Initialize the server.
+
+        :param sorenson: the simulated :class:`FakeSorenson`.
+        :param host: interface to listen on.
+        :param port: port to listen on, ``0`` to pick a free one.
+        """
+        self.sorenson = sorenson or FakeSorenson()
+        self.httpd = _ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.sorenson = self.sorenson
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the server."""
+        host, port = self.httpd.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    @property
+    def config(self):
+        """``CDS_SORENSON_*`` URL settings pointing to this server."""
+        base = self.url + '/api/jobs'
+        return dict(
+            CDS_SORENSON_SUBMIT_URL=base,
+            CDS_SORENSON_DELETE_URL=base + '/{job_id}',
+            CDS_SORENSON_CURRENT_JOBS_STATUS_URL=base + '/status/{job_id}',
+            CDS_SORENSON_ARCHIVE_JOBS_STATUS_URL=base + '/archive/{job_id}',
+        )
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        """Start the server."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """Stop the server."""
+        self.stop()
+
+
+def main(argv=None):
+    """Run the fake Sorenson server from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--capacity', type=int, default=4)
+    parser.add_argument('--queue-capacity', type=int, default=None)
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='speed of the simulated clock')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0)
+    args = parser.parse_args(argv)
+
+    sorenson = FakeSorenson(
+        capacity=args.capacity, queue_capacity=args.queue_capacity,
+        clock=SimulatedClock(args.speed), latency=args.latency,
+        error_rate=args.error_rate, failure_rate=args.failure_rate)
+    server = FakeSorensonServer(sorenson, host=args.host, port=args.port)
+    print('Fake Sorenson listening on {0}'.format(server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
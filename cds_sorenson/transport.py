@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Pooled HTTP transport to talk to the Sorenson server."""
+
+from __future__ import absolute_import, print_function
+
+import itertools
+import threading
+from timeit import default_timer
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from .breaker import CircuitBreaker
+from .error import SorensonConnectionError, SorensonTimeoutError, \
+    error_for_status
+from .metrics import MetricsSink
+from .retry import RetryPolicy
+from .utils import load_from_config
+
+
+class TransportStats(object):
+    """Thread-safe counters to check that connections are being reused."""
+
+    def __init__(self):
+        """Initialize all counters to zero."""
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    @property
+    def reused(self):
+        """Number of requests that were sent over an already open socket."""
+        return max(self.requests - self.connections, 0)
+
+    def record_request(self):
+        """Count an outgoing request."""
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        """Count a newly opened (or re-opened) connection."""
+        with self._lock:
+            self.connections += 1
+
+    def to_dict(self):
+        """Return a snapshot of the counters."""
+        with self._lock:
+            return dict(
+                requests=self.requests,
+                connections=self.connections,
+                reused=max(self.requests - self.connections, 0),
+            )
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTP adapter counting every connection opened by its pools."""
+
+    def __init__(self, stats, **kwargs):
+        """Initialize the adapter with the stats to update."""
+        self._stats = stats
+        self._pool_classes = {}
+        super(_CountingHTTPAdapter, self).__init__(**kwargs)
+
+    def _counting_pool_class(self, pool_cls):
+        """Return a subclass of ``pool_cls`` which counts new connections."""
+        if pool_cls not in self._pool_classes:
+            stats = self._stats
+            conn_cls = pool_cls.ConnectionCls
+
+            def connect(conn):
+                stats.record_connection()
+                return conn_cls.connect(conn)
+
+            self._pool_classes[pool_cls] = type(
+                pool_cls.__name__, (pool_cls, ), {
+                    'ConnectionCls': type(
+                        conn_cls.__name__, (conn_cls, ), {'connect': connect}),
+                })
+        return self._pool_classes[pool_cls]
+
+    def _instrument(self, manager):
+        """Make ``manager`` create counting connection pools."""
+        manager.pool_classes_by_scheme = dict(
+            (scheme, self._counting_pool_class(pool_cls))
+            for scheme, pool_cls in manager.pool_classes_by_scheme.items()
+        )
+        return manager
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Create the pool manager and instrument it."""
+        super(_CountingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self._instrument(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        """Create (or reuse) the proxy manager and instrument it."""
+        new = proxy not in self.proxy_manager
+        manager = super(_CountingHTTPAdapter, self).proxy_manager_for(
+            proxy, **proxy_kwargs)
+        return self._instrument(manager) if new else manager
+
+
+class SorensonTransport(object):
+    """Keep-alive HTTP transport shared by every call to Sorenson.
+
+    It wraps a :class:`requests.Session` whose connection pools are kept
+    between calls, so consecutive calls to the same Sorenson host don't pay
+    for a new TCP (and TLS) handshake each time.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, retry_policy=None, breaker_storage=None,
+                 breaker_threshold=5, breaker_recovery=30, metrics=None,
+                 timeouts=None, default_timeout=None):
+        """Initialize the session and mount the pooled adapter.
+
+        :param pool_connections: number of per-host pools to keep.
+        :param pool_maxsize: maximum number of connections kept per host.
+        :param pool_block: if True, never open more than ``pool_maxsize``
+            connections to the same host and wait for a free one instead.
+        :param keep_alive: if False, close the connection after each call.
+        :param retry_policy: :class:`~cds_sorenson.retry.RetryPolicy` for the
+            failed requests, or ``None`` to never retry them.
+        :param breaker_storage: storage of the state of the circuit breaker
+            of each endpoint, or ``None`` to disable them.
+        :param breaker_threshold: consecutive failures opening a breaker.
+        :param breaker_recovery: seconds before trying an endpoint again.
+        :param metrics: :class:`~cds_sorenson.metrics.MetricsSink` receiving
+            the latency, status and size of every call.
+        :param timeouts: dictionary mapping endpoint names to their
+            :mod:`requests` timeout, e.g. ``{'submit': (3.05, 30)}``.
+        :param default_timeout: timeout of the other endpoints.
+        """
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.retry_policy = retry_policy
+        self.metrics = metrics or MetricsSink()
+        self.breaker_storage = breaker_storage
+        self.breaker_threshold = breaker_threshold
+        self.breaker_recovery = breaker_recovery
+        self._breakers = {}
+        self.stats = TransportStats()
+        self.session = requests.Session()
+        adapter = _CountingHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        """Create the transport from the ``CDS_SORENSON_*`` configuration."""
+        return cls(
+            metrics=metrics,
+            timeouts=config['CDS_SORENSON_TIMEOUTS'],
+            default_timeout=config['CDS_SORENSON_DEFAULT_TIMEOUT'],
+            pool_connections=config['CDS_SORENSON_POOL_CONNECTIONS'],
+            pool_maxsize=config['CDS_SORENSON_POOL_MAXSIZE'],
+            pool_block=config['CDS_SORENSON_POOL_BLOCK'],
+            keep_alive=config['CDS_SORENSON_KEEP_ALIVE'],
+            retry_policy=RetryPolicy.from_config(config),
+            breaker_storage=load_from_config(
+                config, 'CDS_SORENSON_CIRCUIT_BREAKER_STORAGE'),
+            breaker_threshold=config['CDS_SORENSON_CIRCUIT_BREAKER_THRESHOLD'],
+            breaker_recovery=config['CDS_SORENSON_CIRCUIT_BREAKER_RECOVERY'],
+        )
+
+    def breaker(self, endpoint):
+        """Return the circuit breaker of an endpoint, or ``None``."""
+        if self.breaker_storage is None or endpoint is None:
+            return None
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(
+                endpoint, self.breaker_storage,
+                failure_threshold=self.breaker_threshold,
+                recovery_timeout=self.breaker_recovery,
+            )
+        return self._breakers[endpoint]
+
+    def timeout(self, endpoint):
+        """Return the timeout configured for an endpoint.
+
+        :param endpoint: name of the endpoint, e.g. ``'submit'``. The servers
+            of a pool name theirs ``'server:endpoint'``.
+        """
+        return self.timeouts.get(endpoint.rpartition(':')[2],
+                                 self.default_timeout)
+
+    def prepare_attempt(self, endpoint, attempt, timeout, deadline=None):
+        """Account for an attempt of a call and return its timeout.
+
+        Shared with the asyncio client, so both count the retries and honor
+        the deadlines the same way.
+
+        :param endpoint: name of the endpoint, for the metrics.
+        :param attempt: number of the attempt, starting at 1.
+        :param timeout: timeout of the attempt.
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of the whole
+            operation.
+        :returns: the timeout, shortened to the time left.
+        :raises SorensonTimeoutError: if the deadline is exceeded.
+        """
+        if attempt > 1:
+            self.metrics.inc('sorenson_retries_total', endpoint=endpoint)
+        if deadline is not None:
+            deadline.check()
+            timeout = deadline.clamp(timeout)
+        return timeout
+
+    def request(self, method, url, endpoint=None, deadline=None, **kwargs):
+        """Send a request through the pooled session.
+
+        Connection errors, timeouts, 5xx and 429 responses raise a
+        :class:`~cds_sorenson.error.SorensonRetryableError`, after being
+        retried according to the retry policy. Any other response is
+        returned as is. While the circuit breaker of the endpoint is open,
+        :class:`~cds_sorenson.error.SorensonUnavailableError` is raised
+        without sending anything.
+
+        Unless ``timeout`` is given, the timeout configured for the endpoint
+        is used. With a ``deadline``, it is shortened to the time left and
+        :class:`~cds_sorenson.error.SorensonTimeoutError` is raised instead
+        of sending a request once the time is up. As :mod:`requests` applies
+        the read timeout to each read of the socket, a slow but steady
+        response can still overrun the deadline by up to one read timeout.
+
+        :param method: HTTP method, e.g. ``'get'``.
+        :param url: URL of the Sorenson endpoint.
+        :param endpoint: name of the endpoint, e.g. ``'submit'``, used for
+            its circuit breaker, its metrics and its timeout.
+        :param deadline: :class:`~cds_sorenson.retry.Deadline` of the whole
+            operation.
+        :param kwargs: extra arguments passed to :mod:`requests`.
+        :returns: :class:`requests.Response` instance.
+        """
+        label = endpoint or 'other'
+        attempts = itertools.count(1)
+        kwargs.setdefault('timeout', self.timeout(label))
+
+        breaker = self.breaker(endpoint)
+
+        def send(*args, **kwargs):
+            # Checked outside of the breaker: running out of time is not a
+            # failure of the server
+            kwargs['timeout'] = self.prepare_attempt(
+                label, next(attempts), kwargs['timeout'], deadline)
+            if breaker is None:
+                return self._send(label, *args, **kwargs)
+            return breaker.call(self._send, label, *args, **kwargs)
+
+        if self.retry_policy is None:
+            return send(method, url, **kwargs)
+        return self.retry_policy.call(
+            send, method, url, idempotent=method.lower() != 'post',
+            deadline=deadline, **kwargs)
+
+    def _send(self, endpoint, method, url, **kwargs):
+        """Send a single request and classify its failure, if any."""
+        self.stats.record_request()
+        started = default_timer()
+        try:
+            response = getattr(self.session, method.lower())(url, **kwargs)
+        except requests.Timeout as e:
+            self.metrics.observe_request(
+                endpoint, 'timeout', default_timer() - started, 0)
+            raise SorensonTimeoutError(
+                str(e), safe=isinstance(e, requests.ConnectTimeout))
+        except requests.ConnectionError as e:
+            self.metrics.observe_request(
+                endpoint, 'connection-error', default_timer() - started, 0)
+            reason = getattr(e.args[0] if e.args else None, 'reason', None)
+            raise SorensonConnectionError(
+                str(e), safe=isinstance(reason, ConnectTimeoutError))
+        self.metrics.observe_request(
+            endpoint, response.status_code, default_timer() - started,
+            len(response.content or b''))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise error_for_status(
+                response.status_code, response.text,
+                response.headers.get('Retry-After')
+                if response.status_code == 429 else None)
+        return response
+
+    def get(self, url, **kwargs):
+        """Send a GET request."""
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request."""
+        return self.request('post', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """Send a DELETE request."""
+        return self.request('delete', url, **kwargs)
+
+    def close(self):
+        """Close all the pooled connections."""
+        self.session.close()
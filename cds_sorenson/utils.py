@@ -26,34 +26,38 @@
 
 from __future__ import absolute_import, print_function
 
+import hashlib
+import json
 from itertools import chain
 
-import requests
-from flask import current_app
+from werkzeug.utils import import_string
 
-from .error import SorensonError
+from .proxies import current_cds_sorenson
 
 
-def generate_json_for_encoding(input_file, output_file, preset_id):
-    """Generate JSON that will be sent to Sorenson server to start encoding."""
-    current_preset = _get_preset_config(preset_id)
-    # Make sure the preset config exists for a given preset_id
-    if not current_preset:
-        raise SorensonError('Invalid preset "{0}"'.format(preset_id))
+def generate_json_for_encoding(input_file, output_file, preset_id,
+                               queue_id=None, server=None):
+    """Generate JSON that will be sent to Sorenson server to start encoding.
 
-    return dict(
-        Name='CDS File:{0} Preset:{1}'.format(input_file, preset_id),
-        QueueId=current_app.config['CDS_SORENSON_DEFAULT_QUEUE'],
-        JobMediaInfo=dict(
-            SourceMediaList=[dict(
-                FileUri=input_file,
-                UserName=current_app.config['CDS_SORENSON_USERNAME'],
-                Password=current_app.config['CDS_SORENSON_PASSWORD'],
-            )],
-            DestinationList=[dict(FileUri='{}'.format(output_file))],
-            CompressionPresetList=[dict(PresetId=preset_id)],
-        ),
-    )
+    See
+    :meth:`cds_sorenson.client.SorensonClient.generate_json_for_encoding`.
+    """
+    return current_cds_sorenson.client.generate_json_for_encoding(
+        input_file, output_file, preset_id, queue_id=queue_id, server=server)
+
+
+def generate_json_for_ladder_encoding(input_file, outputs, queue_id=None,
+                                      server=None):
+    """Generate JSON to encode one file with several presets in one job.
+
+    :param input_file: the file to encode.
+    :param outputs: list of ``(output_file, preset_id)`` tuples.
+    :param queue_id: Sorenson queue, by default ``CDS_SORENSON_DEFAULT_QUEUE``.
+    :param server: name of the server of ``CDS_SORENSON_BACKENDS`` the job
+        is submitted to, if any.
+    """
+    return current_cds_sorenson.client.generate_json_for_ladder_encoding(
+        input_file, outputs, queue_id=queue_id, server=server)
 
 
 def name_generator(master_name, preset):
@@ -64,49 +68,32 @@ def name_generator(master_name, preset):
     :returns: string with the slave name for this preset.
     """
     return ("{master_name}-{video_bitrate}-kbps-{width}x{height}-audio-"
-            "{audio_bitrate}-kbps-stereo.mp4".format(master_name='master_name',
+            "{audio_bitrate}-kbps-stereo.mp4".format(master_name=master_name,
                                                      **preset))
 
 
-def get_status(job_id):
+def get_status(job_id, deadline=None):
     """For a given job id, returns the status as JSON string.
 
-    If the job can't be found in the current queue, it's probably done, so we
-    check the archival queue. Raises an exception if there the response has a
-    different code than 200.
-
-    :param job_id: string with the job ID.
-    :returns: JSON with the status or empty string if the job was not found.
+    See :meth:`cds_sorenson.client.SorensonClient.get_status`.
     """
-    current_jobs_url = (current_app
-                        .config['CDS_SORENSON_CURRENT_JOBS_STATUS_URL']
-                        .format(job_id=job_id))
-    archive_jobs_url = (current_app
-                        .config['CDS_SORENSON_ARCHIVE_JOBS_STATUS_URL']
-                        .format(job_id=job_id))
-
-    headers = {'Accept': 'application/json'}
-    proxies = current_app.config['CDS_SORENSON_PROXIES']
+    return current_cds_sorenson.client.get_status(job_id, deadline=deadline)
 
-    response = requests.get(current_jobs_url, headers=headers, proxies=proxies)
 
-    if response.status_code == 404:
-        response = requests.get(
-            archive_jobs_url, headers=headers, proxies=proxies)
+def parse_status(job_id, status):
+    """Extract the status message and the progress from a status response.
 
-    if response.status_code == requests.codes.ok:
-        return response.text
-    else:
-        raise SorensonError("{0}: {1}".format(response.status_code,
-                                              response.text))
+    :param job_id: string with the job ID.
+    :param status: JSON string returned by :func:`get_status`.
+    :returns: tuple with the status message and progress in %.
+    """
+    return current_cds_sorenson.client.parse_status(job_id, status)
 
 
 def _get_preset_config(preset_id):
     """Return preset config based on the preset_id."""
-    for outer_dict in current_app.config['CDS_SORENSON_PRESETS'].values():
-        for inner_dict in outer_dict.values():
-            if inner_dict['preset_id'] == preset_id:
-                return inner_dict
+    preset = current_cds_sorenson.presets.get_by_id(preset_id)
+    return dict(preset) if preset is not None else None
 
 
 def _filepath_for_samba(filepath):
@@ -115,6 +102,29 @@ def _filepath_for_samba(filepath):
     Sorenson has the eos directory mounted through samba, so the paths
     need to be adjusted.
     """
-    samba_dir = current_app.config['CDS_SORENSON_SAMBA_DIRECTORY']
-    eos_dir = current_app.config['CDS_SORENSON_CDS_DIRECTORY']
-    return filepath.replace(eos_dir, samba_dir)
+    return current_cds_sorenson.client.filepath_for_samba(filepath)
+
+
+def idempotency_key(input_file, output_file, preset_id, job_id=None):
+    """Return the key identifying the submission of an encoding job.
+
+    :param job_id: ID of the job replaced by the submission, if any.
+    """
+    return hashlib.sha256(json.dumps(
+        [input_file, output_file, preset_id, job_id]).encode('utf-8')
+    ).hexdigest()
+
+
+def load_from_config(config, key):
+    """Create the object configured by ``key`` and ``key + '_OPTIONS'``.
+
+    The value of ``key`` is either a class or its import path.
+
+    :returns: the new object or ``None`` if the value of ``key`` is empty.
+    """
+    cls = config[key]
+    if not cls:
+        return None
+    if isinstance(cls, str):
+        cls = import_string(cls)
+    return cls(**config.get(key + '_OPTIONS', {}))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Endpoint receiving the notifications of Sorenson.
+
+If ``CDS_SORENSON_NOTIFICATION_URL`` is set, every job asks Sorenson to call
+this endpoint when it finishes, so the jobs don't need to be polled.
+"""
+
+from __future__ import absolute_import, print_function
+
+import hmac
+import json
+
+from flask import Blueprint, abort, current_app, request
+
+from .error import SorensonError, SorensonRetryableError, \
+    SorensonUnavailableError
+from .proxies import current_cds_sorenson
+
+blueprint = Blueprint('cds_sorenson', __name__, url_prefix='/sorenson')
+
+
+@blueprint.route('/notifications', methods=['POST'])
+def notification():
+    """Record the status of a job sent by Sorenson.
+
+    The request must have the ``token`` of ``CDS_SORENSON_NOTIFICATION_TOKEN``
+    in its query string, and the job in its body. If the body has the job ID
+    but not its status, the status is fetched from Sorenson: if it can't be
+    fetched for the time being, a 503 response asks Sorenson to send the
+    notification again.
+    """
+    settings = current_cds_sorenson.settings
+    if not settings.notifications_enabled:
+        abort(404)
+    token = settings.notification_token
+    if not hmac.compare_digest(
+            request.args.get('token', '').encode('utf-8'),
+            token.encode('utf-8')):
+        abort(403)
+
+    status = request.get_data(as_text=True)
+    try:
+        job = json.loads(status)
+        job_id = job['JobId']
+    except (ValueError, KeyError, TypeError):
+        abort(400)
+    backends = current_cds_sorenson.backends
+    backend = backends.backends.get(request.args.get('server'),
+                                    backends.default)
+    job_id = backend.job_id(job_id)
+
+    client = current_cds_sorenson.client
+    try:
+        if 'Status' not in job and 'StatusStateId' not in job:
+            status = client.get_status(job_id)
+        client.update_status(job_id, status)
+    except (SorensonRetryableError, SorensonUnavailableError) as e:
+        current_app.logger.warning(
+            'Could not fetch the status of job {0}: {1}'.format(job_id, e))
+        abort(503)
+    except SorensonError as e:
+        current_app.logger.warning(
+            'Invalid notification of job {0}: {1}'.format(job_id, e))
+        abort(400)
+    return '', 204
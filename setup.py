@@ -45,9 +45,18 @@ tests_require = [
 ]
 
 extras_require = {
+    'aio': [
+        'aiohttp>=3.3.0;python_version>="3.5"',
+    ],
+    'benchmarks': [
+        'pytest-benchmark>=3.0.0',
+    ],
     'docs': [
         'Sphinx>=1.4.2',
     ],
+    'orjson': [
+        'orjson>=2.0.0;python_version>="3.6"',
+    ],
     'tests': tests_require,
 }
 
@@ -61,7 +70,9 @@ setup_requires = [
 ]
 
 install_requires = [
+    'blinker>=1.4',
     'Flask-BabelEx>=0.9.2',
+    'futures>=3.0.5;python_version=="2.7"',
     'pysocks>=1.6.5',
     'requests[socks]>=2.11.1',
 ]
@@ -27,11 +27,18 @@
 
 from __future__ import absolute_import, print_function
 
+import sys
+
 import pytest
 from flask import Flask
 
 from cds_sorenson import CDSSorenson
 
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # The asyncio API uses the async/await syntax
+    collect_ignore.append('test_aio.py')
+
 
 @pytest.fixture()
 def config():
@@ -45,11 +52,10 @@ def config():
 def app(config):
     """Flask application fixture."""
     app_ = Flask('testapp')
+    app_.config.update(config)
 
     CDSSorenson(app_)
 
-    app_.config.update(config)
-
     with app_.app_context():
         yield app_
 
@@ -105,13 +111,13 @@ def finished_job_status_response():
 
        ],
        "QueueName":"big_files",
-       "ThumbTime":None,
-       "OutPoint":None,
+       "ThumbTime":null,
+       "OutPoint":null,
        "TimeSubmitted":"/Date(1476880212000+0200)/",
        "TimeArchivedIso8601":"2016-10-19T12:31:10.0000000Z",
        "TimeStartedIso8601":"2016-10-19T12:30:12.0000000Z",
        "StatusState":"Finished",
-       "TimeNotified":None,
+       "TimeNotified":null,
        "OriginalJobId":"3c826c49-3d89-44e9-ac71-e9f02d5702ec",
        "OutputList":[
           {
@@ -128,81 +134,81 @@ def finished_job_status_response():
              "FileWidth":640
           }
        ],
-       "WatchFolderName":None,
+       "WatchFolderName":null,
        "TimeFinished":"/Date(1476880269000+0200)/",
-       "ErrorCode":None,
-       "TimeNotifiedIso8601":None,
+       "ErrorCode":null,
+       "TimeNotifiedIso8601":null,
        "TimeArchived":"/Date(1476880270000+0200)/",
        "CompressionPresetList":[
           {
              "PresetId":"2c5a86db-1018-4ff8-a5ad-daebd4cb4ff4",
-             "WatchFolderId":None,
+             "WatchFolderId":null,
              "PresetXmlBase64Data":"91dHB1dD4=",
              "JobPresetId":"a9bb37af-dab3-4a30-86b9-1b78cbc4b43d",
-             "UriLocation":None,
-             "JobId":None
+             "UriLocation":null,
+             "JobId":null
           }
        ],
        "SourceMediaList":[
           {
-             "S3BucketName":None,
+             "S3BucketName":null,
              "FileSize":-1,
-             "ModifiedIso8601":None,
-             "CredentialId":None,
+             "ModifiedIso8601":null,
+             "CredentialId":null,
              "WatermarkInfo":{
-                "WatermarkImageUserName":None,
-                "WatermarkImageCredentialId":None,
-                "WatermarkImagePassword":None,
-                "WatermarkImageUri":None
+                "WatermarkImageUserName":null,
+                "WatermarkImageCredentialId":null,
+                "WatermarkImagePassword":null,
+                "WatermarkImageUri":null
              },
              "FileUri":"file://cernbox-smb.cern.ch/eoscds/test/sorenson_input/1111-dddd-3333-aaaa/data.mp4",
              "CompressOrder":0,
-             "CreatedIso8601":None,
-             "JobSubmittedIso8601":None,
-             "Password":None,
+             "CreatedIso8601":null,
+             "JobSubmittedIso8601":null,
+             "Password":null,
              "Type":1,
-             "FileName":None,
-             "EncodeAllAudioTracks":False,
-             "AutoDeleteSource":False,
-             "IsWatchfolder":False,
-             "JobId":None,
-             "Modified":None,
-             "WatchFolderId":None,
+             "FileName":null,
+             "EncodeAllAudioTracks":false,
+             "AutoDeleteSource":false,
+             "IsWatchfolder":false,
+             "JobId":null,
+             "Modified":null,
+             "WatchFolderId":null,
              "UserName":"",
-             "Created":None,
-             "JobSubmitted":None,
+             "Created":null,
+             "JobSubmitted":null,
              "SourceId":"00000000-0000-0000-0000-000000000000"
           }
        ],
-       "InPoint":None,
+       "InPoint":null,
        "ServerName":"sorenson02.cern.ch",
        "JobId":"3c826c49-3d89-44e9-ac71-e9f02d5702ec",
        "TimeStarted":"/Date(1476880212000+0200)/",
        "DestinationList":[
           {
-             "S3BucketName":None,
-             "ModifiedIso8601":None,
+             "S3BucketName":null,
+             "ModifiedIso8601":null,
              "DestinationMetadataList":[
 
              ],
              "DestinationId":"eac9a16b-ffe2-44c6-8bcd-8b49f6da3656",
-             "ThumbUri":None,
+             "ThumbUri":null,
              "FileNamingMethod":"Undefined",
              "Type":1,
-             "WatchFolderId":None,
-             "JobId":None,
+             "WatchFolderId":null,
+             "JobId":null,
              "FileUri":"file://cernbox-smb.cern.ch/eoscds/test/sorenson_output/1111-dddd-3333-aaaa/",
-             "ThumbFilePattern":None,
-             "CreatedIso8601":None,
+             "ThumbFilePattern":null,
+             "CreatedIso8601":null,
              "ExtensionNamingMethod":"Undefined",
-             "CredentialId":None,
-             "S3ThumbBucket":None,
-             "Created":None,
-             "Password":None,
-             "UserName":None,
-             "Modified":None,
-             "FileName":None,
-             "DestinationName":None
+             "CredentialId":null,
+             "S3ThumbBucket":null,
+             "Created":null,
+             "Password":null,
+             "UserName":null,
+             "Modified":null,
+             "FileName":null,
+             "DestinationName":null
           }
        ],
        "StatusStateId":5,
@@ -215,11 +221,11 @@ def finished_job_status_response():
              "TimeStarted":"/Date(1476880213000+0200)/",
              "Duration":"PT0S",
              "Progress":100,
-             "ErrorCode":None,
-             "Message":None,
-             "PresetName":None,
+             "ErrorCode":null,
+             "Message":null,
+             "PresetName":null,
              "TimeFinished":"/Date(1476880213000+0200)/",
-             "DestinationName":None
+             "DestinationName":null
           },
           {
              "RetryCount":0,
@@ -229,11 +235,11 @@ def finished_job_status_response():
              "TimeStarted":"/Date(1476880249000+0200)/",
              "Duration":"PT19S",
              "Progress":100,
-             "ErrorCode":None,
-             "Message":None,
+             "ErrorCode":null,
+             "Message":null,
              "PresetName":"YouTube_480p",
              "TimeFinished":"/Date(1476880268000+0200)/",
-             "DestinationName":None
+             "DestinationName":null
           },
           {
              "RetryCount":0,
@@ -243,43 +249,43 @@ def finished_job_status_response():
              "TimeStarted":"/Date(1476880268000+0200)/",
              "Duration":"PT1S",
              "Progress":100,
-             "ErrorCode":None,
-             "Message":None,
-             "PresetName":None,
+             "ErrorCode":null,
+             "Message":null,
+             "PresetName":null,
              "TimeFinished":"/Date(1476880269000+0200)/",
-             "DestinationName":None
+             "DestinationName":null
           }
        ],
        "StatusMessage":"",
        "Name":"CDS-1c7b1844-d820-4207-85ca-8ed54bc6805",
        "TimeFinishedIso8601":"2016-10-19T12:31:09.0000000Z",
        "SourceMedia":{
-          "S3BucketName":None,
+          "S3BucketName":null,
           "FileSize":-1,
-          "ModifiedIso8601":None,
-          "CredentialId":None,
+          "ModifiedIso8601":null,
+          "CredentialId":null,
           "WatermarkInfo":{
-             "WatermarkImageUserName":None,
-             "WatermarkImageCredentialId":None,
-             "WatermarkImagePassword":None,
-             "WatermarkImageUri":None
+             "WatermarkImageUserName":null,
+             "WatermarkImageCredentialId":null,
+             "WatermarkImagePassword":null,
+             "WatermarkImageUri":null
           },
           "FileUri":"file://cernbox-smb.cern.ch/eoscds/test/sorenson_input/1111-dddd-3333-aaaa/data.mp4",
           "CompressOrder":0,
-          "CreatedIso8601":None,
-          "JobSubmittedIso8601":None,
-          "Password":None,
+          "CreatedIso8601":null,
+          "JobSubmittedIso8601":null,
+          "Password":null,
           "Type":1,
-          "FileName":None,
-          "EncodeAllAudioTracks":False,
-          "AutoDeleteSource":False,
-          "IsWatchfolder":False,
-          "JobId":None,
-          "Modified":None,
-          "WatchFolderId":None,
+          "FileName":null,
+          "EncodeAllAudioTracks":false,
+          "AutoDeleteSource":false,
+          "IsWatchfolder":false,
+          "JobId":null,
+          "Modified":null,
+          "WatchFolderId":null,
           "UserName":"",
-          "Created":None,
-          "JobSubmitted":None,
+          "Created":null,
+          "JobSubmitted":null,
           "SourceId":"00000000-0000-0000-0000-000000000000"
        }
     }"""
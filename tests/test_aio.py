@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the asyncio API."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+import asyncio  # noqa: E402
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from cds_sorenson.aio import AsyncSorensonClient  # noqa: E402
+from cds_sorenson.error import InvalidAspectRatioError, \
+    SorensonError  # noqa: E402
+from cds_sorenson.ledger import JobLedger  # noqa: E402
+from cds_sorenson.signals import job_finished  # noqa: E402
+
+
+def _run(app, running_job_status_response, coro_factory):
+    """Run ``coro_factory(client)`` against a local fake Sorenson."""
+    calls = []
+
+    async def submit(request):
+        calls.append(('POST', await request.json()))
+        return web.Response(text='{"JobId":"1234-2345-abcd"}')
+
+    async def delete(request):
+        calls.append(('DELETE', request.match_info['job_id']))
+        if request.match_info['job_id'] == 'unknown':
+            return web.Response(status=404, text='Not Found')
+        return web.Response()
+
+    async def current(request):
+        if request.match_info['job_id'] == 'finished':
+            return web.Response(status=404)
+        return web.Response(text=running_job_status_response)
+
+    async def archive(request):
+        return web.Response(text='{"StatusStateId": 5}')
+
+    sorenson = web.Application()
+    sorenson.router.add_post('/api/jobs', submit)
+    sorenson.router.add_delete('/api/jobs/{job_id}', delete)
+    sorenson.router.add_get('/api/jobs/status/{job_id}', current)
+    sorenson.router.add_get('/api/jobs/archive/{job_id}', archive)
+
+    async def main():
+        async with TestServer(sorenson) as server:
+            base = str(server.make_url('/api/jobs'))
+            app.config.update(
+                CDS_SORENSON_SUBMIT_URL=base,
+                CDS_SORENSON_DELETE_URL=base + '/{job_id}',
+                CDS_SORENSON_CURRENT_JOBS_STATUS_URL=base + '/status/{job_id}',
+                CDS_SORENSON_ARCHIVE_JOBS_STATUS_URL=(
+                    base + '/archive/{job_id}'),
+            )
+            async with AsyncSorensonClient(app, limit=4) as client:
+                return await coro_factory(client)
+
+    return asyncio.run(main()), calls
+
+
+def test_start_and_stop_encoding(app, running_job_status_response):
+    """Test starting, stopping and restarting jobs asynchronously."""
+    async def scenario(client):
+        job_id = await client.start_encoding(
+            '/eos/workspace/c/cds/test/data.mp4', '/tmp/out.mp4', '360p',
+            '16:9')
+        await client.stop_encoding(job_id)
+        with pytest.raises(SorensonError):
+            await client.stop_encoding('unknown')
+        new_job_id = await client.restart_encoding(
+            'unknown', '/tmp/data.mp4', '/tmp/out.mp4', '360p', '16:9')
+        with pytest.raises(InvalidAspectRatioError):
+            await client.start_encoding('in', 'out', '360p', '15:3')
+        return job_id, new_job_id
+
+    (job_id, new_job_id), calls = _run(
+        app, running_job_status_response, scenario)
+    assert job_id == new_job_id == '1234-2345-abcd'
+    assert [call[0] for call in calls] == ['POST', 'DELETE', 'DELETE',
+                                           'DELETE', 'POST']
+    assert calls[0][1]['JobMediaInfo']['SourceMediaList'][0]['FileUri'] == \
+        'file://cernbox-smb.cern.ch/eoscds/test/data.mp4'
+
+
+def test_get_encoding_status(app, running_job_status_response):
+    """Test getting the status of many jobs concurrently."""
+    async def scenario(client):
+        return await asyncio.gather(*[
+            client.get_encoding_status(job_id)
+            for job_id in ['running'] * 20 + ['finished']
+        ])
+
+    statuses, _ = _run(app, running_job_status_response, scenario)
+    assert statuses[:-1] == [('Hold', 55.810001373291016)] * 20
+    assert statuses[-1] == ('Finished', 100)
+
+
+def test_submissions_are_recorded(app, running_job_status_response, tmpdir):
+    """Test that the asynchronous submissions go to the ledger too."""
+    app.config.update(
+        CDS_SORENSON_LEDGER=JobLedger,
+        CDS_SORENSON_LEDGER_OPTIONS={'path': str(tmpdir.join('jobs.db'))},
+    )
+    app.extensions['cds-sorenson'].init_app(app)
+
+    async def scenario(client):
+        return await client.start_encoding('/tmp/data.mp4', '/tmp/out.mp4',
+                                           '360p', '16:9')
+
+    job_id, _ = _run(app, running_job_status_response, scenario)
+    ledger = app.extensions['cds-sorenson'].ledger
+    [record] = ledger.get(job_id)
+    assert record['output_file'] == '/tmp/out.mp4'
+    ledger.close()
+
+
+def test_statuses_are_shared(app, running_job_status_response, tmpdir):
+    """Test that the asynchronous statuses go through the shared state."""
+    app.config.update(
+        CDS_SORENSON_RESULT_CACHE='cds_sorenson.cache.SQLiteResultCache',
+        CDS_SORENSON_RESULT_CACHE_OPTIONS={
+            'path': str(tmpdir.join('results.db'))},
+        CDS_SORENSON_CIRCUIT_BREAKER_STORAGE=(
+            'cds_sorenson.breaker.SQLiteBreakerStorage'),
+        CDS_SORENSON_CIRCUIT_BREAKER_STORAGE_OPTIONS={
+            'path': str(tmpdir.join('breakers.db'))},
+    )
+    ext = app.extensions['cds-sorenson']
+    ext.init_app(app)
+    finished = []
+
+    def on_finished(sender, job_id, **kwargs):
+        finished.append(job_id)
+
+    async def scenario(client):
+        return [await client.get_encoding_status('finished'),
+                await client.get_encoding_status('finished')]
+
+    with job_finished.connected_to(on_finished, sender=app):
+        statuses, _ = _run(app, running_job_status_response, scenario)
+    assert statuses == [('Finished', 100)] * 2
+    # The second status came from the cache
+    assert finished == ['finished']
+    assert ext.results.get('finished') == ('Finished', 100)
+    assert ext.job_locations.get('finished') == 'archive'
+    assert ext.transport.breaker('archive-status').state == 'closed'
@@ -27,17 +27,22 @@
 
 from __future__ import absolute_import, print_function
 
+import json
+
 import pytest
 from flask import Flask
 from mock import MagicMock, patch
 
 from cds_sorenson import CDSSorenson
 from cds_sorenson.api import get_available_aspect_ratios, \
-    get_available_preset_qualities, get_encoding_status, get_preset_id, \
-    get_preset_info, get_presets_by_aspect_ratio, restart_encoding, \
-    start_encoding, stop_encoding
+    get_available_preset_qualities, get_encoding_status, \
+    get_encoding_statuses, get_job_result, get_preset_id, get_preset_info, \
+    get_presets_by_aspect_ratio, get_presets_for_source, \
+    iter_encoding_statuses, restart_encoding, start_encoding, \
+    start_ladder_encoding, stop_encoding
 from cds_sorenson.error import InvalidAspectRatioError, \
     InvalidResolutionError, SorensonError
+from cds_sorenson.proxies import current_cds_sorenson
 
 
 class MockRequests(object):
@@ -57,6 +62,7 @@ class MockRequests(object):
 
         def __init__(self):
             self.status_code = 200
+            self.content = b''
 
     @classmethod
     def delete(cls, delete_url, headers, **kwargs):
@@ -87,7 +93,7 @@ def test_init():
     assert 'cds-sorenson' in app.extensions
 
 
-@patch('cds_sorenson.api.requests.post')
+@patch('requests.Session.post')
 def test_start_encoding(requests_post_mock, app, start_response):
     """Test if starting encoding works."""
     filename = 'file://cernbox-smb.cern.ch/eoscds/test/sorenson_input/' \
@@ -105,7 +111,37 @@ def test_start_encoding(requests_post_mock, app, start_response):
     assert job_id == "1234-2345-abcd"
 
 
-@patch('cds_sorenson.api.requests.get')
+@patch('requests.Session.post')
+def test_start_ladder_encoding(requests_post_mock, app, start_response):
+    """Test if encoding several qualities in one job works."""
+    sorenson_response = MagicMock()
+    sorenson_response.text = start_response
+    sorenson_response.status_code = 200
+    requests_post_mock.return_value = sorenson_response
+
+    job_id, outputs = start_ladder_encoding(
+        '/eos/workspace/c/cds/test/data.mp4',
+        '/eos/workspace/c/cds/test/data', ['360p', '720p'], '16:9')
+    assert job_id == "1234-2345-abcd"
+    assert list(outputs.items()) == [
+        ('/eos/workspace/c/cds/test/data-836-kbps-640x360-audio-64-kbps-'
+         'stereo.mp4', 'dc2187a3-8f64-4e73-b458-7370a88d92d7'),
+        ('/eos/workspace/c/cds/test/data-2672-kbps-1280x720-audio-128-kbps-'
+         'stereo.mp4', '79e9bde9-adcc-4603-b686-c7e2cb2d73d2'),
+    ]
+    assert requests_post_mock.call_count == 1
+    job = requests_post_mock.call_args[1]['json']['JobMediaInfo']
+    assert [preset['PresetId'] for preset in job['CompressionPresetList']] \
+        == list(outputs.values())
+    assert job['DestinationList'][0]['FileUri'] == \
+        'file://cernbox-smb.cern.ch/eoscds/test/data-836-kbps-640x360-' \
+        'audio-64-kbps-stereo.mp4'
+
+    with pytest.raises(InvalidResolutionError):
+        start_ladder_encoding('input', 'output', ['360p', '1024p'], '16:9')
+
+
+@patch('requests.Session.get')
 def test_encoding_status(requests_get_mock, app, running_job_status_response):
     """Test if getting encoding status works."""
     job_id = "1234-2345-abcd"
@@ -120,7 +156,103 @@ def test_encoding_status(requests_get_mock, app, running_job_status_response):
     assert encoding_status == ('Hold', 55.810001373291016)
 
 
-@patch('cds_sorenson.api.requests.delete')
+@patch('requests.Session.post')
+@patch('requests.Session.delete')
+@patch('requests.Session.get')
+def test_final_encoding_status_is_cached(requests_get_mock,
+                                         requests_delete_mock,
+                                         requests_post_mock, app,
+                                         start_response):
+    """Test that the final status of a job is only fetched once."""
+    sorenson_response = MagicMock()
+    sorenson_response.text = '{"StatusStateId": 5}'
+    sorenson_response.status_code = 200
+    requests_get_mock.return_value = sorenson_response
+
+    assert get_encoding_status('1234') == ('Finished', 100)
+    assert get_encoding_status('1234') == ('Finished', 100)
+    assert requests_get_mock.call_count == 1
+
+    # Restarting the job invalidates its status
+    requests_delete_mock.return_value = MagicMock(status_code=200)
+    requests_post_mock.return_value = MagicMock(status_code=200,
+                                                text=start_response)
+    restart_encoding('1234', 'input', 'output', '360p', '16:9')
+    assert get_encoding_status('1234') == ('Finished', 100)
+    assert requests_get_mock.call_count == 2
+
+
+@patch('requests.Session.get')
+def test_encoding_statuses(requests_get_mock, app,
+                           running_job_status_response):
+    """Test if getting the status of many jobs at once works."""
+    def get(url, **kwargs):
+        response = MagicMock()
+        if url.endswith('/broken'):
+            response.status_code = 500
+            response.text = 'Internal Server Error'
+        elif url.endswith('/malformed'):
+            response.status_code = 200
+            response.text = '{"StatusStateId": '
+        else:
+            response.status_code = 200
+            response.text = running_job_status_response
+        return response
+    requests_get_mock.side_effect = get
+    current_cds_sorenson.transport.retry_policy.sleep = lambda delay: None
+
+    job_ids = ['job-{0}'.format(i) for i in range(50)] + ['broken']
+    statuses = get_encoding_statuses(job_ids + ['job-0'], max_workers=8)
+    assert list(statuses.keys()) == job_ids
+    assert all(statuses[job_id] == ('Hold', 55.810001373291016)
+               for job_id in job_ids[:-1])
+    assert isinstance(statuses['broken'], SorensonError)
+    assert str(statuses['broken']) == '500: Internal Server Error'
+
+    # Any error of a job is returned along the other statuses
+    streamed = dict(iter_encoding_statuses(['job-1', 'malformed']))
+    assert streamed['job-1'] == ('Hold', 55.810001373291016)
+    assert isinstance(streamed['malformed'], ValueError)
+
+    streamed = dict(iter_encoding_statuses(['job-1', 'job-2']))
+    assert streamed == {'job-1': ('Hold', 55.810001373291016),
+                        'job-2': ('Hold', 55.810001373291016)}
+    assert list(iter_encoding_statuses([])) == []
+
+
+@patch('requests.Session.get')
+def test_job_result(requests_get_mock, app, running_job_status_response,
+                    finished_job_status_response):
+    """Test if the outputs of a finished job are kept."""
+    finished = []
+
+    def get(url, **kwargs):
+        if not finished:
+            return MagicMock(status_code=200,
+                             text=running_job_status_response)
+        if '/archive/' in url:
+            return MagicMock(status_code=200,
+                             text=finished_job_status_response)
+        return MagicMock(status_code=404, text='')
+    requests_get_mock.side_effect = get
+
+    job = get_job_result('1234-2345-abcd')
+    assert job.result == ('Hold', 55.810001373291016)
+    assert job.outputs == ()
+
+    finished.append(True)
+    job = get_job_result('1234-2345-abcd')
+    assert job.result == ('Finished', 100)
+    assert [output.file_size for output in job.outputs] == [16090019]
+    assert get_encoding_status('1234-2345-abcd') == ('Finished', 100)
+
+    # Answered without contacting Sorenson
+    requests_get_mock.reset_mock()
+    assert get_job_result('1234-2345-abcd') is job
+    assert not requests_get_mock.called
+
+
+@patch('requests.Session.delete')
 def test_stop_encoding(requests_delete_mock, app):
     """Test if stopping encoding works."""
     job_id = "1234-2345-abcd"
@@ -135,7 +267,7 @@ def test_stop_encoding(requests_delete_mock, app):
     assert returned_value is None
 
 
-@patch('cds_sorenson.api.requests', MockRequests)
+@patch('requests.Session.delete', MockRequests.delete)
 def test_stop_encoding_twice_fails(app):
     """Test if stopping the same job twice fails."""
     job_id = "1234-2345-abcd"
@@ -147,8 +279,8 @@ def test_stop_encoding_twice_fails(app):
         stop_encoding(job_id)
 
 
-@patch('cds_sorenson.api.requests.post')
-@patch('cds_sorenson.api.requests.delete')
+@patch('requests.Session.post')
+@patch('requests.Session.delete')
 def test_restart_encoding(requests_delete_mock, requests_post_mock, app,
                           start_response):
     """Test if restarting encoding works."""
@@ -221,6 +353,30 @@ def test_get_preset_id(app):
         get_preset_id('480p', '27:9')
     with pytest.raises(InvalidResolutionError):
         get_preset_id('480p', '20:9')
+    # Near-miss aspect ratios use the closest configured one
+    assert get_preset_id('360p', '1920:1088') == get_preset_id('360p', '16:9')
+    assert get_preset_id('360p', '1.33') == get_preset_id('360p', '4:3')
+    with pytest.raises(InvalidAspectRatioError):
+        get_preset_id('480p', '15:3')
+    app.config['CDS_SORENSON_ASPECT_RATIO_TOLERANCE'] = 0
+    app.extensions['cds-sorenson'].init_config(app)
+    with pytest.raises(InvalidAspectRatioError):
+        get_preset_id('360p', '1920:1088')
+
+
+def test_get_presets_for_source(app):
+    """Test the qualities chosen for the dimensions of a video."""
+    assert get_presets_for_source(1280, 720) == (
+        '16:9', ['240p', '360p', '480p', '720p'])
+    assert get_presets_for_source(1440, 1080)[0] == '4:3'
+    assert get_presets_for_source(2048, 1080)[0] == '256:135'
+    # Low frame rate videos still get every resolution
+    assert get_presets_for_source(1280, 720, frame_rate=15) == (
+        '16:9', ['240p', '360p', '480p', '720p'])
+    # Tiny videos still get the lowest quality
+    assert get_presets_for_source(160, 90) == ('16:9', ['240p'])
+    with pytest.raises(InvalidAspectRatioError):
+        get_presets_for_source(1080, 1920, tolerance=0.03)
 
 
 def test_get_preset_info(app):
@@ -232,3 +388,9 @@ def test_get_preset_info(app):
                 app.config['CDS_SORENSON_PRESETS'][aspect_ratio].keys():
             assert all([key in get_preset_info(aspect_ratio, preset_quality)
                         for key in info_keys])
+    # Callers get their own plain dictionary
+    info = get_preset_info('16:9', '360p')
+    assert isinstance(info, dict) and json.loads(json.dumps(info)) == info
+    info['width'] = 1
+    assert get_preset_info('16:9', '360p')['width'] == 640
+    assert get_preset_info('16:9', 'unknown') is None
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the pool of Sorenson servers."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from cds_sorenson.api import get_encoding_status, restart_encoding, \
+    start_encoding, stop_encoding
+from cds_sorenson.backends import LEAST_OUTSTANDING, WEIGHTED, Backend, \
+    BackendPool
+from cds_sorenson.error import SorensonTimeoutError, \
+    SorensonUnavailableError
+from cds_sorenson.proxies import current_cds_sorenson
+from cds_sorenson.retry import Deadline
+from cds_sorenson.testing import FakeSorenson, FakeSorensonServer, \
+    SimulatedClock
+
+
+def _pool(strategy, **weights):
+    return BackendPool(
+        [Backend(name, {}, weight=weight) for name, weight in weights.items()],
+        strategy=strategy, clock=lambda: 0)
+
+
+def test_routing_strategies():
+    """Test the round-robin, weighted and least-outstanding routing."""
+    pool = _pool('round-robin', a=1, b=1, c=1)
+    assert [pool.choose().name for _ in range(4)] == ['a', 'b', 'c', 'a']
+
+    pool = _pool(WEIGHTED, a=2, b=1)
+    names = [pool.choose().name for _ in range(6)]
+    assert names.count('a') == 4 and names.count('b') == 2
+
+    pool = _pool(LEAST_OUTSTANDING, a=1, b=1)
+    pool.submitted(pool.backends['a'], '1')
+    assert [pool.choose().name for _ in range(3)] == ['b'] * 3
+    pool.finished('a:1')
+    assert not pool.backends['a'].outstanding
+
+    # Failing servers are left out of the rotation
+    pool.mark_down(pool.backends['a'])
+    assert [pool.choose().name for _ in range(2)] == ['b'] * 2
+    pool.mark_down(pool.backends['b'])
+    with pytest.raises(SorensonUnavailableError):
+        pool.choose()
+
+    assert pool.resolve('b:1234') == (pool.backends['b'], '1234')
+    assert pool.resolve('1234') == (pool.default, '1234')
+    with pytest.raises(ValueError):
+        BackendPool(strategy='random')
+
+
+def test_outstanding_expire():
+    """Test that the jobs never seen finishing stop being counted."""
+    now = [0]
+    pool = BackendPool([Backend('a', {}), Backend('b', {})],
+                       strategy=LEAST_OUTSTANDING, outstanding_ttl=60,
+                       clock=lambda: now[0])
+    pool.submitted(pool.backends['a'], '1')
+    pool.submitted(pool.default, '2')
+    assert not pool.default.outstanding
+    now[0] = 30
+    pool.submitted(pool.backends['a'], '3')
+    assert [pool.choose().name for _ in range(2)] == ['b'] * 2
+    now[0] = 60
+    assert [pool.choose().name for _ in range(2)] == ['b'] * 2
+    assert list(pool.backends['a'].outstanding) == ['3']
+    now[0] = 90
+    assert sorted(pool.choose().name for _ in range(2)) == ['a', 'b']
+    assert not pool.backends['a'].outstanding
+
+
+def test_backends_from_config(app):
+    """Test that the URLs of each server follow the configured paths."""
+    app.config['CDS_SORENSON_BACKENDS'] = {
+        'sorenson02': {'url': 'https://sorenson02.cern.ch/', 'weight': 3,
+                       'delete_url': 'https://other/{job_id}'},
+    }
+    pool = BackendPool.from_config(app.config)
+    backend, job_id = pool.resolve('sorenson02:42')
+    assert backend.weight == 3
+    assert backend.url('submit') == 'https://sorenson02.cern.ch/api/jobs'
+    assert backend.url('archive-status', job_id) == \
+        'https://sorenson02.cern.ch/api/jobs/archive/42'
+    assert backend.url('delete', job_id) == 'https://other/42'
+    assert backend.endpoint('submit') == 'sorenson02:submit'
+
+
+def test_jobs_go_back_to_their_server(app):
+    """Test that the jobs are spread and then followed on each server."""
+    first = FakeSorenson(clock=SimulatedClock(speed=0))
+    second = FakeSorenson(clock=SimulatedClock(speed=0))
+    with FakeSorensonServer(first) as server1, \
+            FakeSorensonServer(second) as server2:
+        app.config['CDS_SORENSON_BACKENDS'] = {
+            'one': {'url': server1.url},
+            'two': {'url': server2.url, 'queue_id': 'queue-two'},
+        }
+        app.extensions['cds-sorenson'].init_app(app)
+
+        job_ids = [start_encoding('/tmp/a.mp4', '/tmp/a.mp4', '360p', '16:9')
+                   for _ in range(4)]
+        assert [job_id.split(':')[0] for job_id in job_ids] == \
+            ['one', 'two', 'one', 'two']
+        assert len(first._jobs) == len(second._jobs) == 2
+        assert all(job.payload['QueueId'] == 'queue-two'
+                   for job in second._jobs.values())
+
+        first.clock.advance(3600)
+        assert get_encoding_status(job_ids[0])[0] == 'Finished'
+        assert get_encoding_status(job_ids[1])[0] != 'Finished'
+        stop_encoding(job_ids[1])
+        assert get_encoding_status(job_ids[1]) == ('Canceled', 100)
+        restarted = restart_encoding(job_ids[3], '/tmp/a.mp4', '/tmp/a.mp4',
+                                     '360p', '16:9')
+        assert get_encoding_status(job_ids[3]) == ('Canceled', 100)
+        assert get_encoding_status(restarted)[0] is not None
+
+        # A server which doesn't answer is left out of the rotation
+        server2.stop()
+        # Forget the kept-alive connections, which outlive the server
+        current_cds_sorenson.transport.close()
+        backends = current_cds_sorenson.backends
+        assert backends.check_health(current_cds_sorenson.transport,
+                                     timeout=1) == {'one': True, 'two': False}
+        assert {start_encoding('/tmp/a.mp4', '/tmp/a.mp4', '360p', '16:9')
+                .split(':')[0] for _ in range(3)} == {'one'}
+
+
+def test_deadline_does_not_mark_down(app):
+    """Test that running out of time leaves the server in rotation."""
+    with FakeSorensonServer(FakeSorenson()) as server:
+        app.config['CDS_SORENSON_BACKENDS'] = {'one': {'url': server.url}}
+        app.extensions['cds-sorenson'].init_app(app)
+        with pytest.raises(SorensonTimeoutError):
+            start_encoding('/tmp/a.mp4', '/tmp/a.mp4', '360p', '16:9',
+                           deadline=Deadline(0))
+        assert current_cds_sorenson.backends.backends['one'].down_until == 0
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the circuit breakers."""
+
+from __future__ import absolute_import, print_function
+
+import os
+
+import pytest
+import requests
+from mock import MagicMock, patch
+
+from cds_sorenson.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, \
+    MemoryBreakerStorage, SQLiteBreakerStorage
+from cds_sorenson.error import SorensonClientError, \
+    SorensonConnectionError, SorensonServerError, SorensonTimeoutError, \
+    SorensonUnavailableError
+from cds_sorenson.retry import Deadline
+from cds_sorenson.transport import SorensonTransport
+
+
+def _fail():
+    """Fail like a broken server."""
+    raise SorensonServerError(500)
+
+
+def _not_found():
+    """Fail like a request for an unknown job."""
+    raise SorensonClientError(404)
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_circuit_breaker(backend, tmpdir):
+    """Test the transitions between the states of the breaker."""
+    now = [0]
+    if backend == 'memory':
+        storage = other_storage = MemoryBreakerStorage()
+    else:
+        path = os.path.join(str(tmpdir), 'breakers.db')
+        storage, other_storage = SQLiteBreakerStorage(path), \
+            SQLiteBreakerStorage(path)
+    breaker = CircuitBreaker('submit', storage, failure_threshold=2,
+                             recovery_timeout=10, clock=lambda: now[0])
+    # Another worker of the same host
+    other = CircuitBreaker('submit', other_storage, failure_threshold=2,
+                           recovery_timeout=10, clock=lambda: now[0])
+
+    with pytest.raises(SorensonServerError):
+        breaker.call(_fail)
+    assert breaker.state == CLOSED
+    # Errors which don't mean that the endpoint is down don't count
+    with pytest.raises(SorensonClientError):
+        breaker.call(_not_found)
+    with pytest.raises(SorensonServerError):
+        breaker.call(_fail)
+    assert breaker.state == other.state == OPEN
+
+    with pytest.raises(SorensonUnavailableError) as exc:
+        other.call(lambda: 'ok')
+    assert exc.value.retry_in == 10
+
+    # After the recovery timeout a single trial call goes through
+    now[0] = 10
+    breaker.before_call()
+    assert other.state == HALF_OPEN
+    with pytest.raises(SorensonUnavailableError):
+        other.before_call()
+    breaker.record_failure()
+    assert other.state == OPEN
+
+    now[0] = 20
+    assert other.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: 'ok') == 'ok'
+
+
+@patch('requests.Session.get')
+def test_transport_circuit_breaker(requests_get_mock):
+    """Test that the transport fails fast while an endpoint is down."""
+    transport = SorensonTransport(breaker_storage=MemoryBreakerStorage(),
+                                  breaker_threshold=2)
+    requests_get_mock.side_effect = requests.ConnectionError('refused')
+    for _ in range(2):
+        with pytest.raises(SorensonConnectionError):
+            transport.get('http://sorenson/status/1', endpoint='status')
+    with pytest.raises(SorensonUnavailableError):
+        transport.get('http://sorenson/status/1', endpoint='status')
+    assert requests_get_mock.call_count == 2
+    # Other endpoints are not affected
+    requests_get_mock.side_effect = None
+    requests_get_mock.return_value = MagicMock(status_code=200)
+    transport.get('http://sorenson/archive/1', endpoint='archive')
+    assert transport.breaker('archive').state == CLOSED
+
+
+@patch('requests.Session.get')
+def test_transport_deadline_does_not_open_breaker(requests_get_mock):
+    """Test that an expired deadline is not counted as a server failure."""
+    transport = SorensonTransport(breaker_storage=MemoryBreakerStorage(),
+                                  breaker_threshold=2)
+    for _ in range(4):
+        with pytest.raises(SorensonTimeoutError):
+            transport.get('http://sorenson/status/1', endpoint='status',
+                          deadline=Deadline(0))
+    assert requests_get_mock.call_count == 0
+    assert transport.breaker('status').storage.get('status') == \
+        (CLOSED, 0, None)
+
+
+def test_sqlite_breaker_storage_after_fork(tmpdir):
+    """Test that a forked process opens its own connection."""
+    storage = SQLiteBreakerStorage(os.path.join(str(tmpdir), 'breakers.db'))
+    # Nothing is opened before the first use
+    assert not hasattr(storage._local, 'conn')
+    storage.update('submit', lambda current: (OPEN, 2, 1))
+    parent = storage._connection
+    with patch('os.getpid', return_value=os.getpid() + 1):
+        assert storage._connection is not parent
+        assert storage.get('submit') == (OPEN, 2, 1)
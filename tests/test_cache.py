@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the caches."""
+
+from __future__ import absolute_import, print_function
+
+import os
+
+import pytest
+from mock import patch
+
+from cds_sorenson.cache import LRUCache, MemoryResultCache, \
+    SQLiteResultCache
+
+
+def test_lru_cache():
+    """Test eviction, expiration and statistics of the LRU cache."""
+    now = [0]
+    cache = LRUCache(2, ttl=10, clock=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # 'b' was the least recently used entry
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    now[0] = 10
+    assert cache.get('a', 'expired') == 'expired'
+    assert cache.pop('c') == 3
+    assert cache.stats == dict(hits=2, misses=2, evictions=1, size=0)
+
+    # Adding only stores keys which are missing or expired
+    assert cache.add('d', 4)
+    assert not cache.add('d', 5)
+    assert cache.get('d') == 4
+    now[0] = 20
+    assert cache.add('d', 6)
+    assert cache.get('d') == 6
+
+    disabled = LRUCache(0)
+    disabled.set('a', 1)
+    assert disabled.get('a') is None
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_result_cache(backend, tmpdir):
+    """Test the result cache backends."""
+    if backend == 'memory':
+        cache = MemoryResultCache(maxsize=2)
+    else:
+        path = os.path.join(str(tmpdir), 'results.db')
+        cache = SQLiteResultCache(path, maxsize=2)
+        # Another process sees the same statuses
+        other = SQLiteResultCache(path)
+    cache.set('a', ('Finished', 100))
+    assert cache.get('a') == ('Finished', 100)
+    assert cache.get('b') is None
+    if backend == 'sqlite':
+        assert other.get('a') == ('Finished', 100)
+    cache.delete('a')
+    assert cache.get('a') is None
+    cache.set('a', ('Error', 100))
+    cache.clear()
+    assert cache.get('a') is None
+
+
+def test_sqlite_result_cache_eviction(tmpdir):
+    """Test that the oldest statuses are evicted first."""
+    cache = SQLiteResultCache(os.path.join(str(tmpdir), 'results.db'),
+                              maxsize=10)
+    for i in range(SQLiteResultCache._TRIM_EVERY):
+        cache.set(str(i), ('Finished', 100))
+    assert cache.get('0') is None
+    assert cache.get(str(SQLiteResultCache._TRIM_EVERY - 1)) == \
+        ('Finished', 100)
+
+
+def test_sqlite_result_cache_after_fork(tmpdir):
+    """Test that a forked process opens its own connection."""
+    cache = SQLiteResultCache(os.path.join(str(tmpdir), 'results.db'))
+    # Nothing is opened before the first use
+    assert not hasattr(cache._local, 'conn')
+    cache.set('1', ('Finished', 100.0))
+    parent = cache._connection
+    with patch('os.getpid', return_value=os.getpid() + 1):
+        assert cache._connection is not parent
+        assert cache.get('1') == ('Finished', 100.0)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the client and its settings."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+
+import pytest
+from mock import MagicMock, patch
+
+from cds_sorenson.settings import SorensonSettings, UrlTemplate
+
+
+def test_url_template():
+    """Test the formatting of the split URL templates."""
+    template = UrlTemplate('http://sorenson/api/jobs/{job_id}/status')
+    assert template.format(job_id='1234') == \
+        'http://sorenson/api/jobs/1234/status'
+    assert template == 'http://sorenson/api/jobs/{job_id}/status'
+    assert UrlTemplate('http://sorenson/api/jobs').format() == \
+        'http://sorenson/api/jobs'
+    # Any job ID is formatted, in every placeholder
+    assert UrlTemplate('http://sorenson/{job_id}?id={job_id}').format(
+        job_id=42) == 'http://sorenson/42?id=42'
+
+
+def test_settings(app):
+    """Test the snapshot of the configuration."""
+    settings = app.extensions['cds-sorenson'].settings
+    assert settings.default_queue == app.config['CDS_SORENSON_DEFAULT_QUEUE']
+    assert settings.urls['delete'].format(job_id='1') == \
+        app.config['CDS_SORENSON_DELETE_URL'].format(job_id='1')
+    assert 'Finished' in settings.final_statuses
+    assert settings.name_generator('a', settings.presets.get(
+        '16:9', '360p')).startswith('a-')
+    with pytest.raises(AttributeError):
+        settings.default_queue = 'other'
+    with pytest.raises(AttributeError):
+        del settings.default_queue
+
+    # Changes of the configuration are only seen after a reload
+    app.config['CDS_SORENSON_DEFAULT_QUEUE'] = 'other'
+    assert app.extensions['cds-sorenson'].settings.default_queue != 'other'
+    app.extensions['cds-sorenson'].init_config(app)
+    assert app.extensions['cds-sorenson'].settings.default_queue == 'other'
+    assert SorensonSettings(app.config).default_queue == 'other'
+
+
+@patch('requests.Session.post')
+@patch('requests.Session.get')
+def test_client_without_app_context(requests_get_mock, requests_post_mock,
+                                    app, start_response,
+                                    running_job_status_response):
+    """Test that the client works from a thread without an app context."""
+    requests_post_mock.return_value = MagicMock(text=start_response,
+                                                status_code=200)
+    requests_get_mock.return_value = MagicMock(
+        text=running_job_status_response, status_code=200)
+    client = app.extensions['cds-sorenson'].client
+    results = []
+
+    def work():
+        job_id = client.start_encoding(
+            '/eos/workspace/c/cds/test/data.mp4',
+            '/eos/workspace/c/cds/test/data-360p.mp4', '360p', '16:9')
+        results.append(client.get_encoding_status(job_id))
+        results.append(client.get_encoding_statuses([job_id, 'other']))
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join(5)
+    assert results[0] == ('Hold', 55.810001373291016)
+    assert list(results[1].values()) == [results[0]] * 2
+    job = requests_post_mock.call_args[1]['json']
+    assert job['JobMediaInfo']['SourceMediaList'][0]['FileUri'] == \
+        'file://cernbox-smb.cern.ch/eoscds/test/data.mp4'
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the encoding time estimates."""
+
+from __future__ import absolute_import, print_function
+
+import json
+import time
+
+import pytest
+
+from cds_sorenson.estimator import EncodingEstimator, parse_iso8601
+
+
+class Clock(object):
+    """Manual clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def iso(seconds):
+    """Format a POSIX timestamp like Sorenson."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S.0000000Z', time.gmtime(seconds))
+
+
+def running(progress, started=None, size=10 ** 8, status=3):
+    """Return the status of a running job."""
+    return json.dumps({
+        'Status': {'Progress': progress, 'Status': status,
+                   'TimeStartedIso8601': started},
+        'TimeSubmittedIso8601': '2016-08-19T12:33:08.0000000Z',
+        'TotalSourceSize': size,
+    })
+
+
+def finished(started, ended, state=5, presets=()):
+    """Return the status of an archived job."""
+    return json.dumps({
+        'StatusStateId': state,
+        'TimeSubmittedIso8601': '2016-08-19T12:33:08.0000000Z',
+        'TimeStartedIso8601': started,
+        'TimeFinishedIso8601': ended,
+        'CompressionPresetList': [{'PresetId': preset} for preset in presets],
+    })
+
+
+def test_parse_iso8601():
+    """Test parsing the dates of Sorenson."""
+    assert parse_iso8601('1970-01-01T00:01:40.5000000Z') == 100.5
+    assert parse_iso8601('1970-01-01T00:01:40Z') == 100
+    assert parse_iso8601(None) is None
+    assert parse_iso8601('yesterday') is None
+
+
+def test_fit_throughput():
+    """Test fitting the encoding time of a preset."""
+    estimator = EncodingEstimator(window=3)
+    assert estimator.estimate_cost(10 ** 8, 'p1') is None
+    assert estimator.throughput('p1') is None
+
+    # 10 seconds of setup plus 1 second per MB
+    for job_id, size in (('a', 10 ** 7), ('b', 10 ** 8), ('c', 10 ** 9)):
+        estimator.job_submitted(job_id, ['p1'])
+        estimator.observe(job_id, running(0, size=size))
+        estimator.observe(job_id, finished(iso(0), iso(10 + size // 10 ** 6)))
+    assert estimator.throughput('p1') == pytest.approx(10 ** 6)
+    assert estimator.estimate_cost(5 * 10 ** 8, 'p1') == pytest.approx(510)
+    assert estimator.estimate_cost(5 * 10 ** 8, ['p1']) == pytest.approx(510)
+
+    # Only the last samples are kept
+    estimator.observe('d', running(0, size=10 ** 8))
+    estimator.observe('d', finished(iso(0), iso(5), presets=['p1']))
+    assert len(estimator._durations['p1']) == 3
+
+    # Failed jobs and jobs never seen running are not sampled
+    estimator.observe('e', running(0, size=10 ** 8))
+    estimator.observe('e', finished(iso(0), iso(1), state=6, presets=['p2']))
+    estimator.observe('f', finished(iso(0), iso(1), presets=['p2']))
+    assert estimator.estimate_cost(10 ** 8, 'p2') is None
+
+
+def test_estimate_completion():
+    """Test the completion time of waiting and running jobs."""
+    clock = Clock()
+    estimator = EncodingEstimator(clock=clock)
+    assert estimator.estimate_completion('unknown') is None
+
+    estimator.job_submitted('a', ['p1', 'p2'], server='s1')
+    estimator.observe('a', running(0))
+    # Nothing known of the ladder yet
+    assert estimator.estimate_completion('a') is None
+
+    clock.now += 10
+    estimator.observe('a', running(10, started='2016-08-19T12:34:08Z'))
+    assert estimator.queue_wait('s1') == 60
+    assert estimator.queue_wait() is None
+    clock.now += 10
+    estimator.observe('a', running(30, started='2016-08-19T12:34:08Z'))
+    # 2% per second from its own progress
+    assert estimator.estimate_completion('a') == clock.now + 35
+    estimator.observe('a', finished('2016-08-19T12:34:08Z',
+                                    '2016-08-19T12:35:48Z'))
+    assert estimator.estimate_completion('a') == clock.now
+    assert estimator.estimate_cost(10 ** 8, ['p2', 'p1']) == 100
+
+    # Next jobs of the same presets use the fit
+    estimator.job_submitted('b', ['p1', 'p2'], server='s1')
+    estimator.observe('b', running(0))
+    assert estimator.estimate_completion('b') == clock.now + 60 + 100
+    estimator.observe('b', running(25, started='2016-08-19T12:34:08Z'))
+    assert estimator.estimate_completion('b') == clock.now + 75
+
+    # The progress of the other stages is not the one of the job
+    estimator.observe('b', running(50, started='2016-08-19T12:34:08Z',
+                                   status=2))
+    assert estimator.estimate_completion('b') == clock.now + 100
+    estimator.observe('b', running(10, started='2016-08-19T12:34:08Z',
+                                   status=4))
+    assert estimator.estimate_completion('b') == clock.now
+    clock.now += 10
+    estimator.observe('b', running(60, started='2016-08-19T12:34:08Z',
+                                   status=4))
+    assert estimator.estimate_completion('b') == clock.now + 8
+
+    # Canceled jobs are forgotten
+    estimator.observe('b', '')
+    assert estimator.estimate_completion('b') is None
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the API against the fake Sorenson server."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+
+import pytest
+
+from cds_sorenson.api import get_encoding_status, get_encoding_statuses, \
+    get_preset_id, restart_encoding, restart_encoding_concurrently, \
+    start_encoding, stop_encoding
+from cds_sorenson.error import SorensonServerError, SorensonTimeoutError
+from cds_sorenson.estimator import EncodingEstimator
+from cds_sorenson.proxies import current_cds_sorenson
+from cds_sorenson.testing import FakeSorenson, FakeSorensonServer, \
+    SimulatedClock
+from cds_sorenson.utils import idempotency_key
+
+
+@pytest.yield_fixture()
+def sorenson(app):
+    """Fake Sorenson server with a manual clock."""
+    fake = FakeSorenson(capacity=1, queue_capacity=3,
+                        clock=SimulatedClock(speed=0))
+    with FakeSorensonServer(fake) as server:
+        app.config.update(server.config)
+        app.extensions['cds-sorenson'].init_config(app)
+        yield fake
+
+
+def test_job_lifecycle(app, sorenson):
+    """Test that jobs go through all the statuses."""
+    first = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    second = start_encoding('/tmp/b.mp4', '/tmp/b-360p.mp4', '360p', '16:9')
+    assert get_encoding_status(first) == ('Downloading', 0)
+    assert get_encoding_status(second) == ('Waiting', 0)
+
+    sorenson.clock.advance(25)
+    assert get_encoding_status(first) == ('Transcoding', 50)
+    sorenson.clock.advance(30)
+    assert get_encoding_statuses([first, second]) == {
+        first: ('Finished', 100),
+        second: ('Transcoding', 0),
+    }
+
+    third = restart_encoding(second, '/tmp/b.mp4', '/tmp/b-360p.mp4',
+                             '360p', '16:9')
+    assert get_encoding_status(second) == ('Canceled', 100)
+    assert get_encoding_status(third) == ('Downloading', 0)
+    stop_encoding(third)
+
+    # Connections are reused between calls
+    stats = current_cds_sorenson.transport.stats
+    assert stats.connections < stats.requests
+
+
+def test_server_errors(app, sorenson):
+    """Test the injected errors and the queue capacity."""
+    current_cds_sorenson.transport.retry_policy.sleep = lambda delay: None
+    for i in range(3):
+        start_encoding('/tmp/a.mp4', '/tmp/a.mp4', '360p', '16:9')
+    with pytest.raises(SorensonServerError) as exc:
+        start_encoding('/tmp/a.mp4', '/tmp/a.mp4', '360p', '16:9')
+    assert exc.value.status_code == 503
+
+    sorenson.error_rate = 1
+    with pytest.raises(SorensonServerError):
+        get_encoding_status('unknown')
+    assert current_cds_sorenson.transport.retry_policy.stats['retries'] == 2
+
+
+def test_concurrent_restart(app, sorenson):
+    """Test that retrying a concurrent restart doesn't duplicate the job."""
+    old = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    result = restart_encoding_concurrently(
+        old, '/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    assert result.stopped and result.resubmitted and result.job_id != old
+    assert get_encoding_status(old) == ('Canceled', 100)
+
+    # The same restart again gives the same job, even if the old job is gone
+    retried = restart_encoding_concurrently(
+        old, '/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    assert retried.job_id == result.job_id
+    assert not retried.resubmitted
+    assert not retried.stopped and retried.stop_error is not None
+
+    # Restarting the new job submits another one
+    assert restart_encoding(result.job_id, '/tmp/a.mp4', '/tmp/a-360p.mp4',
+                            '360p', '16:9', concurrent=True) != result.job_id
+
+    # A fresh job for the same files is restarted too
+    fresh = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    restarted = restart_encoding_concurrently(
+        fresh, '/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    assert restarted.resubmitted
+    assert restarted.job_id not in (fresh, result.job_id)
+
+
+def test_concurrent_restart_in_progress(app, sorenson):
+    """Test that a restart waits for the same restart in another worker."""
+    old = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    key = idempotency_key(
+        '/tmp/a.mp4', '/tmp/a-360p.mp4', get_preset_id('360p', '16:9'), old)
+    submissions = current_cds_sorenson.submissions
+    assert submissions.add(key, '#pending:{0!r}'.format(time.time()))
+    # The other worker submits its job in the meantime
+    timer = threading.Timer(0.1, submissions.set, (key, 'other-job'))
+    timer.start()
+    result = restart_encoding_concurrently(
+        old, '/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    timer.join()
+    assert result.job_id == 'other-job' and not result.resubmitted
+
+
+def test_concurrent_restart_abandoned(app, sorenson):
+    """Test that a restart doesn't wait forever for a dead worker."""
+    app.config['CDS_SORENSON_RESTART_DEADLINE'] = None
+    app.extensions['cds-sorenson'].init_config(app)
+    old = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    key = idempotency_key(
+        '/tmp/a.mp4', '/tmp/a-360p.mp4', get_preset_id('360p', '16:9'), old)
+    submissions = current_cds_sorenson.submissions
+    submissions.set(key, '#pending:{0!r}'.format(time.time() - 3600))
+    with pytest.raises(SorensonTimeoutError):
+        restart_encoding_concurrently(
+            old, '/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    # The abandoned claim is released, so the restart can be retried
+    assert restart_encoding_concurrently(
+        old, '/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9').resubmitted
+
+
+def test_estimates(app, sorenson):
+    """Test that the statuses feed the estimator."""
+    estimator = current_cds_sorenson.estimator = EncodingEstimator(
+        clock=sorenson.clock)
+    preset_id = get_preset_id('360p', '16:9')
+    first = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    second = start_encoding('/tmp/b.mp4', '/tmp/b-360p.mp4', '360p', '16:9')
+    get_encoding_status(first)
+    get_encoding_status(second)
+    assert estimator.estimate_completion(second) is None
+
+    sorenson.clock.advance(50)
+    assert get_encoding_status(first) == ('Finished', 100)
+    assert get_encoding_status(second) == ('Downloading', 0)
+    assert estimator.throughput(preset_id) == sorenson.source_size / 50.0
+    assert estimator.estimate_cost(sorenson.source_size, preset_id) == 50
+    assert estimator.queue_wait() == 25
+    assert estimator.estimate_completion(second) == 100
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the local ledger of the submitted jobs."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import subprocess
+import sys
+
+import pytest
+from mock import patch
+
+from cds_sorenson.api import get_encoding_status, start_encoding, \
+    start_ladder_encoding
+from cds_sorenson.ledger import JobLedger, reconcile
+from cds_sorenson.poller import StatusPoller
+from cds_sorenson.proxies import current_cds_sorenson
+from cds_sorenson.testing import FakeSorenson, FakeSorensonServer, \
+    SimulatedClock
+
+
+@pytest.yield_fixture()
+def sorenson(app, tmpdir):
+    """Fake Sorenson server and an application with a ledger."""
+    app.config.update(
+        CDS_SORENSON_LEDGER=JobLedger,
+        CDS_SORENSON_LEDGER_OPTIONS={'path': str(tmpdir.join('jobs.db'))},
+    )
+    app.extensions['cds-sorenson'].init_app(app)
+    fake = FakeSorenson(clock=SimulatedClock(speed=0))
+    with FakeSorensonServer(fake) as server:
+        app.config.update(server.config)
+        app.extensions['cds-sorenson'].init_config(app)
+        yield fake
+    current_cds_sorenson.ledger.close()
+
+
+def test_ledger(tmpdir):
+    """Test the batched writes and the queries."""
+    ledger = JobLedger(str(tmpdir.join('jobs.db')), batch_size=2)
+    ledger.record_submission('1', 'in.mp4', 'out-360p.mp4', 'p1')
+    ledger.record_submission('2', 'in.mp4', 'out-360p.mp4', 'p1')
+    ledger.record_submission('3', 'in.mp4', 'out-720p.mp4', 'p2')
+    ledger.record_status('3', 'Finished', 100)
+
+    [record] = ledger.get('3')
+    assert record['output_file'] == 'out-720p.mp4'
+    assert record['status'] == 'Finished' and record['updated_at']
+    final = ('Finished', 'Canceled')
+    assert [r['job_id'] for r in ledger.unfinished(final)] == ['1', '2']
+    assert ledger.duplicates(final) == {
+        ('in.mp4', 'out-360p.mp4', 'p1'): ['1', '2']}
+    ledger.close()
+
+    # The records survive the process
+    ledger = JobLedger(str(tmpdir.join('jobs.db')))
+    assert len(ledger.unfinished(final)) == 2
+
+
+def test_ledger_after_fork(tmpdir):
+    """Test that a forked process opens its own connection."""
+    ledger = JobLedger(str(tmpdir.join('jobs.db')))
+    # Nothing is opened before the first use
+    assert not hasattr(ledger._local, 'conn')
+    ledger.record_submission('1', 'in.mp4', 'out-360p.mp4', 'p1')
+    ledger.flush()
+    parent = ledger._connection
+    with patch('os.getpid', return_value=os.getpid() + 1):
+        assert ledger._connection is not parent
+        assert [r['job_id'] for r in ledger.get('1')] == ['1']
+        assert len(ledger.unfinished(('Finished', ))) == 1
+    ledger.close()
+
+
+def test_ledger_flushed_at_exit(tmpdir):
+    """Test that the queued writes are not lost when the process exits."""
+    path = str(tmpdir.join('jobs.db'))
+    subprocess.check_call([sys.executable, '-c', (
+        'from cds_sorenson.ledger import JobLedger\n'
+        'ledger = JobLedger({0!r}, flush_interval=60)\n'
+        'ledger.record_submission("1", "in.mp4", "out.mp4", "p1")\n'
+    ).format(path)])
+    assert [r['job_id'] for r in JobLedger(path).get('1')] == ['1']
+
+
+def test_reconcile(app, sorenson):
+    """Test that the unfinished jobs are found again after a crash."""
+    ledger = current_cds_sorenson.ledger
+    first = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    second = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    ladder, outputs = start_ladder_encoding(
+        '/tmp/b.mp4', '/tmp/b.mp4', ['360p', '720p'], '16:9')
+    assert len(ledger.get(ladder)) == 2
+    ledger.record_submission('lost', '/tmp/c.mp4', '/tmp/c.mp4', 'p1')
+    sorenson.clock.advance(3600)
+    assert get_encoding_status(ladder)[0] == 'Finished'
+    assert ledger.get(ladder)[0]['status'] == 'Finished'
+    third = start_encoding('/tmp/d.mp4', '/tmp/d-360p.mp4', '360p', '16:9')
+
+    poller = StatusPoller(app)
+    report = reconcile(poller=poller)
+    assert report.active == [third]
+    assert sorted(report.finished) == sorted([first, second])
+    assert report.orphaned == ['lost']
+    assert third in poller
+    # Both jobs are finished now, so they are not duplicates anymore
+    assert report.duplicates == {}
+    assert reconcile(refresh=False).active == [third]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the metrics of the calls to Sorenson."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from cds_sorenson.api import get_encoding_status, start_encoding
+from cds_sorenson.metrics import InMemoryMetrics, prometheus_text
+from cds_sorenson.proxies import current_cds_sorenson
+from cds_sorenson.testing import FakeSorenson, FakeSorensonServer, \
+    SimulatedClock
+
+
+@pytest.yield_fixture()
+def sorenson(app):
+    """Fake Sorenson server with a manual clock."""
+    fake = FakeSorenson(clock=SimulatedClock(speed=0))
+    with FakeSorensonServer(fake) as server:
+        app.config.update(server.config)
+        app.extensions['cds-sorenson'].init_config(app)
+        yield fake
+
+
+def test_in_memory_metrics():
+    """Test the counters, the histograms and the Prometheus output."""
+    metrics = InMemoryMetrics(buckets=(0.1, 1))
+    metrics.observe_request('submit', 200, 0.05, 10)
+    metrics.observe_request('submit', 200, 0.5, 20)
+    metrics.observe_request('submit', 'timeout', 5, 0)
+    metrics.inc('sorenson_retries_total', endpoint='submit')
+
+    assert metrics.get('sorenson_requests_total',
+                       endpoint='submit', status='200') == 2
+    assert metrics.get('sorenson_received_bytes_total',
+                       endpoint='submit') == 30
+    assert metrics.get('sorenson_retries_total', endpoint='submit') == 1
+    assert metrics.histograms['submit'] == pytest.approx([1, 1, 1, 5.55])
+
+    text = prometheus_text(metrics)
+    assert '# TYPE sorenson_request_duration_seconds histogram\n' in text
+    assert ('sorenson_requests_total{endpoint="submit",status="timeout"} 1\n'
+            in text)
+    assert ('sorenson_request_duration_seconds_bucket'
+            '{endpoint="submit",le="1.0"} 2\n' in text)
+    assert ('sorenson_request_duration_seconds_bucket'
+            '{endpoint="submit",le="+Inf"} 3\n' in text)
+    assert ('sorenson_request_duration_seconds_count'
+            '{endpoint="submit"} 3\n' in text)
+
+
+def test_calls_are_measured(app, sorenson):
+    """Test that the extension measures every call to Sorenson."""
+    metrics = current_cds_sorenson.metrics
+    job_id = start_encoding('/tmp/a.mp4', '/tmp/a-360p.mp4', '360p', '16:9')
+    sorenson.clock.advance(3600)
+    assert get_encoding_status(job_id)[0] == 'Finished'
+
+    assert metrics.get('sorenson_requests_total',
+                       endpoint='submit', status='200') == 1
+    assert metrics.get('sorenson_archive_fallbacks_total') == 1
+    assert metrics.get('sorenson_requests_total',
+                       endpoint='archive-status', status='200') == 1
+    assert metrics.get('sorenson_received_bytes_total',
+                       endpoint='archive-status') > 0
+    assert sum(metrics.histograms['current-status'][:-1]) == 1
+
+
+def test_metrics_disabled(app):
+    """Test that the metrics can be disabled."""
+    app.config['CDS_SORENSON_METRICS_SINK'] = None
+    app.extensions['cds-sorenson'].init_app(app)
+    assert not isinstance(current_cds_sorenson.metrics, InMemoryMetrics)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the parsing of the job statuses."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from cds_sorenson.error import SorensonError
+from cds_sorenson.parsers import parse_job_status
+
+
+def test_parse_running_status(app, running_job_status_response):
+    """Test parsing the status of a running job."""
+    job = parse_job_status('1', running_job_status_response,
+                           app.config['CDS_SORENSON_STATUSES'])
+    assert job.result == ('Hold', 55.810001373291016)
+    assert job.state == 9
+    assert job.outputs == ()
+
+
+def test_parse_finished_status(app, finished_job_status_response):
+    """Test parsing the outputs of an archived job."""
+    job = parse_job_status('1', finished_job_status_response,
+                           app.config['CDS_SORENSON_STATUSES'])
+    assert job.result == ('Finished', 100)
+    output, = job.outputs
+    assert output.file_uri == \
+        'file://cernbox-smb.cern.ch/eoscds/test/sorenson_output/' \
+        '1111-dddd-3333-aaaa/data-3c826c49-3d89-44e9-ac71-e9f02d5702ec-' \
+        'YouTube_480p.mp4'
+    assert output.file_type == 'VideoOutput'
+    assert output.file_size == 16090019
+    assert output.duration == 60.095
+    assert (output.width, output.height) == (640, 360)
+    assert output.frame_rate == 23.976
+    assert output.video_bitrate == 2000000
+    assert output.audio_bitrate == 192000
+    with pytest.raises(AttributeError):
+        output.extra = True
+
+
+def test_parse_other_statuses(app):
+    """Test parsing canceled and invalid statuses."""
+    statuses = app.config['CDS_SORENSON_STATUSES']
+    assert parse_job_status('1', '', statuses).result == ('Canceled', 100)
+    with pytest.raises(SorensonError):
+        parse_job_status('1', '{"JobId": "1"}', statuses)
+    with pytest.raises(ValueError):
+        parse_job_status('1', '{"JobId": ', statuses)
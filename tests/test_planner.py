@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the planning of quality ladders."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from cds_sorenson.error import InvalidAspectRatioError
+from cds_sorenson.planner import BITRATE, DUPLICATE, FRAME_RATE, UPSCALE, \
+    plan_ladder
+
+
+def test_full_ladder(app):
+    """Test that a high quality video gets every quality."""
+    plan = plan_ladder(1920, 1080, bitrate=8000000, frame_rate=25,
+                       duration=60)
+    assert plan.aspect_ratio == '16:9'
+    assert plan.qualities == ['240p', '360p', '480p', '720p', '1080p']
+    assert not plan.skipped
+    assert plan.output_bytes == 60 * (450 + 900 + 1500 + 2800 + 6000) * 125
+    assert plan.encoding_seconds > 0
+
+
+def test_skipped_qualities(app):
+    """Test that the upscaling and redundant qualities are left out."""
+    plan = plan_ladder(854, 480, bitrate=1000000, frame_rate=25)
+    assert plan.qualities == ['240p', '360p']
+    assert plan.skipped == {'480p': BITRATE, '720p': UPSCALE,
+                            '1080p': UPSCALE}
+    assert plan.encoding_seconds is None
+
+    # Screen recordings at a low frame rate still get every resolution
+    plan = plan_ladder(1280, 720, frame_rate=15)
+    assert plan.qualities == ['240p', '360p', '480p', '720p']
+    assert set(plan.notes.values()) == {FRAME_RATE}
+    assert not plan_ladder(1280, 720, frame_rate=25).notes
+
+    app.config['CDS_SORENSON_LADDER_MIN_BITRATE_STEP'] = 2.5
+    app.extensions['cds-sorenson'].init_config(app)
+    plan = plan_ladder(1920, 1080)
+    assert plan.qualities == ['240p', '480p', '1080p']
+    assert plan.skipped == {'720p': DUPLICATE, '360p': DUPLICATE}
+
+
+def test_tiny_and_odd_videos(app):
+    """Test that every video gets at least one quality."""
+    assert plan_ladder(160, 90).qualities == ['240p']
+    assert plan_ladder(1920, 1088).aspect_ratio == '16:9'
+    assert plan_ladder(1280, 720, display_aspect_ratio='4:3').aspect_ratio \
+        == '4:3'
+    with pytest.raises(InvalidAspectRatioError):
+        plan_ladder(1280, 720, display_aspect_ratio='27:9')
+
+
+def test_lowest_quality_kept(app):
+    """Test that the lowest quality is never left out as a duplicate."""
+    app.config['CDS_SORENSON_LADDER_MIN_BITRATE_STEP'] = 4
+    app.extensions['cds-sorenson'].init_config(app)
+    plan = plan_ladder(854, 480)
+    assert plan.qualities == ['240p', '480p']
+    assert plan.skipped == {'360p': DUPLICATE, '720p': UPSCALE,
+                            '1080p': UPSCALE}
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the adaptive status poller."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+
+from cds_sorenson.error import SorensonError
+from cds_sorenson.poller import StatusPoller
+from cds_sorenson.signals import job_finished
+
+
+class FakeClock(object):
+    """Clock moving only when told to."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.now = 0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+
+def test_poller_intervals(app):
+    """Test that each job is polled at its own pace."""
+    clock = FakeClock()
+    statuses = {
+        'queued': ('Waiting', 0),
+        'running': ('Transcoding', 10),
+        'failing': SorensonError('500: oops'),
+    }
+    fetched, changes, finished, errors = [], [], [], []
+
+    def fetch(job_ids, max_workers=None):
+        fetched.extend(job_ids)
+        return dict((job_id, statuses[job_id]) for job_id in job_ids)
+
+    poller = StatusPoller(
+        app, fetch=fetch, clock=clock,
+        on_change=lambda *args: changes.append(args),
+        on_finish=lambda *args: finished.append(args),
+        on_error=lambda *args: errors.append(args))
+    for job_id in statuses:
+        poller.track(job_id)
+    assert len(poller) == 3
+
+    assert poller.poll() == 10
+    assert sorted(fetched) == ['failing', 'queued', 'running']
+    assert sorted(changes) == [('queued', 'Waiting', 0),
+                               ('running', 'Transcoding', 10)]
+    assert errors == [('failing', statuses['failing'])]
+
+    # The running job is almost done, so it is checked sooner
+    del fetched[:]
+    clock.now = 30
+    statuses['running'] = ('Transcoding', 90)
+    assert poller.poll() == 5
+    assert sorted(fetched) == ['failing', 'running']
+    assert poller._jobs['running'].next_at == 35
+
+    # Finished jobs are not polled anymore
+    clock.now = 35
+    statuses['running'] = ('Finished', 100)
+    poller.poll()
+    assert finished == [('running', 'Finished')]
+    assert 'running' not in poller
+
+    # Jobs that don't move or keep failing are checked less and less often
+    del fetched[:]
+    clock.now = 120
+    assert poller.poll() == 40
+    assert sorted(fetched) == ['failing', 'queued']
+    assert poller._jobs['queued'].next_at == 120 + 240
+
+    poller.untrack('queued')
+    poller.untrack('failing')
+    assert poller.next_poll_in() is None
+
+
+def test_poller_run(app):
+    """Test the polling loop."""
+    poller = StatusPoller(
+        app, fetch=lambda job_ids, max_workers=None: dict(
+            (job_id, ('Finished', 100)) for job_id in job_ids))
+    poller.track('1')
+    poller.track('2')
+    poller.run(until_empty=True)
+    assert len(poller) == 0
+
+    thread = threading.Thread(target=poller.run)
+    thread.start()
+    poller.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_poller_notifications(app):
+    """Test that notified jobs are polled only as a fallback."""
+    clock = FakeClock()
+    finished = []
+    app.config['CDS_SORENSON_NOTIFICATION_URL'] = 'http://cds/notifications'
+    app.extensions['cds-sorenson'].init_config(app)
+    poller = StatusPoller(
+        app, clock=clock, on_finish=lambda *args: finished.append(args),
+        fetch=lambda job_ids, max_workers=None: dict(
+            (job_id, ('Transcoding', 10)) for job_id in job_ids))
+    poller.track('1')
+    # Without a token no notification is requested, so polling goes on
+    assert poller.poll() < 900
+    poller.untrack('1')
+
+    app.config['CDS_SORENSON_NOTIFICATION_TOKEN'] = 'secret'
+    app.extensions['cds-sorenson'].init_config(app)
+    poller.track('1')
+    poller.track('2')
+    assert poller.poll() == 900
+
+    job_finished.send(app, job_id='1', status='Finished', progress=100)
+    assert finished == [('1', 'Finished')]
+    assert '1' not in poller and '2' in poller
+    job_finished.send(app, job_id='1', status='Finished', progress=100)
+    assert len(finished) == 1
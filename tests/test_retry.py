@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the retry policy."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+import requests
+from mock import MagicMock, patch
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from cds_sorenson.error import SorensonClientError, SorensonConnectionError, \
+    SorensonFatalError, SorensonRateLimitError, SorensonRetryableError, \
+    SorensonServerError, SorensonTimeoutError, error_for_status
+from cds_sorenson.retry import Deadline, RetryBudget, RetryPolicy
+from cds_sorenson.transport import SorensonTransport
+
+
+def _response(status_code, text='', headers=None):
+    """Create a fake response."""
+    response = MagicMock(status_code=status_code, text=text)
+    response.headers = headers or {}
+    return response
+
+
+def test_error_for_status():
+    """Test the classification of error responses."""
+    assert isinstance(error_for_status(500, 'oops'), SorensonServerError)
+    assert isinstance(error_for_status(503), SorensonRetryableError)
+    error = error_for_status(429, '', '2')
+    assert isinstance(error, SorensonRateLimitError)
+    assert error.retry_after == 2 and error.safe
+    error = error_for_status(404, 'Not Found')
+    assert isinstance(error, SorensonClientError)
+    assert isinstance(error, SorensonFatalError)
+    assert error.status_code == 404
+    assert str(error) == '404: Not Found'
+
+
+def test_retry_policy():
+    """Test backoff, attempts, deadline and budget of the retry policy."""
+    now = [0]
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        now[0] += delay
+
+    policy = RetryPolicy(max_attempts=4, backoff_base=1, backoff_max=3,
+                         deadline=None, sleep=sleep, clock=lambda: now[0])
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise SorensonServerError(500)
+        return 'ok'
+
+    assert policy.call(flaky) == 'ok'
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 1 and 0 <= delays[1] <= 2
+
+    def failing():
+        raise SorensonTimeoutError('timeout')
+
+    with pytest.raises(SorensonTimeoutError):
+        policy.call(failing)
+    assert policy.stats['exhausted'] == 1
+
+    # Fatal errors and non-idempotent calls which reached Sorenson are not
+    # retried
+    del delays[:]
+
+    def fatal():
+        raise SorensonClientError(400)
+
+    def failing_post():
+        raise SorensonServerError(502)
+
+    with pytest.raises(SorensonClientError):
+        policy.call(fatal)
+    with pytest.raises(SorensonServerError):
+        policy.call(failing_post, idempotent=False)
+    assert delays == []
+
+    # Retries stop when the deadline is reached
+    policy.deadline = 0
+    with pytest.raises(SorensonTimeoutError):
+        policy.call(failing)
+    assert policy.stats['deadline_exceeded'] == 1
+
+    # ... or when the budget is exhausted
+    policy.deadline = None
+    policy.budget = RetryBudget(ratio=0, minimum=1)
+    with pytest.raises(SorensonTimeoutError):
+        policy.call(failing)
+    assert policy.stats['budget_exhausted'] == 1
+
+
+@patch('requests.Session.post')
+@patch('requests.Session.get')
+def test_transport_retries(requests_get_mock, requests_post_mock):
+    """Test that the transport retries the retryable failures only."""
+    policy = RetryPolicy(sleep=lambda delay: None)
+    transport = SorensonTransport(retry_policy=policy)
+
+    requests_get_mock.side_effect = [
+        requests.ConnectTimeout('connect timeout'),
+        _response(503, 'Unavailable'),
+        _response(429, headers={'Retry-After': '0'}),
+    ]
+    with pytest.raises(SorensonRateLimitError):
+        transport.get('http://sorenson/api/jobs/status/1')
+    assert policy.stats['retries'] == 2
+
+    requests_get_mock.side_effect = [
+        requests.ReadTimeout('read timeout'), _response(404)]
+    assert transport.get('http://sorenson/api/jobs/1').status_code == 404
+
+    # Submissions are only sent again if they didn't reach Sorenson
+    refused = requests.ConnectionError(MaxRetryError(
+        None, '/', NewConnectionError(None, 'refused')))
+    requests_post_mock.side_effect = [refused, _response(500),
+                                      _response(200)]
+    with pytest.raises(SorensonServerError):
+        transport.post('http://sorenson/api/jobs')
+    assert requests_post_mock.call_count == 2
+
+    requests_post_mock.side_effect = [requests.ConnectionError('reset')]
+    with pytest.raises(SorensonConnectionError):
+        transport.post('http://sorenson/api/jobs')
+
+
+def test_deadline():
+    """Test the countdown shared by the calls of an operation."""
+    now = [100.0]
+    deadline = Deadline(10, clock=lambda: now[0])
+    assert deadline.remaining() == 10
+    assert deadline.clamp((3.05, 30)) == (3.05, 10)
+    assert deadline.clamp(5) == (5, 5)
+    deadline.check()
+
+    now[0] += 12
+    assert deadline.expired
+    with pytest.raises(SorensonTimeoutError) as excinfo:
+        deadline.check()
+    assert excinfo.value.safe
+
+    unlimited = Deadline()
+    assert unlimited.remaining() is None and not unlimited.expired
+    assert unlimited.clamp((3.05, 30)) == (3.05, 30)
+
+
+@patch('requests.Session.get')
+def test_transport_timeouts(requests_get_mock):
+    """Test the timeouts of each endpoint and the operation deadline."""
+    now = [0.0]
+    policy = RetryPolicy(sleep=lambda delay: now.__setitem__(0, now[0] + 1),
+                         backoff_base=1, clock=lambda: now[0])
+    transport = SorensonTransport(
+        retry_policy=policy, timeouts={'current-status': (1, 5)},
+        default_timeout=(2, 20))
+
+    requests_get_mock.return_value = _response(200)
+    transport.get('http://sorenson/api/jobs/1', endpoint='current-status')
+    assert requests_get_mock.call_args[1]['timeout'] == (1, 5)
+    transport.get('http://sorenson/api/jobs/1', endpoint='other')
+    assert requests_get_mock.call_args[1]['timeout'] == (2, 20)
+
+    deadline = Deadline(1.5, clock=lambda: now[0])
+    now[0] = 0.5
+    transport.get('http://sorenson/api/jobs/1', endpoint='current-status',
+                  deadline=deadline)
+    assert requests_get_mock.call_args[1]['timeout'] == (1, 1.0)
+
+    # No request is sent once the deadline is exceeded
+    requests_get_mock.reset_mock()
+    now[0] = 2
+    with pytest.raises(SorensonTimeoutError):
+        transport.get('http://sorenson/api/jobs/1', deadline=deadline)
+    assert not requests_get_mock.called
+
+    # Retries are given up if they can't be done before the deadline
+    def slow_get(*args, **kwargs):
+        now[0] += 1
+        raise requests.ReadTimeout('read timeout')
+
+    requests_get_mock.side_effect = slow_get
+    deadline = Deadline(1, clock=lambda: now[0])
+    with pytest.raises(SorensonTimeoutError):
+        transport.get('http://sorenson/api/jobs/1', deadline=deadline)
+    assert requests_get_mock.call_count == 1
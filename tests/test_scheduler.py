@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the client-side submission scheduler."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+
+import pytest
+
+from cds_sorenson.backends import Backend, BackendPool
+from cds_sorenson.error import SorensonQueueFullError
+from cds_sorenson.poller import StatusPoller
+from cds_sorenson.scheduler import SubmissionScheduler
+
+
+class _FakeSubmit(object):
+    """Record the submissions and return sequential job IDs."""
+
+    def __init__(self):
+        self.submitted = []
+        self.backends = []
+
+    def __call__(self, input_file, output_file, preset_quality,
+                 display_aspect_ratio, queue_id=None, backend=None, **kwargs):
+        self.submitted.append((input_file, preset_quality, queue_id))
+        self.backends.append(backend.name)
+        return str(len(self.submitted))
+
+
+def test_backpressure(app):
+    """Test the limit of jobs in flight and the rejections."""
+    app.config['CDS_SORENSON_MAX_IN_FLIGHT'] = 2
+    app.config['CDS_SORENSON_QUEUE_MAX_IN_FLIGHT'] = {'small': 1}
+    app.extensions['cds-sorenson'].init_config(app)
+    submit = _FakeSubmit()
+    scheduler = SubmissionScheduler(app, block=False, submit=submit)
+
+    first = scheduler.submit('a.mp4', 'a.mp4', '360p', '16:9')
+    scheduler.submit('b.mp4', 'b.mp4', '360p', '16:9')
+    with pytest.raises(SorensonQueueFullError):
+        scheduler.submit('c.mp4', 'c.mp4', '360p', '16:9')
+    assert scheduler.in_flight() == 2
+
+    # Each queue has its own limit
+    scheduler.submit('c.mp4', 'c.mp4', '360p', '16:9', queue_id='small')
+    with pytest.raises(SorensonQueueFullError):
+        scheduler.submit('d.mp4', 'd.mp4', '360p', '16:9', queue_id='small')
+
+    scheduler.release(first)
+    scheduler.submit('c.mp4', 'c.mp4', '360p', '16:9')
+    with pytest.raises(SorensonQueueFullError):
+        scheduler.submit('d.mp4', 'd.mp4', '360p', '16:9', block=True,
+                         timeout=0.01)
+    # The default queue is left to the backend
+    assert [queue for _, _, queue in submit.submitted] == [
+        None, None, 'small', None]
+
+    # The limits are read from the settings of the application
+    app.config['CDS_SORENSON_MAX_IN_FLIGHT'] = 5
+    assert scheduler.limit('default') == 2
+    app.extensions['cds-sorenson'].init_config(app)
+    assert scheduler.limit('default') == 5
+
+
+def test_backend_queues(app):
+    """Test that each server of the pool has its own slots and queue."""
+    app.config['CDS_SORENSON_MAX_IN_FLIGHT'] = 1
+    app.config['CDS_SORENSON_QUEUE_MAX_IN_FLIGHT'] = {('b', 'queue-b'): 2}
+    app.extensions['cds-sorenson'].init_config(app)
+    app.extensions['cds-sorenson'].backends = BackendPool([
+        Backend('a', {}), Backend('b', {}, queue_id='queue-b')])
+    submit = _FakeSubmit()
+    scheduler = SubmissionScheduler(app, block=False, submit=submit)
+
+    # The servers are chosen in turn, among the ones with a free slot
+    scheduler.submit('a.mp4', 'a.mp4', '360p', '16:9')
+    scheduler.submit('b.mp4', 'b.mp4', '360p', '16:9')
+    scheduler.submit('c.mp4', 'c.mp4', '360p', '16:9')
+    with pytest.raises(SorensonQueueFullError) as exc:
+        scheduler.submit('d.mp4', 'd.mp4', '360p', '16:9')
+    assert exc.value.queue_id == app.config['CDS_SORENSON_DEFAULT_QUEUE']
+    # A waiting submission goes to the first server with a free slot
+    waiting = threading.Thread(target=scheduler.submit,
+                               args=('d.mp4', 'd.mp4', '360p', '16:9'),
+                               kwargs={'block': True})
+    waiting.start()
+    while not scheduler._waiting.get(None):
+        time.sleep(0.001)
+    scheduler.release('1')
+    waiting.join()
+    assert submit.backends == ['a', 'b', 'b', 'a']
+    # The queue of each backend is used for the jobs
+    assert [queue for _, _, queue in submit.submitted] == [None] * 4
+    assert scheduler.in_flight(backend='a') == 1
+    assert scheduler.in_flight('queue-b', backend='b') == 2
+    assert scheduler.in_flight() == 0
+
+
+def test_priorities(app):
+    """Test that interactive and low resolution jobs go first."""
+    app.config['CDS_SORENSON_MAX_IN_FLIGHT'] = 1
+    app.extensions['cds-sorenson'].init_config(app)
+    submit = _FakeSubmit()
+    scheduler = SubmissionScheduler(app, submit=submit)
+    busy = scheduler.submit('busy.mp4', 'busy.mp4', '360p', '16:9')
+
+    threads = [
+        threading.Thread(target=scheduler.submit, args=args, kwargs=kwargs)
+        for args, kwargs in [
+            (('bulk.mp4', 'bulk.mp4', '1080p', '16:9'), {}),
+            (('bulk.mp4', 'bulk.mp4', '240p', '16:9'), {}),
+            (('user.mp4', 'user.mp4', '720p', '16:9'),
+             {'interactive': True}),
+        ]]
+    for thread in threads:
+        thread.start()
+    while len(scheduler._waiting.get(None, ())) < 3:
+        time.sleep(0.001)
+
+    scheduler.release(busy)
+    for job_id in ('2', '3'):
+        while len(submit.submitted) < int(job_id):
+            time.sleep(0.001)
+        scheduler.release(job_id)
+    for thread in threads:
+        thread.join()
+    assert [quality for _, quality, _ in submit.submitted] == [
+        '360p', '720p', '240p', '1080p']
+
+
+def test_release_with_poller(app):
+    """Test that the slots are released when the jobs finish."""
+    app.config['CDS_SORENSON_MAX_IN_FLIGHT'] = 1
+    app.extensions['cds-sorenson'].init_config(app)
+    finished = []
+    poller = StatusPoller(
+        app, on_finish=lambda job_id, status: finished.append(job_id),
+        fetch=lambda job_ids, max_workers=None: dict(
+            (job_id, ('Finished', 100)) for job_id in job_ids))
+    scheduler = SubmissionScheduler(app, poller=poller, block=False,
+                                    submit=_FakeSubmit())
+
+    job_id = scheduler.submit('a.mp4', 'a.mp4', '360p', '16:9')
+    assert job_id in poller
+    with pytest.raises(SorensonQueueFullError):
+        scheduler.submit('b.mp4', 'b.mp4', '360p', '16:9')
+    poller.poll()
+    assert finished == [job_id]
+    assert scheduler.in_flight() == 0
+    scheduler.submit('b.mp4', 'b.mp4', '360p', '16:9')
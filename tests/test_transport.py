@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test the pooled HTTP transport."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+
+import pytest
+
+from cds_sorenson.proxies import current_cds_sorenson
+from cds_sorenson.transport import SorensonTransport
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """Answer every GET with a small JSON body over HTTP/1.1."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Return an empty JSON object."""
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep the test output quiet."""
+
+
+@pytest.yield_fixture()
+def http_server():
+    """Local keep-alive HTTP server."""
+    server = HTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_transport_from_config(app):
+    """Test that the extension creates the transport from the config."""
+    transport = current_cds_sorenson.transport
+    assert isinstance(transport, SorensonTransport)
+    adapter = transport.session.get_adapter('http://sorenson01.cern.ch')
+    assert adapter._pool_maxsize == app.config['CDS_SORENSON_POOL_MAXSIZE']
+    assert transport.session.headers['Connection'] == 'keep-alive'
+
+
+def test_transport_reuses_connections(http_server):
+    """Test that consecutive calls go through the same connection."""
+    transport = SorensonTransport()
+    for _ in range(5):
+        assert transport.get(http_server + '/api/jobs').status_code == 200
+    assert transport.stats.to_dict() == dict(
+        requests=5, connections=1, reused=4)
+    transport.close()
+
+
+def test_transport_without_keep_alive(http_server):
+    """Test that a new connection is opened per call without keep-alive."""
+    transport = SorensonTransport(keep_alive=False)
+    for _ in range(3):
+        transport.get(http_server + '/api/jobs')
+    assert transport.stats.connections == 3
+    assert transport.stats.reused == 0
+    transport.close()
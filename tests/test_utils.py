@@ -27,9 +27,15 @@
 
 from __future__ import absolute_import, print_function
 
+import pytest
 from jsonschema import validate
+from mock import MagicMock, patch
 
-from cds_sorenson.utils import _get_preset_config, generate_json_for_encoding
+from cds_sorenson.api import get_available_preset_qualities
+from cds_sorenson.presets import Preset, PresetRegistry
+from cds_sorenson.proxies import current_cds_sorenson
+from cds_sorenson.utils import _get_preset_config, \
+    generate_json_for_encoding, get_status
 
 
 def test_generate_json_for_encoding(app):
@@ -146,6 +152,12 @@ def test_generate_json_for_encoding(app):
     validate(output, sorenson_schema)
     assert output == expected_output
 
+    output = generate_json_for_encoding('/tmp/test_input_file.mp4',
+                                        '/tmp/test_output_file.mp4',
+                                        'dc2187a3-8f64-4e73-b458-7370a88d92d7',
+                                        queue_id='bulk')
+    assert output['QueueId'] == 'bulk'
+
 
 def test_get_preset_config(app):
     """Test `_get_preset_config` function."""
@@ -158,3 +170,76 @@ def test_get_preset_config(app):
         'frame_rate': 25,
         'preset_id': 'dc2187a3-8f64-4e73-b458-7370a88d92d7',
     }
+    assert type(_get_preset_config(
+        'dc2187a3-8f64-4e73-b458-7370a88d92d7')) is dict
+
+
+def test_get_preset_config_after_config_reload(app):
+    """Test that the compiled presets follow a reloaded configuration."""
+    preset_id = 'dc2187a3-8f64-4e73-b458-7370a88d92d7'
+    assert _get_preset_config('unknown') is None
+    presets = current_cds_sorenson.presets
+    assert presets.reverse[preset_id][:2] == ('16:9', '360p')
+    assert presets.get('16:9', '360p') == _get_preset_config(preset_id)
+    with pytest.raises(TypeError):
+        presets.forward[('16:9', '360p')]['width'] = 1
+
+    app.config['CDS_SORENSON_PRESETS'] = {
+        '1:1': {'360p': dict(width=360, height=360, preset_id='new-id')},
+    }
+    app.extensions['cds-sorenson'].init_config(app)
+    assert _get_preset_config(preset_id) is None
+    assert _get_preset_config('new-id')['width'] == 360
+    assert current_cds_sorenson.presets is not presets
+
+
+@patch('requests.Session.get')
+def test_get_status_remembers_archived_jobs(requests_get_mock, app):
+    """Test that archived jobs are checked in the archive directly."""
+    def get(url, **kwargs):
+        response = MagicMock()
+        response.status_code = 404 if '/status/' in url else 200
+        response.text = '{"StatusStateId": 5}'
+        return response
+    requests_get_mock.side_effect = get
+
+    assert get_status('1234') == '{"StatusStateId": 5}'
+    assert requests_get_mock.call_count == 2
+    assert get_status('1234') == '{"StatusStateId": 5}'
+    assert requests_get_mock.call_count == 3
+    assert requests_get_mock.call_args[0][0].endswith('/archive/1234')
+    assert current_cds_sorenson.job_locations.stats['hits'] == 1
+
+
+def test_preset_records(app):
+    """Test the compiled preset records and the precomputed views."""
+    presets = current_cds_sorenson.presets
+    preset = presets.get('16:9', '360p')
+    assert isinstance(preset, Preset)
+    assert (preset.aspect_ratio, preset.quality) == ('16:9', '360p')
+    assert preset.height == preset['height'] == 360
+    assert list(preset) == list(
+        app.config['CDS_SORENSON_PRESETS']['16:9']['360p'])
+    with pytest.raises(AttributeError):
+        preset.height = 1
+    with pytest.raises(KeyError):
+        preset['unknown']
+
+    assert presets.qualities[:2] == ('360p', '1080p')
+    assert presets.ratio_pairs[0] == (16, 9)
+    assert presets.preset_ids['16:9'][0] == preset.preset_id
+    # The API returns copies of the precomputed lists
+    get_available_preset_qualities().append('4k')
+    assert '4k' not in presets.qualities
+
+
+def test_presets_with_odd_aspect_ratios():
+    """Test that aspect ratios which aren't integer pairs still load."""
+    presets = PresetRegistry({
+        '16:9': {'360p': dict(height=360, preset_id='a')},
+        '1.85': {'360p': dict(height=360, preset_id='b')},
+        'wide': {'360p': dict(height=360, preset_id='c')},
+    })
+    assert presets.ratio_pairs == ((16, 9), )
+    assert presets.get('1.85', '360p').preset_id == 'b'
+    assert presets.nearest_aspect_ratio(1.84) == '1.85'
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of CERN Document Server.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the notifications of Sorenson."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+import pytest
+from mock import MagicMock, patch
+
+from cds_sorenson.api import get_encoding_status, start_encoding
+from cds_sorenson.signals import job_finished
+
+
+@pytest.fixture()
+def notifications(app):
+    """Enable the notifications."""
+    app.config.update(
+        CDS_SORENSON_NOTIFICATION_URL='https://cds.cern.ch/sorenson/'
+                                      'notifications',
+        CDS_SORENSON_NOTIFICATION_TOKEN='s3cr3t',
+    )
+    app.extensions['cds-sorenson'].init_config(app)
+    return app.test_client()
+
+
+@patch('requests.Session.post')
+def test_notification_url(requests_post_mock, app, notifications,
+                          start_response):
+    """Test that the jobs ask Sorenson to notify their end."""
+    response = MagicMock(text=start_response, status_code=200)
+    requests_post_mock.return_value = response
+    start_encoding('/eos/workspace/c/cds/test/data.mp4',
+                   '/eos/workspace/c/cds/test/data-360p.mp4', '360p', '16:9')
+    job = requests_post_mock.call_args[1]['json']
+    assert job['NotificationUrl'] == \
+        'https://cds.cern.ch/sorenson/notifications?token=s3cr3t'
+
+    app.config['CDS_SORENSON_BACKENDS'] = {
+        'sorenson02': {'url': 'http://sorenson02.cern.ch'}}
+    app.extensions['cds-sorenson'].init_app(app)
+    start_encoding('/eos/workspace/c/cds/test/data.mp4',
+                   '/eos/workspace/c/cds/test/data-360p.mp4', '360p', '16:9')
+    job = requests_post_mock.call_args[1]['json']
+    assert job['NotificationUrl'].endswith('?token=s3cr3t&server=sorenson02')
+
+    app.config['CDS_SORENSON_NOTIFICATION_URL'] = None
+    app.extensions['cds-sorenson'].init_config(app)
+    start_encoding('/eos/workspace/c/cds/test/data.mp4',
+                   '/eos/workspace/c/cds/test/data-360p.mp4', '360p', '16:9')
+    assert 'NotificationUrl' not in requests_post_mock.call_args[1]['json']
+
+
+def test_notification(app, notifications):
+    """Test that a notified job isn't polled anymore."""
+    finished = []
+
+    def on_finished(sender, **kwargs):
+        finished.append(kwargs)
+
+    body = json.dumps({'JobId': '1234-2345-abcd', 'StatusStateId': 5})
+    with job_finished.connected_to(on_finished, sender=app):
+        assert notifications.post('/sorenson/notifications',
+                                  data=body).status_code == 403
+        assert notifications.post('/sorenson/notifications?token=wrong',
+                                  data=body).status_code == 403
+        assert notifications.post('/sorenson/notifications?token=s3cr3t',
+                                  data='{}').status_code == 400
+        assert not finished
+
+        response = notifications.post(
+            '/sorenson/notifications?token=s3cr3t', data=body)
+        assert response.status_code == 204
+    assert finished == [
+        {'job_id': '1234-2345-abcd', 'status': 'Finished', 'progress': 100}]
+    with patch('requests.Session.get') as requests_get_mock:
+        assert get_encoding_status('1234-2345-abcd') == ('Finished', 100)
+        assert not requests_get_mock.called
+
+    app.config['CDS_SORENSON_NOTIFICATION_URL'] = None
+    app.extensions['cds-sorenson'].init_config(app)
+    assert notifications.post('/sorenson/notifications?token=s3cr3t',
+                              data=body).status_code == 404
+
+
+@patch('requests.Session.get')
+def test_notification_without_status(requests_get_mock, app, notifications):
+    """Test that the status is fetched if the notification lacks it."""
+    requests_get_mock.return_value = MagicMock(
+        text=json.dumps({'StatusStateId': 6}), status_code=200)
+    response = notifications.post(
+        '/sorenson/notifications?token=s3cr3t',
+        data=json.dumps({'JobId': '1234-2345-abcd'}))
+    assert response.status_code == 204
+    assert requests_get_mock.call_count == 1
+    assert get_encoding_status('1234-2345-abcd') == ('Error', 100)
+
+
+@patch('requests.Session.get')
+def test_notification_retried(requests_get_mock, app, notifications):
+    """Test that Sorenson is asked to retry if the status can't be fetched."""
+    requests_get_mock.return_value = MagicMock(text='', status_code=503)
+    response = notifications.post(
+        '/sorenson/notifications?token=s3cr3t',
+        data=json.dumps({'JobId': '1234-2345-abcd'}))
+    assert response.status_code == 503